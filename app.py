@@ -1,22 +1,69 @@
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, render_template, request, jsonify, Response, stream_with_context, g
 import pandas as pd
+import numpy as np
 import os
 import db_utils  # 导入数据库工具模块
 import student_agent as sa
 import data_processing as dp
+import snapshot
+from payload_cache import PayloadCache
+from cohort_stats import CohortStats, stats_for_index
+from job_queue import JobQueue, QueueFullError, FINISHED_STATUSES
+from dataset_holder import DatasetHolder, build_student_index, load_student_index
+from metrics import REGISTRY, HTTP_REQUEST_DURATION, HTTP_REQUESTS_IN_FLIGHT
+from rate_limiter import LLM_LIMITER
+import llm_accounting
+from config import CACHE_CONFIG, JOB_QUEUE_CONFIG, DATASET_CONFIG
 import traceback
+import base64
+import hmac
+import json
+import time
 from datetime import datetime # 为了在页脚显示年份
 
 app = Flask(__name__, template_folder='template')
 
 # 全局变量
-student_data = None
+dataset_holder = None  # 持有当前版本的学生数据索引，支持热加载
 agent = None
 system_ready = False
+# 学生基本数据响应体缓存，键为 (学生ID, 数据集版本)
+payload_cache = PayloadCache(max_entries=CACHE_CONFIG['payload_max_entries'])
+# 调用大模型的分析任务队列
+job_queue = JobQueue(**JOB_QUEUE_CONFIG)
+# 当前数据集版本的群体统计（均值、分位数、直方图等），随数据集替换更新
+cohort_stats = None
+
+# 学生列表的输出字段 → 数据列
+STUDENT_SUMMARY_FIELDS = {
+    'student_id': 'student_id',
+    'student_type': '学生类型',
+    'knowledge_score': '知识维度_综合得分',
+    'cognitive_score': '认知维度_综合得分',
+    'affective_score': '情感维度_综合得分',
+    'behavioral_score': '行为维度_综合得分'
+}
+# 支持区间过滤的得分字段
+SCORE_FILTER_FIELDS = ['knowledge_score', 'cognitive_score', 'affective_score', 'behavioral_score']
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 1000
 
 # --- 初始化 ---
+def _on_dataset_swapped(new_index, old_index):
+    """数据集替换后同步学生代理的数据和群体统计，并清理按版本缓存的响应"""
+    global cohort_stats
+    if agent is not None:
+        agent.set_index(new_index)
+    payload_cache.invalidate()
+    # 仅在末尾追加学生时增量合并，否则重新计算
+    cohort_stats = stats_for_index(new_index, cohort_stats, old_index)
+
+def current_index():
+    """返回当前版本的学生数据索引；每个请求应只取一次，保证处理过程中看到一致的数据"""
+    return dataset_holder.current if dataset_holder is not None else None
+
 def initialize_system():
-    global student_data, agent, system_ready, data_loader
+    global dataset_holder, agent, system_ready, cohort_stats
 
     db_utils.create_database()
     db_utils.create_students_table()
@@ -27,8 +74,7 @@ def initialize_system():
         excel_file_path = 'Model_py.xlsx'
 
         if os.path.exists(data_file_path):
-            student_data = pd.read_csv(data_file_path)
-            print(f"Loaded processed data from {data_file_path}, {len(student_data)} records.")
+            student_index = load_student_index(data_file_path)
         elif os.path.exists(excel_file_path):
             print(f"Processing raw data from {excel_file_path}...")
             raw_data = dp.load_data(excel_file_path)
@@ -48,26 +94,27 @@ def initialize_system():
             if 'student_id' not in student_data.columns:
                 student_data['student_id'] = range(1, len(student_data) + 1)
 
-            student_data.to_csv(data_file_path, index=False)
+            snapshot.save_profiles(student_data, data_file_path)
             print(f"数据处理完成，已保存到 {data_file_path}")
+            student_index = build_student_index(student_data, data_file_path)
         else:
             print(f"错误: 未找到 {data_file_path} 或 {excel_file_path}。")
             system_ready = False
             return False  # 指示失败
-        student_data['student_id'] = student_data['CNTSTUID']
-        # print(student_data)
-        # 确保 student_id 即使从没有它的 CSV 加载也存在
-        if 'student_id' not in student_data.columns:
-            print("警告: CSV 中缺少 'student_id' 列，生成序列 ID。")
-            student_data['student_id'] = range(1, len(student_data) + 1)
-        else:
-            # 确保 student_id 是整数类型
-            student_data['student_id'] = student_data['student_id'].astype(int)
 
-        # 初始化学生代理
-        agent = sa.StudentAgent(data_file_path)
+        if dataset_holder is not None:
+            dataset_holder.stop_watching()
+        dataset_holder = DatasetHolder(data_file_path, load_student_index, initial=student_index)
+        dataset_holder.add_listener(_on_dataset_swapped)
+        payload_cache.invalidate()
+        cohort_stats = CohortStats(student_index.data, version=student_index.version)
+
+        # 初始化学生代理，与服务共用同一份数据索引
+        agent = sa.StudentAgent(student_index)
         print("学生代理初始化完成")
         system_ready = True
+
+        dataset_holder.start_watching(DATASET_CONFIG['watch_interval'])
         return True
 
     except Exception as e:
@@ -82,117 +129,283 @@ db_utils.create_students_table()
 db_utils.create_recommendations_table()
 initialize_system()
 
+# --- 请求指标 ---
+@app.before_request
+def _start_request_metrics():
+    g.metrics_route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+    g.metrics_start = time.perf_counter()
+    HTTP_REQUESTS_IN_FLIGHT.inc(route=g.metrics_route)
+    # 本请求触发的大模型调用按路由汇总
+    llm_accounting.set_endpoint(g.metrics_route)
+
+def _observe_request(start, method, route, status):
+    HTTP_REQUESTS_IN_FLIGHT.dec(route=route)
+    HTTP_REQUEST_DURATION.observe(time.perf_counter() - start, method=method, route=route, status=status)
+
+@app.after_request
+def _record_response_metrics(response):
+    # 流式响应（SSE）在响应体发送完毕、连接关闭时才记录，耗时包含完整的流持续时间
+    if response.is_streamed and 'metrics_start' in g:
+        start, method, route = g.pop('metrics_start'), request.method, g.metrics_route
+        status = response.status_code
+        response.call_on_close(lambda: _observe_request(start, method, route, status))
+    else:
+        g.metrics_status = response.status_code
+    return response
+
+@app.teardown_request
+def _finish_request_metrics(exc):
+    start = g.pop('metrics_start', None)
+    if start is None:
+        return
+    status = 500 if exc is not None else g.get('metrics_status', 500)
+    _observe_request(start, request.method, g.metrics_route, status)
+
+def _collect_component_metrics():
+    """导出响应缓存、大模型回复缓存、数据库连接池和任务队列的状态"""
+    caches = {'payload': payload_cache.stats()}
+    profiles = agent.student_profiles.stats() if agent is not None else None
+    if profiles is not None:
+        caches['profile'] = profiles
+    if agent is not None and agent.llm_cache is not None:
+        caches['llm'] = agent.llm_cache.stats()
+    jobs = job_queue.metrics()
+    limiter = LLM_LIMITER.stats()
+    flights = agent.flights.stats() if agent is not None else None
+    db_pool = db_utils.DB_POOL.stats()
+
+    def per_cache(value):
+        return [({'cache': name}, value(stats)) for name, stats in caches.items()]
+
+    def hit_ratio(stats):
+        lookups = stats['hits'] + stats['misses']
+        return stats['hits'] / lookups if lookups else 0.0
+
+    return [
+        ('cache_hits_total', 'counter', '缓存命中次数', per_cache(lambda stats: stats['hits'])),
+        ('cache_misses_total', 'counter', '缓存未命中次数', per_cache(lambda stats: stats['misses'])),
+        ('cache_hit_ratio', 'gauge', '缓存命中率', per_cache(hit_ratio)),
+        ('cache_entries', 'gauge', '缓存条目数', per_cache(lambda stats: stats['entries'])),
+        ('profile_store_bytes', 'gauge', '学生画像存储的估算内存占用（字节）',
+         [({}, profiles['bytes'])] if profiles is not None else []),
+        ('profile_store_spilled', 'gauge', '溢出到磁盘的学生画像数',
+         [({}, profiles['spilled'])] if profiles is not None else []),
+        ('llm_limiter_in_flight', 'gauge', '正在进行的大模型调用数', [({}, limiter['in_flight'])]),
+        ('llm_limiter_waiting', 'gauge', '排队等待调用名额的大模型调用数', [({}, limiter['waiting'])]),
+        ('single_flight_in_flight', 'gauge', '进行中的学生分析（含被合并的并发请求共享的）数',
+         [({}, flights['in_flight'])] if flights is not None else []),
+        ('db_pool_size', 'gauge', '数据库连接池的连接数', [({}, db_pool['pool_size'])]),
+        ('db_pool_in_use', 'gauge', '已取出使用中的数据库连接数', [({}, db_pool['in_use'])]),
+        ('db_pool_waiting', 'gauge', '等待空闲数据库连接的调用数', [({}, db_pool['waiting'])]),
+        ('job_queue_depth', 'gauge', '排队中的分析任务数', [({}, jobs['queue_depth'])]),
+        ('job_running', 'gauge', '执行中的分析任务数', [({}, jobs['running'])]),
+        ('job_wait_seconds_avg', 'gauge', '最近分析任务的平均排队时间（秒）', [({}, jobs['wait_seconds']['avg'])]),
+    ]
+
+REGISTRY.register_collector(_collect_component_metrics)
+
+@app.route('/metrics')
+def metrics():
+    """以 Prometheus 文本格式导出请求、缓存、任务队列和大模型调用指标"""
+    return Response(REGISTRY.render(), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
 # --- 路由 ---
 @app.route('/')
 def index():
     """渲染主仪表板页面。"""
-    global student_data, system_ready
+    global system_ready
+    student_index = current_index()
 
     if not system_ready:
         return render_template('error.html', message="系统初始化失败，请检查控制台输出。")
 
-    # 准备概述部分的数据
+    # 准备概述部分的数据（仅第一页）
     students_list = []
-    dimension_cols = ['知识维度_综合得分', '认知维度_综合得分', '情感维度_综合得分', '行为维度_综合得分']
-    valid_dimension_cols = [col for col in dimension_cols if col in student_data.columns]
-
-    if student_data is not None:
-        # 限制只显示前 20 条数据
-        limit_count = 20
-        # print(student_data)
-        for _, row in student_data.head(limit_count).iterrows():
-            student_dict = {
-                'student_id': int(row['student_id']),
-                'student_type': row.get('学生类型', '待分类'),
-                'knowledge_score': row.get('知识维度_综合得分'),
-                'cognitive_score': row.get('认知维度_综合得分'),
-                'affective_score': row.get('情感维度_综合得分'),
-                'behavioral_score': row.get('行为维度_综合得分')
-
-            }
-            students_list.append(student_dict)
-    else:
-        students_list = [] # 如果 student_data 为 None，则初始化为空列表
+    if student_index is not None:
+        positions = student_index.select()[:DEFAULT_PAGE_SIZE]
+        students_list = student_index.take_records(positions, STUDENT_SUMMARY_FIELDS)
 
     return render_template('index.html', students=students_list, current_year=datetime.now().year)
 
 
+# 基本数据中缩放到 0-100 的维度得分字段 → 数据列
+STUDENT_SCORE_FIELDS = {
+    'knowledge_score': '知识维度_综合得分',
+    'cognitive_score': '认知维度_综合得分',
+    'affective_score': '情感维度_综合得分',
+    'behavioral_score': '行为维度_综合得分'
+}
+MAX_BATCH_SIZE = 5000
+
+def _detail_metric_columns(student_index):
+    """返回作为详细指标输出的列：具有下划线但不属于主要维度分数或 ID/Type 的列"""
+    return [col for col in student_index.data.columns
+            if '_' in col and '综合得分' not in col and col not in ['student_id', '学生类型']]
+
+def _round_metric(value):
+    """尝试四舍五入（如果为数字），否则保持原样"""
+    try:
+        return round(float(value), 2)
+    except (ValueError, TypeError):
+        return value  # 如果不是 float/int，则保留原始值
+
+def _build_student_columns(student_index, positions):
+    """按列批量构建多个学生的基本数据（分数缩放到 0-100，附带详细指标）
+
+    Args:
+        student_index: 学生数据索引
+        positions: 行位置数组
+
+    Returns:
+        dict: 基本字段 → 值列表，detail_metrics 为 指标名 → 值列表（缺失值为 None）
+    """
+    positions = np.asarray(positions, dtype=np.int64)
+    columns = {"student_id": student_index.column('student_id')[positions].astype('int64').tolist()}
+
+    if '学生类型' in student_index.data.columns:
+        columns["student_type"] = [None if pd.isna(v) else v for v in student_index.column('学生类型')[positions].tolist()]
+    else:
+        columns["student_type"] = ['待分类'] * len(positions)
+
+    # 将分数缩放到 0-100 以用于前端，缺失值记为 0
+    for field, column in STUDENT_SCORE_FIELDS.items():
+        if column not in student_index.data.columns:
+            columns[field] = [0] * len(positions)
+            continue
+        values = student_index.column(column)[positions].astype('float64')
+        columns[field] = np.where(np.isnan(values), 0, np.trunc(values * 100)).astype('int64').tolist()
+
+    detail_metrics = {}
+    for column in _detail_metric_columns(student_index):
+        values = student_index.column(column)[positions]
+        if values.dtype.kind in 'iuf':
+            values = values.astype('float64')
+            missing = np.isnan(values)
+            detail_metrics[column] = [None if m else round(v, 2) for v, m in zip(values.tolist(), missing.tolist())]
+        else:
+            detail_metrics[column] = [None if pd.isna(v) else _round_metric(v) for v in values.tolist()]
+    columns["detail_metrics"] = detail_metrics
+    return columns
+
+def _columns_to_payloads(columns):
+    """将按列组织的学生基本数据转换为每个学生一个对象，详细指标中省略缺失值"""
+    basic_fields = [field for field in columns if field != 'detail_metrics']
+    detail_metrics = list(columns['detail_metrics'].items())
+    payloads = []
+    for i in range(len(columns['student_id'])):
+        payload = {field: columns[field][i] for field in basic_fields}
+        payload['detail_metrics'] = [{'name': name, 'value': values[i]}
+                                     for name, values in detail_metrics if values[i] is not None]
+        payloads.append(payload)
+    return payloads
+
+def _build_student_payload(student_index, position):
+    """构建单个学生的基本数据响应"""
+    return _columns_to_payloads(_build_student_columns(student_index, [position]))[0]
+
+def _student_basic_body(student_index, student_id, position):
+    """返回单个学生基本数据的 JSON 响应体和 ETag，按 (学生ID, 数据集版本) 缓存"""
+    return payload_cache.get_or_build(
+        student_id, student_index.version,
+        lambda: app.json.dumps(_build_student_payload(student_index, position), separators=(',', ':')).encode('utf-8')
+    )
+
 @app.route('/api/student/<int:student_id>')
 def get_student_basic_data(student_id):
-    """API endpoint to get basic data and detailed metrics for a single student."""
-    global student_data, system_ready
+    """API endpoint to get basic data and detailed metrics for a single student.
 
-    if not system_ready or student_data is None:
+    响应体按 (学生ID, 数据集版本) 缓存，并带强 ETag；
+    客户端携带匹配的 If-None-Match 时返回 304。
+    """
+    global system_ready
+    student_index = current_index()
+
+    if not system_ready or student_index is None:
         return jsonify({"error": "System not ready"}), 500
 
     # 验证 student_id
-    if student_id not in student_data['student_id'].values:
+    position = student_index.position(student_id)
+    if position is None:
         return jsonify({"error": f"找不到学生ID {student_id}"}), 404
 
     try:
-        # 1. 从 DataFrame 获取基本信息和详细指标
-        student_row = student_data[student_data['student_id'] == student_id].iloc[0]
-        detail_metrics = []
-        for col in student_row.index:
-            # 包括具有下划线但不属于主要维度分数或 ID/Type 的列
-            if '_' in col and '综合得分' not in col and col not in ['student_id', '学生类型']:
-                value = student_row[col]
-                if pd.notna(value):
-                    # 尝试四舍五入（如果为数字），否则保持原样
-                    try:
-                        value = round(float(value), 2)
-                    except (ValueError, TypeError):
-                        pass  # 如果不是 float/int，则保留原始值
-                    detail_metrics.append({'name': col, 'value': value})
-
-        # --- 合并为一个响应对象 ---
-        response_data = {
-            "student_id": int(student_row.get('student_id')),
-            "student_type": student_row.get('学生类型', '待分类'),
-            # 将分数缩放到 0-100 以用于前端
-            "knowledge_score": int(student_row.get('知识维度_综合得分', 0) * 100) if pd.notna(student_row.get('知识维度_综合得分')) else 0,
-            "cognitive_score": int(student_row.get('认知维度_综合得分', 0) * 100) if pd.notna(student_row.get('认知维度_综合得分')) else 0,
-            "affective_score": int(student_row.get('情感维度_综合得分', 0) * 100) if pd.notna(student_row.get('情感维度_综合得分')) else 0,
-            "behavioral_score": int(student_row.get('行为维度_综合得分', 0) * 100) if pd.notna(student_row.get('行为维度_综合得分')) else 0,
-            "detail_metrics": detail_metrics,
-        }
+        body, etag = _student_basic_body(student_index, student_id, position)
 
-        return jsonify(response_data)
+        if request.if_none_match.contains(etag):
+            response = Response(status=304)
+        else:
+            response = Response(body, mimetype='application/json')
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
 
     except Exception as e:
         print(f"获取学生基本数据出错: {e}")
         traceback.print_exc()
         return jsonify({"error": f"无法获取学生 {student_id} 的基本数据: {str(e)}"}), 500
 
+@app.route('/api/cohort/stats')
+def get_cohort_stats():
+    """返回全体学生各维度得分的统计：均值、中位数、分位数、直方图及按学生类型/聚类的分组统计。
+
+    统计在数据集加载或替换时预先计算，响应体按数据集版本缓存并带强 ETag。
+    """
+    stats = cohort_stats
+
+    if not system_ready or stats is None:
+        return jsonify({"error": "System not ready"}), 500
+
+    body, etag = payload_cache.get_or_build(
+        'cohort_stats', stats.version,
+        lambda: app.json.dumps(stats.summary(), separators=(',', ':')).encode('utf-8')
+    )
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        response = Response(body, mimetype='application/json')
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+def _compute_student_details(student_id):
+    """运行完整的分析流程，返回 /details 的响应数据；无法分析时返回 None"""
+    # --- 获取详细数据组件 ---
+    # 1. 基本分析（包括 0-1 范围内的分数和专家诊断）
+    analysis = agent.analyze_student(student_id)
+    if not analysis:
+        return None
+
+    # 2. 推荐
+    recommendations = agent.generate_recommendations(student_id)
+
+    # --- 合并为一个响应对象 ---
+    return {
+        "student_id": analysis.get('student_id'),
+        "expert_diagnosis": analysis.get('expert_diagnosis', '暂无分析'),
+        "recommendations": recommendations,
+    }
+
 @app.route('/api/student/<int:student_id>/details')
 def get_student_details(student_id):
     """API endpoint to get detailed analysis, recommendations, etc. for a single student."""
-    global student_data, agent, system_ready
+    global agent, system_ready
+    student_index = current_index()
 
-    if not system_ready or agent is None or student_data is None:
+    if not system_ready or agent is None or student_index is None:
         return jsonify({"error": "System not ready"}), 500
 
     # 验证 student_id
-    if student_id not in student_data['student_id'].values:
+    if student_id not in student_index:
         return jsonify({"error": f"找不到学生ID {student_id}"}), 404
 
+    if _wants_async():
+        return _submit_job('details', student_id, student_index.version)
+
     try:
-        # --- 获取详细数据组件 ---
-        # 1. 基本分析（包括 0-1 范围内的分数和专家诊断）
-        analysis = agent.analyze_student(student_id)
-        if not analysis:  # analyze_student 可能返回 None 如果 ID 最初无效（双重检查）
+        response_data = _compute_student_details(student_id)
+        if response_data is None:  # analyze_student 可能返回 None 如果 ID 最初无效（双重检查）
             return jsonify({"error": f"无法分析学生 {student_id}"}), 500
 
-        # 2. 推荐
-        recommendations = agent.generate_recommendations(student_id)
-
-        # --- 合并为一个响应对象 ---
-        response_data = {
-            "student_id": analysis.get('student_id'),
-            "expert_diagnosis": analysis.get('expert_diagnosis', '暂无分析'),
-            "recommendations": recommendations,
-        }
-
         return jsonify(response_data)
 
     except Exception as e:
@@ -201,6 +414,159 @@ def get_student_details(student_id):
         return jsonify({"error": f"无法获取学生 {student_id} 的详细数据: {str(e)}"}), 500
 
 
+def _sse_event(event, data):
+    """将事件编码为 Server-Sent Events 格式"""
+    return f"event: {event}\ndata: {app.json.dumps(data, separators=(',', ':'))}\n\n"
+
+@app.route('/api/student/<int:student_id>/stream')
+def stream_student_details(student_id):
+    """以 Server-Sent Events 流式返回专家诊断与分维度建议。
+
+    事件依次为 start、每个环节的 section_start / token / section_done（并发进行的环节的
+    token 事件相互交错，以 section 区分），最后以 done 事件给出与 /details 相同结构的完整结果。
+    """
+    global agent, system_ready
+    student_index = current_index()
+
+    if not system_ready or agent is None or student_index is None:
+        return jsonify({"error": "System not ready"}), 500
+
+    # 验证 student_id
+    if student_id not in student_index:
+        return jsonify({"error": f"找不到学生ID {student_id}"}), 404
+
+    def generate():
+        try:
+            for event, data in agent.stream_student_report(student_id):
+                yield _sse_event(event, data)
+        except Exception as e:
+            print(f"流式获取学生详细数据出错: {e}")
+            traceback.print_exc()
+            yield _sse_event("stream_error", {"message": f"无法获取学生 {student_id} 的详细数据: {str(e)}"})
+
+    return Response(stream_with_context(generate()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+# /report 可选的部分：基本数据、专家诊断、分维度建议
+REPORT_SECTIONS = ('basic', 'diagnosis', 'recommendations')
+
+def _report_sections():
+    """解析 ?sections=basic,diagnosis 等，按 REPORT_SECTIONS 的顺序返回请求的部分；
+
+    未指定时返回全部部分，包含未知部分时返回 None。
+    """
+    value = request.args.get('sections', '')
+    if not value.strip():
+        return list(REPORT_SECTIONS)
+    requested = {section.strip() for section in value.split(',') if section.strip()}
+    if requested - set(REPORT_SECTIONS):
+        return None
+    return [section for section in REPORT_SECTIONS if section in requested]
+
+def _diagnosis_section(analysis):
+    """从学生画像中提取 /report 的 diagnosis 部分"""
+    return {
+        "expert_diagnosis": analysis.get('expert_diagnosis', '暂无分析'),
+        "student_profile_report": analysis.get('student_profile_report', ''),
+        "risk_level": analysis.get('risk_level'),
+        "risk_factors": analysis.get('risk_factors', [])
+    }
+
+def _compute_student_report(student_index, student_id, position, sections):
+    """按请求的部分一次性构建 /report 的响应文档；无法分析时返回 None"""
+    report = {"student_id": student_id, "sections": sections}
+    if 'basic' in sections:
+        report['basic'] = _build_student_payload(student_index, position)
+    if 'diagnosis' in sections:
+        analysis = agent.analyze_student(student_id)
+        if not analysis:
+            return None
+        report['diagnosis'] = _diagnosis_section(analysis)
+    if 'recommendations' in sections:
+        # 已生成诊断时直接复用保存的画像；未请求诊断时与流式返回一致，基于保存的画像或基础分析生成，
+        # 不额外调用中心调度智能体
+        recommendations = agent.generate_recommendations(student_id, analyze='diagnosis' in sections)
+        if recommendations.get("error"):
+            return None
+        report['recommendations'] = recommendations
+    return report
+
+def _wants_stream():
+    """请求是否要求以 Server-Sent Events 流式返回（?stream=1）"""
+    return request.args.get('stream', '').lower() in ('1', 'true', 'yes')
+
+@app.route('/api/student/<int:student_id>/report')
+def get_student_report(student_id):
+    """一次请求返回学生的基本数据、专家诊断和分维度建议，取代 /api/student/<id>、/details 和 /plan 三次请求。
+
+    ?sections= 以逗号分隔选择需要的部分（basic、diagnosis、recommendations，默认全部），
+    只计算所选部分。?stream=1 时以 Server-Sent Events 返回：先推送 basic 事件，
+    随后为与 /stream 相同的专家输出事件，最后以 done 事件给出与非流式响应相同结构的完整文档。
+    """
+    global agent, system_ready
+    student_index = current_index()
+
+    if not system_ready or student_index is None:
+        return jsonify({"error": "System not ready"}), 500
+
+    sections = _report_sections()
+    if sections is None:
+        return jsonify({"error": f"sections 只能包含 {', '.join(REPORT_SECTIONS)}"}), 400
+
+    needs_agent = 'diagnosis' in sections or 'recommendations' in sections
+    if needs_agent and agent is None:
+        return jsonify({"error": "System not ready or agent not initialized"}), 500
+
+    position = student_index.position(student_id)
+    if position is None:
+        return jsonify({"error": f"找不到学生ID {student_id}"}), 404
+
+    if not _wants_stream():
+        try:
+            report = _compute_student_report(student_index, student_id, position, sections)
+            if report is None:
+                return jsonify({"error": f"无法分析学生 {student_id}"}), 500
+            return jsonify(report)
+        except Exception as e:
+            print(f"获取学生报告出错: {e}")
+            traceback.print_exc()
+            return jsonify({"error": f"无法获取学生 {student_id} 的报告: {str(e)}"}), 500
+
+    def generate():
+        report = {"student_id": student_id, "sections": sections}
+        try:
+            if 'basic' in sections:
+                body, _ = _student_basic_body(student_index, student_id, position)
+                report['basic'] = json.loads(body)
+                yield f"event: basic\ndata: {body.decode('utf-8')}\n\n"
+            if not needs_agent:
+                yield _sse_event("done", report)
+                return
+
+            events = agent.stream_student_report(
+                student_id,
+                include_diagnosis='diagnosis' in sections,
+                include_recommendations='recommendations' in sections
+            )
+            for event, data in events:
+                if event != "done":
+                    yield _sse_event(event, data)
+                    continue
+                if 'diagnosis' in sections:
+                    report['diagnosis'] = _diagnosis_section(data)
+                if 'recommendations' in sections:
+                    report['recommendations'] = data['recommendations']
+                yield _sse_event("done", report)
+        except Exception as e:
+            print(f"流式获取学生报告出错: {e}")
+            traceback.print_exc()
+            yield _sse_event("stream_error", {"message": f"无法获取学生 {student_id} 的报告: {str(e)}"})
+
+    return Response(stream_with_context(generate()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
 # 简单的错误模板路由
 @app.route('/error')
 def error_page():
@@ -210,33 +576,105 @@ def error_page():
 # --- Flask 路由 ---
 #-------------------
 
+def _encode_cursor(offset):
+    """将分页偏移量编码为不透明游标"""
+    payload = json.dumps({'offset': offset}).encode('utf-8')
+    return base64.urlsafe_b64encode(payload).decode('ascii')
+
+def _decode_cursor(cursor):
+    """解析分页游标，返回偏移量"""
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        return int(payload['offset'])
+    except (ValueError, TypeError, KeyError):
+        raise ValueError(f"无效的分页游标: {cursor}")
+
+def _parse_student_query(args):
+    """解析学生列表的分页、过滤和排序参数
+
+    支持的参数:
+        limit: 每页条数（默认 20，最大 1000）
+        offset / cursor: 偏移量或上一页返回的 next_cursor
+        student_type: 学生类型，可重复或以逗号分隔
+        min_<score> / max_<score>: 四个维度得分的区间过滤，例如 min_knowledge_score=0.6
+        sort: 排序字段，前缀 '-' 表示降序，例如 sort=-knowledge_score
+    """
+    limit = args.get('limit', DEFAULT_PAGE_SIZE, type=int)
+    if limit is None or limit <= 0:
+        raise ValueError("limit 必须为正整数")
+    limit = min(limit, MAX_PAGE_SIZE)
+
+    if args.get('cursor'):
+        offset = _decode_cursor(args['cursor'])
+    else:
+        offset = args.get('offset', 0, type=int)
+    if offset is None or offset < 0:
+        raise ValueError("offset 必须为非负整数")
+
+    student_types = [t for value in args.getlist('student_type') for t in value.split(',') if t]
+
+    score_ranges = {}
+    for field in SCORE_FILTER_FIELDS:
+        minimum = args.get(f'min_{field}', type=float)
+        maximum = args.get(f'max_{field}', type=float)
+        if minimum is not None or maximum is not None:
+            score_ranges[field] = (minimum, maximum)
+
+    sort_by, descending = None, False
+    sort = args.get('sort')
+    if sort:
+        descending = sort.startswith('-')
+        sort_by = sort.lstrip('-+')
+        if sort_by not in STUDENT_SUMMARY_FIELDS:
+            raise ValueError(f"不支持的排序字段: {sort_by}")
+
+    return limit, offset, student_types, score_ranges, sort_by, descending
+
 @app.route('/api/students/', methods=['GET'])
 def get_all_students():
     """
-    获取所有学生的处理后数据列表。
-    注意：对于大型数据集，直接返回全部数据可能不是最佳实践，
-    可以考虑分页或流式传输。
+    分页获取学生的处理后数据列表，支持按学生类型和维度得分区间过滤以及排序。
+    返回 {"students": [...], "total": 匹配总数, "offset", "limit", "next_cursor"}。
     """
-    global student_data
+    student_index = current_index()
 
-    if student_data is None:
+    if student_index is None:
         return jsonify({"error": "Backend service not ready, student data failed to load."}), 500
 
     try:
-        # 限制只返回前 20 条数据
-        limit_count = 20
-        students_list = []
-        for _, row in student_data.head(limit_count).iterrows():
-            student = {
-                'student_id': int(row['student_id']),
-                'student_type': row.get('学生类型', '待分类'),
-                'knowledge_score': row.get('知识维度_综合得分'),
-                'cognitive_score': row.get('认知维度_综合得分'),
-                'affective_score': row.get('情感维度_综合得分'),
-                'behavioral_score': row.get('行为维度_综合得分')
-            }
-            students_list.append(student)
-        return jsonify(students_list)
+        limit, offset, student_types, score_ranges, sort_by, descending = _parse_student_query(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    try:
+        mask = None
+        if student_types:
+            if '学生类型' not in student_index.data.columns:
+                return jsonify({"error": "数据中没有学生类型列，无法按类型过滤"}), 400
+            mask = student_index.category_mask('学生类型', student_types)
+        for field, (minimum, maximum) in score_ranges.items():
+            column = STUDENT_SUMMARY_FIELDS[field]
+            if column not in student_index.data.columns:
+                continue
+            field_mask = student_index.range_mask(column, minimum, maximum)
+            mask = field_mask if mask is None else mask & field_mask
+
+        sort_column = STUDENT_SUMMARY_FIELDS[sort_by] if sort_by else None
+        if sort_column is not None and sort_column not in student_index.data.columns:
+            sort_column = None
+
+        positions = student_index.select(mask, sort_column, descending)
+        total = len(positions)
+        page = positions[offset:offset + limit]
+        next_offset = offset + len(page)
+
+        return jsonify({
+            "students": student_index.take_records(page, STUDENT_SUMMARY_FIELDS),
+            "total": total,
+            "offset": offset,
+            "limit": limit,
+            "next_cursor": _encode_cursor(next_offset) if next_offset < total else None
+        })
 
     except Exception as e:
         print(f"获取所有学生数据时发生错误: {e}")
@@ -247,20 +685,17 @@ def get_student_by_id(student_id):
     """
     根据学生ID获取单个学生的处理后数据。
     """
-    global student_data
+    student_index = current_index()
 
-    if student_data is None:
+    if student_index is None:
         return jsonify({"error": "Backend service not ready, student data failed to load."}), 500
 
     try:
-        # 从 student_data DataFrame 中筛选学生数据
-        student = student_data[student_data['student_id'] == student_id].iloc[0].to_dict()
-        if not student:
+        # 通过索引获取学生数据
+        student_row = student_index.get_record(student_id)
+        if student_row is None:
             return jsonify({"message": f"未找到学生ID: {student_id}"}), 404
 
-        # 从 student_data DataFrame 中筛选学生数据
-        student_row = student_data[student_data['student_id'] == student_id].iloc[0]
-
         # 确保所有需要的分数都存在
         knowledge_score = student_row.get('知识维度_综合得分', None)
         cognitive_score = student_row.get('认知维度_综合得分', None)
@@ -281,24 +716,62 @@ def get_student_by_id(student_id):
         }
         return jsonify(student)
 
-    except IndexError: #  处理 student_id 不存在的情况
-        return jsonify({"message": f"未找到学生ID: {student_id}"}), 404
     except Exception as e:
         print(f"获取学生ID {student_id} 数据时发生错误: {e}")
         return jsonify({"error": "获取学生数据时发生内部错误", "details": str(e)}), 500
 
+@app.route('/api/students/batch', methods=['POST'])
+def get_students_batch():
+    """
+    批量获取多个学生的基本数据，一次索引查找与按列取值代替逐个请求 /api/student/<id>。
+
+    请求体: {"ids": [学生ID, ...], "format": "records" | "columnar"}
+    records（默认）返回 {"students": [与 /api/student/<id> 相同结构], "missing": [...]}；
+    columnar 返回按列组织的紧凑结构 {"columns": {字段: [值...]}, "missing": [...]}。
+    """
+    student_index = current_index()
+
+    if not system_ready or student_index is None:
+        return jsonify({"error": "System not ready"}), 500
+
+    body = request.get_json(silent=True)
+    if not isinstance(body, dict) or not isinstance(body.get('ids'), list):
+        return jsonify({"error": "请求体必须为 JSON 对象，并包含 ids 列表"}), 400
+    student_ids = body['ids']
+    if len(student_ids) > MAX_BATCH_SIZE:
+        return jsonify({"error": f"单次最多请求 {MAX_BATCH_SIZE} 个学生"}), 400
+    output_format = body.get('format', 'records')
+    if output_format not in ('records', 'columnar'):
+        return jsonify({"error": f"不支持的输出格式: {output_format}"}), 400
+
+    try:
+        positions, _, missing = student_index.positions_of(student_ids)
+        columns = _build_student_columns(student_index, positions)
+        if output_format == 'columnar':
+            return jsonify({"columns": columns, "missing": missing})
+        return jsonify({"students": _columns_to_payloads(columns), "missing": missing})
+
+    except Exception as e:
+        print(f"批量获取学生数据时发生错误: {e}")
+        traceback.print_exc()
+        return jsonify({"error": "批量获取学生数据时发生内部错误", "details": str(e)}), 500
+
 @app.route('/api/student/<int:student_id>/plan', methods=['GET'])
 def get_student_plan(student_id):
     """API endpoint to get personalized advice for a single student."""
-    global agent, system_ready, student_data
+    global agent, system_ready
+    student_index = current_index()
 
-    if not system_ready or agent is None or student_data is None:
+    if not system_ready or agent is None or student_index is None:
         return jsonify({"error": "System not ready or agent not initialized"}), 500
 
     # 验证 student_id
-    if student_id not in student_data['student_id'].values:
+    if student_id not in student_index:
         return jsonify({"error": f"找不到学生ID {student_id}"}), 404
 
+    if _wants_async():
+        return _submit_job('plan', student_id, student_index.version)
+
     try:
         # 调用 StudentAgent 生成建议
         advice = agent.generate_recommendations(student_id)
@@ -312,6 +785,133 @@ def get_student_plan(student_id):
         traceback.print_exc()
         return jsonify({"error": f"无法获取学生 {student_id} 的计划: {str(e)}"}), 500
 
+# --- 异步任务 ---
+def _details_job(student_id):
+    with llm_accounting.endpoint('job:details'):
+        result = _compute_student_details(student_id)
+    if result is None:
+        raise ValueError(f"无法分析学生 {student_id}")
+    return result
+
+def _plan_job(student_id):
+    with llm_accounting.endpoint('job:plan'):
+        advice = agent.generate_recommendations(student_id)
+    if advice.get("error"):
+        raise ValueError(advice["error"])
+    return advice
+
+job_queue.register('details', _details_job)
+job_queue.register('plan', _plan_job)
+
+def _wants_async():
+    """请求是否要求以异步任务方式执行（?async=1）"""
+    return request.args.get('async', '').lower() in ('1', 'true', 'yes')
+
+def _submit_job(operation, student_id, version):
+    """提交分析任务，立即返回 202 和任务状态"""
+    try:
+        job = job_queue.submit(operation, student_id, version=version)
+    except QueueFullError as e:
+        response = jsonify({"error": str(e)})
+        response.headers['Retry-After'] = '5'
+        return response, 503
+
+    response = jsonify(job.to_dict())
+    response.headers['Location'] = f"/api/jobs/{job.job_id}"
+    return response, 202
+
+@app.route('/api/jobs', methods=['POST'])
+def create_job():
+    """提交异步分析任务。请求体: {"operation": "details" | "plan", "student_id": 学生ID}"""
+    global agent, system_ready
+    student_index = current_index()
+
+    if not system_ready or agent is None or student_index is None:
+        return jsonify({"error": "System not ready or agent not initialized"}), 500
+
+    payload = request.get_json(silent=True) or {}
+    operation = payload.get('operation')
+    if operation not in job_queue.operations:
+        return jsonify({"error": f"operation 必须为 {job_queue.operations} 之一"}), 400
+
+    try:
+        student_id = int(payload.get('student_id'))
+    except (TypeError, ValueError):
+        return jsonify({"error": "student_id 必须为整数"}), 400
+
+    if student_id not in student_index:
+        return jsonify({"error": f"找不到学生ID {student_id}"}), 404
+
+    return _submit_job(operation, student_id, student_index.version)
+
+@app.route('/api/jobs/metrics', methods=['GET'])
+def get_job_metrics():
+    """返回任务队列的深度、执行中任务数和等待/执行时间统计"""
+    return jsonify(job_queue.metrics())
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """查询任务状态，完成后附带结果。可用 ?wait=秒数 长轮询等待完成。"""
+    wait = request.args.get('wait', 0, type=float) or 0
+    job = job_queue.wait(job_id, timeout=min(wait, 30)) if wait > 0 else job_queue.get(job_id)
+    if job is None:
+        return jsonify({"error": f"找不到任务 {job_id}"}), 404
+    return jsonify(job.to_dict())
+
+@app.route('/api/jobs/<job_id>/events', methods=['GET'])
+def stream_job_events(job_id):
+    """以 Server-Sent Events 推送任务状态，任务完成时推送结果后关闭"""
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({"error": f"找不到任务 {job_id}"}), 404
+
+    def generate():
+        # 先立即推送当前状态，之后每次状态变化（排队 → 执行中 → 完成）时推送
+        status = job.status
+        yield _sse_event("status", job.to_dict(include_result=status in FINISHED_STATUSES))
+        while status not in FINISHED_STATUSES:
+            new_status = job.wait_for_change(status, timeout=15)
+            if new_status == status:
+                yield ": keep-alive\n\n"
+                continue
+            status = new_status
+            yield _sse_event("status", job.to_dict(include_result=status in FINISHED_STATUSES))
+
+    return Response(stream_with_context(generate()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+# --- 管理接口 ---
+@app.route('/api/admin/reload', methods=['POST'])
+def reload_dataset():
+    """触发后台重新加载 student_profiles.csv，构建完成后原子替换当前数据集"""
+    if dataset_holder is None:
+        return jsonify({"error": "System not ready"}), 500
+
+    # 未配置管理令牌时不开放该接口；令牌按常数时间比较
+    admin_token = DATASET_CONFIG['admin_token']
+    if not admin_token:
+        return jsonify({"error": "未配置管理令牌（ADMIN_TOKEN），该接口未启用"}), 404
+    if not hmac.compare_digest(request.headers.get('X-Admin-Token', '').encode('utf-8'), admin_token.encode('utf-8')):
+        return jsonify({"error": "无权执行该操作"}), 403
+
+    started = dataset_holder.reload(background=True)
+    return jsonify({"started": started, **dataset_holder.status()}), 202 if started else 409
+
+@app.route('/api/admin/dataset', methods=['GET'])
+def get_dataset_status():
+    """返回当前数据集版本、热加载状态和学生画像存储的占用情况"""
+    if dataset_holder is None:
+        return jsonify({"error": "System not ready"}), 500
+    status = dataset_holder.status()
+    if agent is not None:
+        status['profile_store'] = agent.student_profiles.stats()
+    return jsonify(status)
+
+@app.route('/api/admin/llm-usage', methods=['GET'])
+def get_llm_usage():
+    """返回本进程内按专家和入口汇总的大模型调用用量与耗时；完整记录见 JSONL 调用日志"""
+    return jsonify(llm_accounting.LLM_USAGE.summary())
+
 if __name__ == '__main__':
     # 设置 host='0.0.0.0' 以使其可在网络上访问（如果需要）
     app.run(debug=True, host='0.0.0.0', port=5010)
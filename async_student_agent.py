@@ -0,0 +1,273 @@
+import asyncio
+import json
+import time
+from config import AGENT_CONFIG, LLM_RATE_LIMIT_CONFIG
+from rate_limiter import AsyncLLMRateLimiter
+from single_flight import AsyncSingleFlight
+from llm_backends import create_async_llm_client
+from metrics import LLM_TIME_TO_FIRST_TOKEN, LLM_ERRORS
+from student_agent import StudentAgent, _CallCounter, _call_counter, _count_call
+
+
+class AsyncStudentAgent(StudentAgent):
+    """StudentAgent 的 asyncio 版本，基于异步大模型客户端与异步流式输出
+
+    analyze_student、generate_recommendations 和 generate_cohort_recommendations 为协程，
+    提示词、画像存储、回复缓存与调用记录均与同步版本共用。专家咨询以事件循环中的任务并发进行，
+    不占用线程，单个 worker（例如 ASGI 应用）即可同时持有数百个进行中的专家咨询；
+    同时进行的调用数由 AGENT_CONFIG['async_max_concurrency'] 限制，请求速率仍受令牌桶限制。
+
+    流式报告（stream_student_report）经同步的 analyze_student 生成诊断，仅由 StudentAgent 提供。
+    """
+
+    def __init__(self, dataset):
+        """初始化异步学生代理系统
+
+        Args:
+            dataset: 共享的学生数据索引（StudentIndex）或处理后的数据文件路径，同 StudentAgent
+        """
+        super().__init__(dataset)
+        self.async_client = create_async_llm_client(self.llm_backend)
+        self.limiter = AsyncLLMRateLimiter(**dict(
+            LLM_RATE_LIMIT_CONFIG,
+            max_concurrency=AGENT_CONFIG['async_max_concurrency'],
+            max_queue=AGENT_CONFIG['async_max_queue']
+        ))
+        self.flights = AsyncSingleFlight()
+
+    async def aclose(self):
+        """关闭异步客户端的连接池（例如在 ASGI 应用关闭时调用）"""
+        close = getattr(self.async_client, 'close', None)
+        if close is not None:
+            await close()
+
+    async def _astream_expert(self, expert_name, query, available_actions=None, model="Qwen/Qwen2.5-7B-Instruct-1M"):
+        """以异步流式方式咨询专家智能体，逐段产出模型返回的原始文本
+
+        Yields:
+            str: 模型输出的文本片段（未去除 action 标记）
+
+        Raises:
+            ValueError: 未知的专家
+            Exception: 模型调用失败时向调用方抛出
+        """
+        if expert_name not in self.expert_agents:
+            raise ValueError(f"未知的专家: {expert_name}")
+
+        messages = self._build_expert_messages(expert_name, query, available_actions)
+        prompt_chars = sum(len(message['content']) for message in messages)
+
+        # 缓存读写访问 SQLite，放到线程中执行以免阻塞事件循环
+        cache_key, cached = await asyncio.to_thread(
+            self._cache_lookup, expert_name, messages, model, prompt_chars, available_actions)
+        _count_call(cached is not None)
+        if cached is not None:
+            for content in cached:
+                yield content
+            return
+
+        start = time.perf_counter()
+        ttft = None
+        usage = None
+        outcome = 'error'
+        chunks = []
+        try:
+            async with self.limiter.slot():
+                response = await self.limiter.call(
+                    self.async_client.chat.completions.create,
+                    model=model,
+                    messages=messages,
+                    stream=True,
+                    # 要求服务端在最后一个片段中返回用量，用于记录准确的 token 数
+                    stream_options={"include_usage": True}
+                )
+
+                async for chunk in response:
+                    usage = getattr(chunk, 'usage', None) or usage
+                    try:
+                        content = chunk.choices[0].delta.content or ""
+                    except Exception:
+                        continue
+                    if content:
+                        if ttft is None:
+                            ttft = time.perf_counter() - start
+                            LLM_TIME_TO_FIRST_TOKEN.observe(ttft, expert=expert_name, model=model)
+                        chunks.append(content)
+                        yield content
+            outcome = 'success'
+            if cache_key is not None and chunks:
+                await asyncio.to_thread(self._cache_put, cache_key, chunks, expert_name, model)
+        except (GeneratorExit, asyncio.CancelledError):
+            # 调用方提前关闭或任务被取消（例如超时、客户端断开）
+            outcome = 'cancelled'
+            raise
+        except Exception as e:
+            LLM_ERRORS.inc(expert=expert_name, model=model, error=type(e).__name__)
+            raise
+        finally:
+            # 用量日志追加写入文件，同样放到线程中执行
+            await asyncio.to_thread(self._record_call, expert_name, model, prompt_chars, chunks, usage, ttft,
+                                    time.perf_counter() - start, outcome, available_actions)
+
+    async def _aconsult_expert(self, expert_name, query, available_actions=None, model="Qwen/Qwen2.5-7B-Instruct-1M"):
+        """咨询特定领域的专家智能体，参数与返回值同 StudentAgent._consult_expert"""
+        if expert_name not in self.expert_agents:
+            raise ValueError(f"未知的专家: {expert_name}")
+
+        print(f"正在咨询{expert_name}...")
+
+        try:
+            chunks = [content async for content in self._astream_expert(expert_name, query, available_actions, model)]
+            result = self._collect_expert_response(chunks, available_actions)
+            print(f"\n{expert_name}已完成分析")
+            return result
+
+        except Exception as e:
+            print(f"咨询专家时出错: {e}")
+            return {"action": None, "response": f"咨询{expert_name}失败: {str(e)}", "error": str(e)}
+
+    async def _ask_expert(self, expert_name, query, available_actions=None):
+        """咨询专家并限制等待时间；超时后取消调用，返回与咨询失败相同格式的结果"""
+        try:
+            return await asyncio.wait_for(self._aconsult_expert(expert_name, query, available_actions),
+                                          timeout=self.expert_timeout)
+        except asyncio.TimeoutError:
+            print(f"咨询{expert_name}超时（{self.expert_timeout}秒）")
+            return {"action": None, "response": f"咨询{expert_name}失败: 超时（{self.expert_timeout}秒）",
+                    "error": f"超时（{self.expert_timeout}秒）"}
+
+    def stream_student_report(self, student_id, include_diagnosis=True, include_recommendations=True):
+        """不支持：流式报告经同步的 analyze_student 与画像共享生成诊断，请使用 StudentAgent"""
+        raise NotImplementedError("AsyncStudentAgent 不提供流式报告，请使用 StudentAgent.stream_student_report")
+
+    async def _analyze_combined(self, analysis):
+        """一次调用中心调度智能体同时生成画像报告与综合诊断"""
+        try:
+            response = (await self._ask_expert("中心调度智能体", self._combined_analysis_query(analysis)))['response']
+            analysis['student_profile_report'], analysis['expert_diagnosis'] = self._split_combined_analysis(response)
+        except Exception as e:
+            print(f"中心调度智能体分析出错: {e}")
+            analysis['student_profile_report'] = "无法生成学生画像报告"
+            analysis['expert_diagnosis'] = "无法获取专家分析"
+
+    async def _analyze_parallel(self, analysis):
+        """并发调用中心调度智能体生成画像报告与综合诊断（诊断查询不包含画像报告）"""
+        report, diagnosis = await asyncio.gather(
+            self._ask_expert("中心调度智能体", self._profile_report_query(analysis)),
+            self._ask_expert("中心调度智能体", self._expert_diagnosis_query(analysis)),
+            return_exceptions=True
+        )
+        if isinstance(report, Exception) or isinstance(diagnosis, Exception):
+            print(f"中心调度智能体分析出错: {report if isinstance(report, Exception) else diagnosis}")
+            analysis['student_profile_report'] = "无法生成学生画像报告"
+            analysis['expert_diagnosis'] = "无法获取专家分析"
+            return
+        analysis['student_profile_report'] = report['response']
+        analysis['expert_diagnosis'] = diagnosis['response']
+
+    async def _analyze_sequential(self, analysis):
+        """依次调用中心调度智能体生成画像报告与综合诊断（诊断参考画像报告）"""
+        try:
+            analysis['student_profile_report'] = (
+                await self._ask_expert("中心调度智能体", self._profile_report_query(analysis)))['response']
+        except Exception as e:
+            print(f"中心调度智能体分析出错: {e}")
+            analysis['student_profile_report'] = "无法生成学生画像报告"
+
+        try:
+            analysis['expert_diagnosis'] = (
+                await self._ask_expert("中心调度智能体", self._expert_diagnosis_query(analysis)))['response']
+        except Exception as e:
+            print(f"中心调度智能体分析出错: {e}")
+            analysis['expert_diagnosis'] = "无法获取专家分析"
+
+    async def analyze_student(self, student_id):
+        """分析特定学生的数据并生成个性化评估，同 StudentAgent.analyze_student"""
+        return await self.flights.do('analyze_student', (student_id, self.index.version),
+                                     self._analyze_student, student_id)
+
+    async def _analyze_student(self, student_id):
+        version = self.index.version
+        analysis = self._build_basic_analysis(student_id)
+        if analysis is None:
+            return None
+
+        if self.analysis_mode == 'combined':
+            await self._analyze_combined(analysis)
+        elif self.analysis_mode == 'parallel':
+            await self._analyze_parallel(analysis)
+        else:
+            await self._analyze_sequential(analysis)
+
+        # 画像存储可能读写磁盘上的溢出文件，放到线程中执行
+        await asyncio.to_thread(self.student_profiles.put, student_id, analysis, version)
+        print(json.dumps(analysis, indent=2, ensure_ascii=False))
+        return analysis
+
+    async def generate_recommendations(self, student_id, analyze=True):
+        """使用多专家系统为学生生成个性化学习建议，同 StudentAgent.generate_recommendations
+
+        Args:
+            student_id: 学生ID
+            analyze: 没有保存的画像时是否先调用 analyze_student，为 False 时基于基础分析生成
+
+        Returns:
+            dict: 包含多个维度的专家建议
+        """
+        return await self.flights.do('generate_recommendations', (student_id, self.index.version, analyze),
+                                     self._generate_recommendations, student_id, analyze)
+
+    async def _generate_recommendations(self, student_id, analyze=True):
+        profile = await asyncio.to_thread(self.student_profiles.get, student_id)
+        if profile is None:
+            profile = await self.analyze_student(student_id) if analyze else self._build_basic_analysis(student_id)
+
+        if profile is None:
+            return {"error": "无法获取学生数据"}
+
+        return await self._arecommend_for_profile(student_id, profile)
+
+    async def _arecommend_for_profile(self, student_id, profile):
+        """根据画像并发咨询四位维度专家生成建议，参数与返回值同 StudentAgent._recommend_for_profile"""
+        recommendations = self._empty_recommendations()
+
+        # 四位维度专家并发咨询，按原有顺序合并结果
+        queries = self._recommendation_queries(student_id, profile)
+        tasks = [asyncio.create_task(self._ask_expert(expert_name, query, actions))
+                 for _, expert_name, query, actions in queries]
+        try:
+            for (dimension, _, _, _), task in zip(queries, tasks):
+                expert_response = await task
+                followup = self._apply_expert_response(student_id, profile, dimension, expert_response, recommendations)
+                if followup:
+                    self._apply_followup(await self._ask_expert(*followup), recommendations)
+        finally:
+            for task in tasks:
+                task.cancel()
+
+        return self._finalize_recommendations(recommendations)
+
+    async def generate_cohort_recommendations(self, student_ids=None, granularity=None, min_bucket_size=None):
+        """为一批学生按画像分组批量生成建议，参数与返回值同 StudentAgent.generate_cohort_recommendations"""
+        granularity, buckets, eligible, missing = self._plan_cohort(student_ids, granularity, min_bucket_size)
+        limit = asyncio.Semaphore(AGENT_CONFIG['cohort_max_workers'])
+
+        async def recommend(bucket):
+            async with limit:
+                try:
+                    return await self._arecommend_for_profile(None, bucket['profile'])
+                except Exception as e:
+                    print(f"为分组 {bucket['bucket_id']} 生成建议出错: {e}")
+                    return None
+
+        # 计数器随上下文传入 gather 创建的各个任务
+        counter = _CallCounter()
+        token = _call_counter.set(counter)
+        try:
+            results = await asyncio.gather(*(recommend(bucket) for bucket in eligible))
+        finally:
+            _call_counter.reset(token)
+        for bucket, recommendations in zip(eligible, results):
+            bucket['recommendations'] = recommendations
+
+        return self._cohort_result(granularity, buckets, missing, counter)
@@ -0,0 +1,199 @@
+import numpy as np
+import pandas as pd
+from config import COHORT_STATS_CONFIG
+
+# 统计的维度得分字段 → 数据列
+DIMENSION_COLUMNS = {
+    'knowledge_score': '知识维度_综合得分',
+    'cognitive_score': '认知维度_综合得分',
+    'affective_score': '情感维度_综合得分',
+    'behavioral_score': '行为维度_综合得分'
+}
+# 分组统计的输出名 → 分组列
+GROUP_COLUMNS = {
+    'by_student_type': '学生类型',
+    'by_cluster': 'Cluster'
+}
+
+
+def _quantile(sorted_values, q):
+    """对已排序数组按线性插值取分位数（与 pandas/numpy 默认方法一致），O(1)"""
+    position = q * (len(sorted_values) - 1)
+    lower = int(np.floor(position))
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return float(sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower))
+
+
+class _ScoreAccumulator:
+    """单个维度得分的可增量合并统计状态：有序取值、累加和与直方图计数"""
+
+    __slots__ = ('values', 'total', 'histogram')
+
+    def __init__(self, values, total, histogram):
+        self.values = values
+        self.total = total
+        self.histogram = histogram
+
+    @staticmethod
+    def _histogram(values, edges):
+        # 超出 [0, 1] 的得分计入两端的分箱
+        counts, _ = np.histogram(np.clip(values, edges[0], edges[-1]), bins=edges)
+        return counts
+
+    @classmethod
+    def from_values(cls, values, edges):
+        values = np.sort(values[~np.isnan(values)])
+        return cls(values, float(values.sum()), cls._histogram(values, edges))
+
+    def merged(self, values, edges):
+        """返回合并新增取值后的新状态，原状态保持不变"""
+        values = np.sort(values[~np.isnan(values)])
+        if len(values) == 0:
+            return self
+        merged = np.insert(self.values, np.searchsorted(self.values, values, side='right'), values)
+        return _ScoreAccumulator(merged, self.total + float(values.sum()),
+                                 self.histogram + self._histogram(values, edges))
+
+    def summary(self, quantiles):
+        count = len(self.values)
+        if count == 0:
+            return {'count': 0, 'mean': None, 'median': None, 'min': None, 'max': None,
+                    'quantiles': {str(q): None for q in quantiles},
+                    'histogram': self.histogram.tolist()}
+        return {
+            'count': count,
+            'mean': round(self.total / count, 4),
+            'median': round(_quantile(self.values, 0.5), 4),
+            'min': round(float(self.values[0]), 4),
+            'max': round(float(self.values[-1]), 4),
+            'quantiles': {str(q): round(_quantile(self.values, q), 4) for q in quantiles},
+            'histogram': self.histogram.tolist(),
+        }
+
+
+class CohortStats:
+    """全体学生各维度得分的统计（均值、中位数、分位数、直方图及按学生类型/聚类的分组统计）
+
+    每个数据集版本只计算一次；追加学生时通过 extended() 增量合并，
+    无需对全体数据重新排序。实例创建后不再修改，可在线程间直接共享。
+    """
+
+    def __init__(self, data, version=None):
+        """
+        Args:
+            data: 学生数据 DataFrame
+            version: 数据集版本标识
+        """
+        self.version = version
+        self.quantiles = list(COHORT_STATS_CONFIG['quantiles'])
+        self.edges = np.linspace(0.0, 1.0, COHORT_STATS_CONFIG['histogram_bins'] + 1)
+        self.count = 0
+        # (分组名, 分组取值) → {维度字段: _ScoreAccumulator}，全体为 (None, None)
+        self._groups = {}
+        self._counts = {}
+        self._summary = None
+        self._add(data)
+
+    def _dimension_values(self, data):
+        return {field: pd.to_numeric(data[column], errors='coerce').to_numpy(dtype='float64')
+                for field, column in DIMENSION_COLUMNS.items() if column in data.columns}
+
+    def _group_positions(self, data):
+        """返回 (分组键, 行位置数组) 列表，包括全体"""
+        groups = [((None, None), np.arange(len(data)))]
+        for name, column in GROUP_COLUMNS.items():
+            if column not in data.columns:
+                continue
+            codes, uniques = pd.factorize(data[column])
+            for code, value in enumerate(uniques):
+                value = value.item() if hasattr(value, 'item') else value
+                groups.append(((name, value), np.flatnonzero(codes == code)))
+        return groups
+
+    def _add(self, data):
+        dimensions = self._dimension_values(data)
+        for key, positions in self._group_positions(data):
+            accumulators = self._groups.get(key)
+            if accumulators is None:
+                self._groups[key] = {field: _ScoreAccumulator.from_values(values[positions], self.edges)
+                                     for field, values in dimensions.items()}
+            else:
+                self._groups[key] = {field: accumulators[field].merged(values[positions], self.edges)
+                                     for field, values in dimensions.items()}
+            self._counts[key] = self._counts.get(key, 0) + len(positions)
+        self.count += len(data)
+
+    def extended(self, rows, version=None):
+        """返回追加学生后的新统计对象（增量合并，当前对象保持不变）
+
+        Args:
+            rows: 新增学生数据 DataFrame
+            version: 新的数据集版本标识
+        """
+        stats = object.__new__(CohortStats)
+        stats.version = version
+        stats.quantiles = self.quantiles
+        stats.edges = self.edges
+        stats.count = self.count
+        stats._groups = dict(self._groups)
+        stats._counts = dict(self._counts)
+        stats._summary = None
+        stats._add(rows)
+        return stats
+
+    def summary(self):
+        """返回可直接序列化的统计结果（首次调用时生成并缓存）"""
+        if self._summary is not None:
+            return self._summary
+
+        def dimensions(key):
+            return {field: accumulator.summary(self.quantiles)
+                    for field, accumulator in self._groups[key].items()}
+
+        summary = {
+            'version': self.version,
+            'count': self.count,
+            'histogram_edges': [round(float(edge), 4) for edge in self.edges],
+            'dimensions': dimensions((None, None)),
+        }
+        for name in GROUP_COLUMNS:
+            breakdown = {}
+            for key in self._groups:
+                if key[0] == name:
+                    breakdown[str(key[1])] = {'count': self._counts[key], 'dimensions': dimensions(key)}
+            summary[name] = breakdown
+        self._summary = summary
+        return summary
+
+
+def _appended_positions(new_index, old_index):
+    """若新数据集是在旧数据集末尾追加学生得到的，返回新增行的起始位置，否则返回 None"""
+    old_len = len(old_index)
+    if len(new_index) < old_len or not np.array_equal(new_index.ids[:old_len], old_index.ids):
+        return None
+    for column in list(DIMENSION_COLUMNS.values()) + list(GROUP_COLUMNS.values()):
+        in_new, in_old = column in new_index.data.columns, column in old_index.data.columns
+        if in_new != in_old:
+            return None
+        if in_new and not new_index.data[column].iloc[:old_len].reset_index(drop=True).equals(
+                old_index.data[column].reset_index(drop=True)):
+            return None
+    return old_len
+
+
+def stats_for_index(new_index, previous=None, old_index=None):
+    """为数据集索引计算群体统计；新数据集仅在旧数据集末尾追加学生时增量更新
+
+    Args:
+        new_index: 新的学生数据索引
+        previous: 旧数据集的 CohortStats
+        old_index: 旧的学生数据索引
+
+    Returns:
+        CohortStats: 新数据集的统计
+    """
+    if previous is not None and old_index is not None:
+        start = _appended_positions(new_index, old_index)
+        if start is not None:
+            return previous.extended(new_index.data.iloc[start:], version=new_index.version)
+    return CohortStats(new_index.data, version=new_index.version)
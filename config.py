@@ -50,3 +50,159 @@ db_config = {
     'password': os.getenv('MYSQL_PASSWORD', ''),
     'database': os.getenv('MYSQL_DATABASE', 'student_portrait_system')
 }
+
+# 数据库连接池配置
+DB_POOL_CONFIG = {
+    # 连接池名称与连接数（mysql.connector 限制每个连接池最多 32 个连接）
+    'pool_name': os.getenv('MYSQL_POOL_NAME', 'student_portrait_pool'),
+    'pool_size': int(os.getenv('MYSQL_POOL_SIZE', 5)),
+    # 连接全部被占用时等待空闲连接的最长时间（秒）
+    'acquire_timeout': float(os.getenv('MYSQL_POOL_ACQUIRE_TIMEOUT', 30)),
+    # 取出连接时先 ping 检查连接是否可用，已断开时自动重连
+    'health_check': os.getenv('MYSQL_POOL_HEALTH_CHECK', '1') != '0',
+    # 是否允许 LOAD DATA LOCAL INFILE（服务端也需开启 local_infile）
+    'allow_local_infile': os.getenv('MYSQL_ALLOW_LOCAL_INFILE', '0') != '0'
+}
+
+# 批量写入配置
+DB_BULK_CONFIG = {
+    # 每个事务写入的行数
+    'chunk_size': int(os.getenv('DB_BULK_CHUNK_SIZE', 1000)),
+    # executemany（多行 VALUES 批量插入）或 load_data（临时 CSV + LOAD DATA LOCAL INFILE）
+    'method': os.getenv('DB_BULK_METHOD', 'executemany'),
+    # 导入 Excel 时用于推断列类型的行数
+    'schema_sample_rows': int(os.getenv('DB_IMPORT_SAMPLE_ROWS', 1000))
+}
+
+# 学生索引配置
+INDEX_CONFIG = {
+    # 行数不超过该值时在构建索引时预先生成每行记录，否则首次访问时再生成
+    'prebuild_records_limit': int(os.getenv('INDEX_PREBUILD_RECORDS_LIMIT', 100000))
+}
+
+# 响应缓存配置
+CACHE_CONFIG = {
+    # 学生基本数据响应体缓存的最大条目数
+    'payload_max_entries': int(os.getenv('PAYLOAD_CACHE_MAX_ENTRIES', 100000))
+}
+
+# 异步任务队列配置（用于 /details、/plan 等调用大模型的分析任务）
+JOB_QUEUE_CONFIG = {
+    # 同时执行分析任务的工作线程数
+    'max_workers': int(os.getenv('JOB_MAX_WORKERS', 4)),
+    # 排队等待的任务上限，超出后拒绝新任务
+    'max_pending': int(os.getenv('JOB_MAX_PENDING', 100)),
+    # 已完成任务结果的保留时间（秒），期间相同请求直接复用结果
+    'result_ttl': int(os.getenv('JOB_RESULT_TTL', 3600)),
+    # 最多保留的已完成任务数
+    'max_results': int(os.getenv('JOB_MAX_RESULTS', 10000))
+}
+
+# 数据集热加载配置
+DATASET_CONFIG = {
+    # 轮询 student_profiles.csv 变化的间隔（秒），0 表示不监视，仅支持手动触发
+    'watch_interval': float(os.getenv('DATASET_WATCH_INTERVAL', 0)),
+    # 调用 /api/admin/reload 所需的令牌（请求头 X-Admin-Token），为空时该接口不启用
+    'admin_token': os.getenv('ADMIN_TOKEN', '')
+}
+
+# 数据快照配置（处理后学生数据的按列二进制存储，用于快速启动）
+SNAPSHOT_CONFIG = {
+    # 是否在加载/保存 student_profiles.csv 时使用快照
+    'enabled': os.getenv('DATA_SNAPSHOT_ENABLED', '1') != '0',
+    # 数值列是否以内存映射方式加载
+    'mmap': os.getenv('DATA_SNAPSHOT_MMAP', '1') != '0'
+}
+
+# 群体统计配置
+COHORT_STATS_CONFIG = {
+    # 各维度得分直方图的分箱数（得分范围 0-1）
+    'histogram_bins': int(os.getenv('COHORT_HISTOGRAM_BINS', '10')),
+    # 输出的分位点
+    'quantiles': [0.1, 0.25, 0.5, 0.75, 0.9]
+}
+
+# 学生代理配置
+AGENT_CONFIG = {
+    # 并发咨询各维度专家的线程数（进程内所有请求共享）
+    'expert_max_workers': int(os.getenv('AGENT_EXPERT_MAX_WORKERS', 8)),
+    # 单个专家咨询的超时时间（秒），从提交时开始计算
+    'expert_timeout': float(os.getenv('AGENT_EXPERT_TIMEOUT', 120)),
+    # analyze_student 中两次中心调度智能体调用的方式：
+    # sequential（依次调用，诊断可参考画像报告）、parallel（并发调用）、combined（一次结构化调用同时生成两部分）
+    'analysis_mode': os.getenv('AGENT_ANALYSIS_MODE', 'sequential'),
+    # 群体批量建议：每个维度得分量化的档位数（得分 0-1 等分）
+    'cohort_granularity': int(os.getenv('AGENT_COHORT_GRANULARITY', 4)),
+    # 群体批量建议：成员数少于该值的分组不生成建议
+    'cohort_min_bucket_size': int(os.getenv('AGENT_COHORT_MIN_BUCKET_SIZE', 1)),
+    # 群体批量建议：同时处理的分组数
+    'cohort_max_workers': int(os.getenv('AGENT_COHORT_MAX_WORKERS', 2)),
+    # AsyncStudentAgent：单个事件循环内同时进行的专家调用数上限与排队数上限（令牌桶限速同 LLM_RATE_LIMIT_CONFIG）
+    'async_max_concurrency': int(os.getenv('AGENT_ASYNC_MAX_CONCURRENCY', 200)),
+    'async_max_queue': int(os.getenv('AGENT_ASYNC_MAX_QUEUE', 1000))
+}
+
+# 大模型回复磁盘缓存配置
+LLM_CACHE_CONFIG = {
+    # 是否启用缓存
+    'enabled': os.getenv('LLM_CACHE_ENABLED', '1') != '0',
+    # SQLite 缓存文件路径
+    'path': os.getenv('LLM_CACHE_PATH', 'llm_cache.sqlite3'),
+    # 条目有效期（秒），0 表示永不过期
+    'ttl': int(os.getenv('LLM_CACHE_TTL', 7 * 24 * 3600)),
+    # 缓存回复的总字节数上限
+    'max_bytes': int(os.getenv('LLM_CACHE_MAX_BYTES', 256 * 1024 * 1024))
+}
+
+# 学生画像存储配置
+PROFILE_STORE_CONFIG = {
+    # 内存中最多保存的学生画像数
+    'max_entries': int(os.getenv('PROFILE_STORE_MAX_ENTRIES', 1000)),
+    # 内存中学生画像的估算总字节数上限
+    'max_bytes': int(os.getenv('PROFILE_STORE_MAX_BYTES', 64 * 1024 * 1024)),
+    # 画像有效期（秒），0 表示永不过期
+    'ttl': int(os.getenv('PROFILE_STORE_TTL', 24 * 3600)),
+    # 被淘汰画像的溢出目录，为空时直接丢弃
+    'spill_dir': os.getenv('PROFILE_STORE_SPILL_DIR', '')
+}
+
+# 大模型调用限流与重试配置（进程内所有调用共享）
+LLM_RATE_LIMIT_CONFIG = {
+    # 同时进行的调用数上限（含流式输出期间）
+    'max_concurrency': int(os.getenv('LLM_MAX_CONCURRENCY', 4)),
+    # 平均每秒发起的请求数
+    'requests_per_second': float(os.getenv('LLM_REQUESTS_PER_SECOND', 2)),
+    # 允许的瞬时突发请求数
+    'burst': int(os.getenv('LLM_BURST', 4)),
+    # 限流或服务端临时错误的最大重试次数
+    'max_retries': int(os.getenv('LLM_MAX_RETRIES', 4)),
+    # 指数退避的初始等待时间与单次等待上限（秒）
+    'base_delay': float(os.getenv('LLM_RETRY_BASE_DELAY', 1)),
+    'max_delay': float(os.getenv('LLM_RETRY_MAX_DELAY', 30)),
+    # 排队等待调用名额的最长时间（秒）与排队数上限
+    'queue_timeout': float(os.getenv('LLM_QUEUE_TIMEOUT', 60)),
+    'max_queue': int(os.getenv('LLM_MAX_QUEUE', 100))
+}
+
+# 大模型后端配置
+LLM_BACKEND_CONFIG = {
+    # modelscope：OpenAI 兼容的 ModelScope 接口；fake：进程内确定性替身，用于离线压测与回归测试
+    'backend': os.getenv('LLM_BACKEND', 'modelscope'),
+    # 替身模型首个片段前的等待时间（秒）
+    'fake_first_token_latency': float(os.getenv('FAKE_LLM_FIRST_TOKEN_LATENCY', 0.5)),
+    # 替身模型每秒输出的片段数，0 表示不限速
+    'fake_tokens_per_second': float(os.getenv('FAKE_LLM_TOKENS_PER_SECOND', 20)),
+    # 替身模型每次回复的片段数
+    'fake_response_tokens': int(os.getenv('FAKE_LLM_RESPONSE_TOKENS', 8)),
+    # 替身模型调用失败的概率（0-1）与错误注入的随机种子
+    'fake_error_rate': float(os.getenv('FAKE_LLM_ERROR_RATE', 0)),
+    'fake_seed': int(os.getenv('FAKE_LLM_SEED', 0))
+}
+
+# 大模型调用记录配置
+LLM_USAGE_CONFIG = {
+    # 是否将每次专家调用写入 JSONL 日志
+    'enabled': os.getenv('LLM_USAGE_LOG_ENABLED', '1') != '0',
+    # 调用日志文件路径
+    'path': os.getenv('LLM_USAGE_LOG_PATH', 'llm_usage.jsonl')
+}
@@ -159,10 +159,13 @@ def identify_student_types(df):
     
     return df_result
 
-from db_utils import insert_student_data, insert_recommendation_data
-from student_agent import StudentAgent
-
 if __name__ == "__main__":
+    # 仅命令行运行时需要数据库与学生代理；作为模块导入（Web 服务、可视化）时不加载
+    from db_utils import bulk_insert_students, bulk_insert_recommendations, recommendations_to_frame, RECOMMENDATION_DIMENSIONS
+    from config import DB_BULK_CONFIG
+    from dataset_holder import build_student_index
+    from student_agent import StudentAgent
+
     file_path = 'student_profiles.csv'  # 替换为你的数据文件路径
     df = load_data(file_path)
     if df is not None:
@@ -175,40 +178,22 @@ if __name__ == "__main__":
                     print("\nProcessed Data:")
                     print(df_identified.head())
 
-                    # 初始化 StudentAgent
-                    student_agent = StudentAgent(file_path)
-
-                    # 存储数据到数据库
-                    for index, row in df_identified.iterrows():
-                        student_id = int(row['CNTSTUID'])
-                        student_data = {
-                            'student_id': student_id,  # 使用 CNTSTUID 作为 student_id
-                            'student_type': row['学生类型'],
-                            'knowledge_score': row['知识维度_综合得分'] if '知识维度_综合得分' in row else None,
-                            'cognitive_score': row['认知维度_综合得分'] if '认知维度_综合得分' in row else None,
-                            'affective_score': row['情感维度_综合得分'] if '情感维度_综合得分' in row else None,
-                            'behavioral_score': row['行为维度_综合得分'] if '行为维度_综合得分' in row else None,
-                            'CNTSTUID': row['CNTSTUID'] if 'CNTSTUID' in row else None,
-                            'ST004D01T': row['ST004D01T'] if 'ST004D01T' in row else None,
-                            'ST001D01T': row['ST001D01T'] if 'ST001D01T' in row else None,
-                            'PV1MATH': row['PVMATH'] if 'PVMATH' in row else None,
-                            'PV1READ': row['PVREAD'] if 'PVREAD' in row else None,
-                            'PV1SCIE': row['PVSCIE'] if 'PV1SCIE' in row else None,
-                            'ST099Q01TA': row['ST099Q01TA'] if 'ST099Q01TA' in row else None,
-                            'ST099Q02TA': row['ST099Q02TA'] if 'ST099Q02TA' in row else None,
-                            'ST099Q03TA': row['ST099Q03TA'] if 'ST099Q03TA' in row else None,
-                            'ST099Q04TA': row['ST099Q04TA'] if 'ST099Q04TA' in row else None
-                        }
-                        insert_student_data(student_data)
+                    # 初始化 StudentAgent：直接使用内存中处理好的数据，无需再从文件读取一次
+                    student_agent = StudentAgent(build_student_index(df_identified, file_path))
 
-                        # 生成并存储推荐
-                        recommendations = student_agent.generate_recommendations(student_id)
+                    # 批量写入全部学生（推荐表引用学生表，须先写入学生）
+                    bulk_insert_students(df_identified)
 
-                        if recommendations:
-                            insert_recommendation_data(student_id, '知识维度', recommendations.get('知识维度', ''))
-                            insert_recommendation_data(student_id, '认知维度', recommendations.get('认知维度', ''))
-                            insert_recommendation_data(student_id, '情感维度', recommendations.get('情感维度', ''))
-                            insert_recommendation_data(student_id, '行为维度', recommendations.get('行为维度', ''))
+                    # 生成推荐，每积累约一批（chunk_size 行）再批量写入，中途中断时已写入的推荐不会丢失
+                    pending = {}
+                    batch_students = max(1, DB_BULK_CONFIG['chunk_size'] // len(RECOMMENDATION_DIMENSIONS))
+                    for student_id in pd.to_numeric(df_identified['CNTSTUID'], errors='coerce').dropna().astype(int):
+                        pending[student_id] = student_agent.generate_recommendations(student_id)
+                        if len(pending) >= batch_students:
+                            bulk_insert_recommendations(recommendations_to_frame(pending))
+                            pending = {}
+                    if pending:
+                        bulk_insert_recommendations(recommendations_to_frame(pending))
                 else:
                     print("学生类型识别失败")
             else:
@@ -0,0 +1,183 @@
+import os
+import threading
+import time
+import traceback
+import snapshot
+from student_index import StudentIndex, dataset_version
+
+
+def prepare_student_data(student_data):
+    """统一学生ID列：以 CNTSTUID 作为 student_id，并确保为整数类型"""
+    student_data['student_id'] = student_data['CNTSTUID']
+    # 确保 student_id 即使从没有它的 CSV 加载也存在
+    if 'student_id' not in student_data.columns:
+        print("警告: CSV 中缺少 'student_id' 列，生成序列 ID。")
+        student_data['student_id'] = range(1, len(student_data) + 1)
+    else:
+        # 确保 student_id 是整数类型
+        student_data['student_id'] = student_data['student_id'].astype(int)
+    return student_data
+
+
+def build_student_index(student_data, data_file_path, version=None):
+    """由内存中的处理后数据构建共享的学生数据索引
+
+    Args:
+        student_data: 处理后的学生数据
+        data_file_path: 对应的数据文件路径
+        version: 数据集版本；为 None 时取自数据文件当前的状态
+    """
+    if version is None:
+        version = dataset_version(data_file_path)
+    return StudentIndex(prepare_student_data(student_data), id_column='student_id', version=version)
+
+
+def load_student_index(data_file_path, attempts=3):
+    """从处理后的数据文件加载学生数据，并构建学生ID哈希索引
+
+    Web 服务、命令行脚本和学生代理共用该函数加载的同一份只读数据。
+    版本在读取前取得：读取期间文件被改写时重新读取；多次重试仍不一致时，
+    数据至少与该版本一样新，监视线程会发现更新的版本并再次加载，不会遗漏。
+
+    Args:
+        data_file_path: 处理后的数据文件路径
+        attempts: 读取期间文件被改写时的最多读取次数
+    """
+    for attempt in range(attempts):
+        version = dataset_version(data_file_path)
+        student_data = snapshot.load_profiles(data_file_path)
+        if dataset_version(data_file_path) == version:
+            break
+        print(f"数据文件 {data_file_path} 在读取期间被修改（第 {attempt + 1} 次），重新读取")
+    print(f"Loaded processed data from {data_file_path}, {len(student_data)} records.")
+    # 构建学生ID哈希索引，避免每个请求都全表扫描
+    return build_student_index(student_data, data_file_path, version)
+
+
+class DatasetHolder:
+    """版本化数据集持有者
+
+    持有当前的学生数据索引（StudentIndex）。重新加载时在后台构建新的
+    DataFrame 和索引，构建成功后通过一次引用赋值原子替换；正在处理的请求
+    继续使用它们开始时取到的旧版本，不会被中断。加载失败时保留旧版本。
+    """
+
+    def __init__(self, file_path, loader, initial=None):
+        """
+        Args:
+            file_path: 处理后的学生数据文件路径
+            loader: 加载函数，loader(file_path) 返回带 version 的 StudentIndex
+            initial: 已构建好的初始索引；为 None 时立即调用 loader 加载
+        """
+        self.file_path = file_path
+        self.loader = loader
+        self.current = initial if initial is not None else loader(file_path)
+        self.last_error = None
+        self.last_reload_at = None
+        self.reload_count = 0
+
+        self._listeners = []
+        self._reload_lock = threading.Lock()
+        self._watcher = None
+        self._stop_event = threading.Event()
+
+    @property
+    def version(self):
+        return self.current.version if self.current is not None else None
+
+    def add_listener(self, callback):
+        """注册数据集替换后的回调，callback(new_index, old_index)，用于同步代理数据和清理缓存"""
+        self._listeners.append(callback)
+
+    def reload(self, background=False):
+        """重新加载数据文件并替换当前数据集
+
+        Args:
+            background: 为 True 时在后台线程中加载并立即返回
+
+        Returns:
+            bool: 前台加载时表示是否成功替换；后台加载时表示是否已启动（已有加载进行中时为 False）
+        """
+        if not self._reload_lock.acquire(blocking=False):
+            print("数据集正在重新加载，忽略本次请求")
+            return False
+
+        if background:
+            thread = threading.Thread(target=self._reload_locked, name='dataset-reload', daemon=True)
+            thread.start()
+            return True
+        return self._reload_locked()
+
+    def _reload_locked(self):
+        try:
+            print(f"开始重新加载数据集: {self.file_path}")
+            start = time.time()
+            new_index = self.loader(self.file_path)
+            old_index = self.current
+            self.current = new_index
+            self.last_error = None
+            self.last_reload_at = time.time()
+            self.reload_count += 1
+            print(f"数据集已切换到版本 {new_index.version}（{len(new_index)} 条记录，耗时 {time.time() - start:.2f} 秒）")
+
+            for callback in self._listeners:
+                try:
+                    callback(new_index, old_index)
+                except Exception as e:
+                    print(f"数据集切换回调出错: {e}")
+                    traceback.print_exc()
+            return True
+        except Exception as e:
+            self.last_error = str(e)
+            print(f"重新加载数据集失败，继续使用版本 {self.version}: {e}")
+            traceback.print_exc()
+            return False
+        finally:
+            self._reload_lock.release()
+
+    def start_watching(self, interval):
+        """启动后台线程轮询数据文件，文件变化且稳定一个轮询周期后自动重新加载"""
+        if self._watcher is not None or interval <= 0:
+            return
+        self._stop_event.clear()
+        self._watcher = threading.Thread(target=self._watch, args=(interval,), name='dataset-watcher', daemon=True)
+        self._watcher.start()
+        print(f"已开始监视数据文件 {self.file_path}（每 {interval} 秒检查一次）")
+
+    def stop_watching(self):
+        self._stop_event.set()
+        self._watcher = None
+
+    def _file_version(self):
+        try:
+            return dataset_version(self.file_path)
+        except OSError:
+            return None
+
+    def _watch(self, interval):
+        pending = None
+        while not self._stop_event.wait(interval):
+            observed = self._file_version()
+            if observed is None or observed == self.version:
+                pending = None
+                continue
+            # 文件可能仍在写入，等到连续两次检查结果一致后再加载
+            if observed != pending:
+                pending = observed
+                continue
+            pending = None
+            self.reload()
+
+    def status(self):
+        """返回当前版本、文件状态和最近一次加载信息"""
+        return {
+            'file_path': os.path.abspath(self.file_path),
+            'version': self.version,
+            'file_version': self._file_version(),
+            'records': len(self.current) if self.current is not None else 0,
+            'reload_count': self.reload_count,
+            'last_reload_at': self.last_reload_at,
+            'last_error': self.last_error,
+            'reloading': self._reload_lock.locked(),
+            'watching': self._watcher is not None
+        }
@@ -1,32 +1,201 @@
+import itertools
+import math
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
 import mysql.connector
+import openpyxl
+from mysql.connector import pooling
+from mysql.connector.errors import PoolError
 import pandas as pd
-from config import db_config
+from config import db_config, DB_POOL_CONFIG, DB_BULK_CONFIG
+from metrics import REGISTRY
+
+DB_POOL_CHECKOUTS = REGISTRY.counter(
+    'db_pool_checkouts_total', '从数据库连接池取出连接的次数', ['outcome'])
+DB_POOL_WAIT = REGISTRY.histogram(
+    'db_pool_wait_seconds', '等待数据库连接池空闲连接的时间（秒）')
+DB_POOL_HEALTH_CHECK_FAILURES = REGISTRY.counter(
+    'db_pool_health_check_failures_total', '取出连接时健康检查失败（连接已断开并重连）的次数')
+
+
+class DatabasePool:
+    """进程内共享的 MySQL 连接池
+
+    基于 mysql.connector 的 MySQLConnectionPool，首次使用时才建立连接。
+    连接全部被占用时调用方排队等待，超过 acquire_timeout 后抛出 PoolError；
+    取出的连接先做健康检查，断开的连接自动重连。连接以上下文管理器取出，
+    退出时归还连接池（并重置会话），不会泄漏。
+    """
+
+    def __init__(self, pool_name='student_portrait_pool', pool_size=5, acquire_timeout=30.0, health_check=True,
+                 allow_local_infile=False):
+        """
+        Args:
+            pool_name: 连接池名称
+            pool_size: 连接数，最多 pooling.CNX_POOL_MAXSIZE（32）
+            acquire_timeout: 等待空闲连接的最长时间（秒）
+            health_check: 取出连接时是否先 ping 检查
+            allow_local_infile: 是否允许连接执行 LOAD DATA LOCAL INFILE
+        """
+        self.pool_name = pool_name
+        self.pool_size = max(1, min(pool_size, pooling.CNX_POOL_MAXSIZE))
+        self.acquire_timeout = acquire_timeout
+        self.health_check = health_check
+        self.allow_local_infile = allow_local_infile
+        self._pool = None
+        self._slots = threading.BoundedSemaphore(self.pool_size)
+        self._lock = threading.Lock()
+        self.in_use = 0
+        self.waiting = 0
+        self.checkouts = 0
+        self.timeouts = 0
+        self.health_check_failures = 0
+
+    def _get_pool(self):
+        with self._lock:
+            if self._pool is None:
+                self._pool = pooling.MySQLConnectionPool(
+                    pool_name=self.pool_name,
+                    pool_size=self.pool_size,
+                    pool_reset_session=True,
+                    host=db_config['host'],
+                    port=db_config.get('port', 3306),
+                    user=db_config['user'],
+                    password=db_config['password'],
+                    database=db_config['database'],
+                    allow_local_infile=self.allow_local_infile
+                )
+            return self._pool
+
+    def _check(self, conn):
+        """检查连接是否可用，已断开时重连（重连失败时抛出异常）"""
+        try:
+            conn.ping(reconnect=False)
+        except mysql.connector.Error:
+            with self._lock:
+                self.health_check_failures += 1
+            DB_POOL_HEALTH_CHECK_FAILURES.inc()
+            conn.reconnect(attempts=2, delay=0)
+
+    @contextmanager
+    def connection(self):
+        """取出一个连接，退出时归还连接池
+
+        Raises:
+            PoolError: 等待空闲连接超时
+            mysql.connector.Error: 建立或重连连接失败
+        """
+        start = time.perf_counter()
+        with self._lock:
+            self.waiting += 1
+        try:
+            acquired = self._slots.acquire(timeout=self.acquire_timeout)
+        finally:
+            with self._lock:
+                self.waiting -= 1
+        DB_POOL_WAIT.observe(time.perf_counter() - start)
+        if not acquired:
+            with self._lock:
+                self.timeouts += 1
+            DB_POOL_CHECKOUTS.inc(outcome='timeout')
+            raise PoolError(f"等待数据库连接超时（{self.acquire_timeout}秒）")
+
+        conn = None
+        try:
+            conn = self._get_pool().get_connection()
+            if self.health_check:
+                self._check(conn)
+        except Exception:
+            try:
+                if conn is not None:
+                    conn.close()  # 连接已断开时归还也可能失败，不能掩盖原始错误
+            except Exception as err:
+                print(f"归还数据库连接出错: {err}")
+            finally:
+                self._slots.release()
+            DB_POOL_CHECKOUTS.inc(outcome='error')
+            raise
+
+        DB_POOL_CHECKOUTS.inc(outcome='ok')
+        with self._lock:
+            self.in_use += 1
+            self.checkouts += 1
+        try:
+            yield conn
+        finally:
+            with self._lock:
+                self.in_use -= 1
+            try:
+                conn.close()  # 归还连接池
+            except Exception as err:
+                print(f"归还数据库连接出错: {err}")
+            finally:
+                self._slots.release()
+
+    @contextmanager
+    def transaction(self):
+        """取出连接并返回游标，正常退出时提交，出错时回滚"""
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            try:
+                yield cursor
+                conn.commit()
+            except BaseException:
+                try:
+                    conn.rollback()
+                except mysql.connector.Error:
+                    pass
+                raise
+            finally:
+                cursor.close()
+
+    def stats(self):
+        """返回连接池的占用与累计统计"""
+        with self._lock:
+            return {
+                'pool_size': self.pool_size,
+                'in_use': self.in_use,
+                'waiting': self.waiting,
+                'checkouts': self.checkouts,
+                'timeouts': self.timeouts,
+                'health_check_failures': self.health_check_failures
+            }
+
+
+# 进程内共享的数据库连接池
+DB_POOL = DatabasePool(**DB_POOL_CONFIG)
+
+
+@contextmanager
+def _server_connection():
+    """不指定数据库的一次性连接（用于创建数据库），退出时关闭"""
+    mydb = mysql.connector.connect(
+        host=db_config['host'],
+        port=db_config.get('port', 3306),
+        user=db_config['user'],
+        password=db_config['password']
+    )
+    try:
+        yield mydb
+    finally:
+        mydb.close()
 
 def create_database():
     try:
-        mydb = mysql.connector.connect(
-            host=db_config['host'],
-            port=db_config.get('port', 3306),
-            user=db_config['user'],
-            password=db_config['password']
-        )
-        mycursor = mydb.cursor()
-        mycursor.execute(f"CREATE DATABASE IF NOT EXISTS {db_config['database']}")
+        with _server_connection() as mydb:
+            mycursor = mydb.cursor()
+            mycursor.execute(f"CREATE DATABASE IF NOT EXISTS {db_config['database']}")
+            mycursor.close()
         print(f"数据库 {db_config['database']} 创建成功")
     except mysql.connector.Error as err:
         print(f"创建数据库出错: {err}")
 
 def create_students_table():
     try:
-        mydb = mysql.connector.connect(
-            host=db_config['host'],
-            port=db_config.get('port', 3306),
-            user=db_config['user'],
-            password=db_config['password'],
-            database=db_config['database']
-        )
-        mycursor = mydb.cursor()
-
         create_table_statement = """
         CREATE TABLE IF NOT EXISTS students (
             student_id INT PRIMARY KEY,
@@ -51,23 +220,14 @@ def create_students_table():
         )
         """
 
-        mycursor.execute(create_table_statement)
-        mydb.commit()
+        with DB_POOL.transaction() as mycursor:
+            mycursor.execute(create_table_statement)
         print("学生表创建成功")
     except mysql.connector.Error as err:
         print(f"创建学生表出错: {err}")
 
 def create_recommendations_table():
     try:
-        mydb = mysql.connector.connect(
-            host=db_config['host'],
-            port=db_config.get('port', 3306),
-            user=db_config['user'],
-            password=db_config['password'],
-            database=db_config['database']
-        )
-        mycursor = mydb.cursor()
-
         create_table_statement = """
         CREATE TABLE IF NOT EXISTS recommendations (
             recommendation_id INT AUTO_INCREMENT PRIMARY KEY,
@@ -78,23 +238,14 @@ def create_recommendations_table():
         )
         """
 
-        mycursor.execute(create_table_statement)
-        mydb.commit()
+        with DB_POOL.transaction() as mycursor:
+            mycursor.execute(create_table_statement)
         print("推荐表创建成功")
     except mysql.connector.Error as err:
         print(f"创建推荐表出错: {err}")
 
 def insert_student_data(student_data):
     try:
-        mydb = mysql.connector.connect(
-            host=db_config['host'],
-            port=db_config.get('port', 3306),
-            user=db_config['user'],
-            password=db_config['password'],
-            database=db_config['database']
-        )
-        mycursor = mydb.cursor()
-
         insert_statement = """
         INSERT INTO students (
             student_id, student_type, knowledge_score, cognitive_score,
@@ -117,23 +268,14 @@ def insert_student_data(student_data):
             student_data['ST099Q04TA']
         )
 
-        mycursor.execute(insert_statement, values)
-        mydb.commit()
+        with DB_POOL.transaction() as mycursor:
+            mycursor.execute(insert_statement, values)
         print(f"学生数据插入成功，学生ID: {student_data['student_id']}")
     except mysql.connector.Error as err:
         print(f"插入学生数据出错: {err}")
 
 def insert_recommendation_data(student_id, dimension, recommendation):
     try:
-        mydb = mysql.connector.connect(
-            host=db_config['host'],
-            port=db_config.get('port', 3306),
-            user=db_config['user'],
-            password=db_config['password'],
-            database=db_config['database']
-        )
-        mycursor = mydb.cursor()
-
         insert_statement = """
         INSERT INTO recommendations (student_id, dimension, recommendation)
         VALUES (%s, %s, %s)
@@ -141,82 +283,386 @@ def insert_recommendation_data(student_id, dimension, recommendation):
 
         values = (student_id, dimension, recommendation)
 
-        mycursor.execute(insert_statement, values)
-        mydb.commit()
+        with DB_POOL.transaction() as mycursor:
+            mycursor.execute(insert_statement, values)
         print(f"推荐数据插入成功，学生ID: {student_id}, 维度: {dimension}")
     except mysql.connector.Error as err:
         print(f"插入推荐数据出错: {err}")
 
-def import_excel_data(file_path, table_name):
+def store_text_data(table_name, text_data):
     try:
-        mydb = mysql.connector.connect(
-            host=db_config['host'],
-            port=db_config.get('port', 3306),
-            user=db_config['user'],
-            password=db_config['password'],
-            database=db_config['database']
-        )
-        mycursor = mydb.cursor()
+        # 插入到表的第一列
+        df = pd.read_excel('Model_py.xlsx')
+        first_column = df.columns[0]
+        insert_statement = f"INSERT INTO {table_name} ({first_column}) VALUES (%s)"
+        with DB_POOL.transaction() as mycursor:
+            mycursor.execute(insert_statement, (text_data,))
+
+        print("文本数据存储成功")
+    except mysql.connector.Error as err:
+        print(f"存储文本数据出错: {err}")
+
+# students 表的列 → 学生 DataFrame 中对应的列
+STUDENT_TABLE_COLUMNS = {
+    'student_id': 'CNTSTUID',
+    'student_type': '学生类型',
+    'knowledge_score': '知识维度_综合得分',
+    'cognitive_score': '认知维度_综合得分',
+    'affective_score': '情感维度_综合得分',
+    'behavioral_score': '行为维度_综合得分',
+    'expert_diagnosis': 'expert_diagnosis',
+    'risk_level': 'risk_level',
+    'risk_factors': 'risk_factors',
+    'CNTSTUID': 'CNTSTUID',
+    'ST004D01T': 'ST004D01T',
+    'ST001D01T': 'ST001D01T',
+    'PV1MATH': 'PVMATH',
+    'PV1READ': 'PVREAD',
+    'PV1SCIE': 'PVSCIE',
+    'ST099Q01TA': 'ST099Q01TA',
+    'ST099Q02TA': 'ST099Q02TA',
+    'ST099Q03TA': 'ST099Q03TA',
+    'ST099Q04TA': 'ST099Q04TA'
+}
+RECOMMENDATION_TABLE_COLUMNS = ['student_id', 'dimension', 'recommendation']
+# 写入推荐表的建议维度
+RECOMMENDATION_DIMENSIONS = ['知识维度', '认知维度', '情感维度', '行为维度']
+BULK_METHODS = ('executemany', 'load_data')
+
+def _frame_rows(df):
+    """将 DataFrame 转为行元组列表：NaN 转为 None，NumPy 标量转为 Python 类型"""
+    values = df.astype(object).where(pd.notna(df), None)
+    return list(values.itertuples(index=False, name=None))
+
+def _load_data_field(value):
+    """将单个值编码为 LOAD DATA 可读的字段（反斜杠转义，NULL 写作 \\N）"""
+    if value is None:
+        return '\\N'
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return repr(value)
+    text = str(value)
+    for char, escaped in (('\\', '\\\\'), ('"', '\\"'), ('\n', '\\n'), ('\r', '\\r'), ('\t', '\\t'), ('\0', '\\0')):
+        text = text.replace(char, escaped)
+    return f'"{text}"'
+
+def _quote_identifier(name):
+    """用反引号引用表名或列名（表头可能包含空格、中文等字符）"""
+    return '`' + str(name).replace('`', '``') + '`'
 
-        df = pd.read_excel(file_path)
+def _write_chunk(cursor, table_name, columns, rows, method, on_duplicate):
+    """在当前事务中写入一批行
 
-        # 从 DataFrame 确定列类型
-        column_types = {}
-        for col in df.columns:
-            if pd.api.types.is_integer_dtype(df[col]):
-                column_types[col] = "INT"
-            elif pd.api.types.is_float_dtype(df[col]):
-                column_types[col] = "FLOAT"
+    Returns:
+        int: 实际写入的行数；LOAD DATA LOCAL 与 INSERT IGNORE 跳过的行（主键冲突、无法转换的值）不计入
+    """
+    table_name = _quote_identifier(table_name)
+    columns = [_quote_identifier(column) for column in columns]
+    column_list = ', '.join(columns)
+    if method == 'load_data':
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False, encoding='utf-8', newline='') as f:
+            for row in rows:
+                f.write(','.join(_load_data_field(value) for value in row) + '\n')
+            path = f.name
+        try:
+            cursor.execute(
+                f"LOAD DATA LOCAL INFILE %s {'IGNORE ' if on_duplicate == 'ignore' else ''}INTO TABLE {table_name} "
+                f"CHARACTER SET utf8mb4 FIELDS TERMINATED BY ',' OPTIONALLY ENCLOSED BY '\"' ESCAPED BY '\\\\' "
+                f"LINES TERMINATED BY '\\n' ({column_list})",
+                (path,)
+            )
+        finally:
+            os.remove(path)
+        # LOCAL 方式下服务端无法中止客户端的文件传输，出错的行一律按 IGNORE 处理（产生警告而不是报错）
+        return cursor.rowcount
+
+    statement = f"INSERT {'IGNORE ' if on_duplicate == 'ignore' else ''}INTO {table_name} ({column_list}) " \
+                f"VALUES ({', '.join(['%s'] * len(columns))})"
+    if on_duplicate == 'update':
+        statement += " ON DUPLICATE KEY UPDATE " + ', '.join(f"{column} = VALUES({column})" for column in columns)
+    # mysql.connector 将 INSERT ... VALUES 的 executemany 合并为一条多行 VALUES 语句
+    cursor.executemany(statement, rows)
+    # ON DUPLICATE KEY UPDATE 的影响行数把更新计为 2 行，此时按提交的行数计
+    return cursor.rowcount if on_duplicate == 'ignore' else len(rows)
+
+def _check_bulk_method(method, on_duplicate):
+    if method not in BULK_METHODS:
+        raise ValueError(f"未知的批量写入方式: {method}")
+    if method == 'load_data' and on_duplicate == 'update':
+        raise ValueError("load_data 方式不支持 on_duplicate='update'")
+
+def _insert_chunks(table_name, columns, chunks, method, on_duplicate, progress_interval=None):
+    """逐批写入，每批在一个事务中提交；失败的批次输出错误后跳过
+
+    Args:
+        chunks: 行元组列表的可迭代对象，可以是生成器（流式写入）
+        progress_interval: 输出进度的最短间隔（秒），为 None 时只在结束时输出
+
+    Returns:
+        dict: 写入行数、被跳过的行数、失败行数、批数、耗时与每秒写入行数
+    """
+    start = last_report = time.perf_counter()
+    written = skipped = failed = count = 0
+    for chunk in chunks:
+        count += 1
+        try:
+            with DB_POOL.transaction() as mycursor:
+                inserted = _write_chunk(mycursor, table_name, columns, chunk, method, on_duplicate)
+            written += inserted
+            skipped += len(chunk) - inserted
+        except mysql.connector.Error as err:
+            failed += len(chunk)
+            print(f"批量写入 {table_name} 第 {count} 批（{len(chunk)} 行）出错: {err}")
+        now = time.perf_counter()
+        if progress_interval and now - last_report >= progress_interval:
+            print(f"已写入 {table_name} {written} 行（{written / (now - start):.0f} 行/秒）")
+            last_report = now
+
+    seconds = time.perf_counter() - start
+    rate = written / seconds if seconds else 0.0
+    print(f"批量写入 {table_name}: {written} 行成功，{failed} 行失败，{count} 批，用时 {seconds:.2f} 秒（{rate:.0f} 行/秒）")
+    if skipped:
+        reason = "LOAD DATA LOCAL 将冲突与错误的行按 IGNORE 跳过" if method == 'load_data' else "INSERT IGNORE 跳过冲突的行"
+        print(f"警告: {table_name} 有 {skipped} 行未写入（{reason}）")
+    return {'rows': written, 'skipped_rows': skipped, 'failed_rows': failed, 'chunks': count,
+            'seconds': round(seconds, 3), 'rows_per_second': round(rate, 1)}
+
+def bulk_insert(table_name, columns, rows, chunk_size=None, method=None, on_duplicate='error'):
+    """分批写入多行，每批在一个事务中提交
+
+    Args:
+        table_name: 表名
+        columns: 列名列表
+        rows: 行元组列表，值的顺序与 columns 一致
+        chunk_size: 每个事务写入的行数，默认取 DB_BULK_CONFIG
+        method: executemany（多行 VALUES）或 load_data（临时 CSV + LOAD DATA LOCAL INFILE），默认取 DB_BULK_CONFIG
+        on_duplicate: 主键冲突时 error（该批失败）、ignore（跳过）或 update（覆盖，仅 executemany）；
+            load_data 方式下 error 与 ignore 相同：LOCAL 文件中冲突或出错的行被跳过，计入 skipped_rows
+
+    Returns:
+        dict: 写入行数、被跳过的行数、失败行数、批数、耗时与每秒写入行数
+    """
+    chunk_size = chunk_size or DB_BULK_CONFIG['chunk_size']
+    method = method or DB_BULK_CONFIG['method']
+    _check_bulk_method(method, on_duplicate)
+    chunks = (rows[offset:offset + chunk_size] for offset in range(0, len(rows), chunk_size))
+    return _insert_chunks(table_name, columns, chunks, method, on_duplicate)
+
+def bulk_insert_students(df, chunk_size=None, method=None, on_duplicate='update'):
+    """将学生 DataFrame 批量写入 students 表
+
+    按 STUDENT_TABLE_COLUMNS 取列，DataFrame 中没有的列写入 NULL；默认按学生ID覆盖已有记录。
+    其余参数与返回值同 bulk_insert。
+    """
+    frame = pd.DataFrame({
+        column: df[source] if source in df.columns else None
+        for column, source in STUDENT_TABLE_COLUMNS.items()
+    }, index=df.index)
+    frame['student_id'] = pd.to_numeric(frame['student_id'], errors='coerce')
+    frame = frame.dropna(subset=['student_id'])
+    frame['student_id'] = frame['student_id'].astype('int64')
+    return bulk_insert('students', list(STUDENT_TABLE_COLUMNS), _frame_rows(frame),
+                       chunk_size=chunk_size, method=method, on_duplicate=on_duplicate)
+
+def recommendations_to_frame(recommendations, dimensions=None):
+    """将 {学生ID: generate_recommendations 的结果} 展开为推荐表的行
+
+    Args:
+        recommendations: 学生ID → 分维度建议 dict；包含 error 的结果会被跳过
+        dimensions: 写入的维度，默认 RECOMMENDATION_DIMENSIONS
+
+    Returns:
+        DataFrame: student_id、dimension、recommendation 三列
+    """
+    dimensions = dimensions or RECOMMENDATION_DIMENSIONS
+    rows = [
+        (int(student_id), dimension, result.get(dimension, ''))
+        for student_id, result in recommendations.items()
+        if result and not result.get('error')
+        for dimension in dimensions
+    ]
+    return pd.DataFrame(rows, columns=RECOMMENDATION_TABLE_COLUMNS)
+
+def bulk_insert_recommendations(df, chunk_size=None, method=None):
+    """将推荐表 DataFrame（student_id、dimension、recommendation 三列）批量写入 recommendations 表
+
+    其余参数与返回值同 bulk_insert。
+    """
+    return bulk_insert('recommendations', RECOMMENDATION_TABLE_COLUMNS,
+                       _frame_rows(df[RECOMMENDATION_TABLE_COLUMNS]), chunk_size=chunk_size, method=method)
+
+# 32 位 INT 与 64 位 BIGINT 的取值范围
+_INT_RANGE = (-2 ** 31, 2 ** 31 - 1)
+_BIGINT_RANGE = (-2 ** 63, 2 ** 63 - 1)
+
+def _infer_column_type(values):
+    """根据样本值推断 MySQL 列类型：全为整数时 INT/BIGINT，全为数值时 DOUBLE，全为日期时间时 DATETIME，否则 TEXT"""
+    kinds = set()
+    big = False
+    for value in values:
+        if value is None or value == '':
+            continue
+        if isinstance(value, bool):
+            kinds.add('text')
+        elif isinstance(value, int):
+            kinds.add('int')
+            big = big or not _INT_RANGE[0] <= value <= _INT_RANGE[1]
+        elif isinstance(value, float):
+            kinds.add('float')
+        elif isinstance(value, datetime):
+            kinds.add('datetime')
+        else:
+            kinds.add('text')
+    if not kinds or 'text' in kinds:
+        return "TEXT"
+    if kinds == {'int'}:
+        return "BIGINT" if big else "INT"
+    if kinds <= {'int', 'float'}:
+        return "DOUBLE"
+    if kinds == {'datetime'}:
+        return "DATETIME"
+    return "TEXT"
+
+def _excel_column_names(header):
+    """将表头转为列名：空表头命名为 column_序号，重复的追加序号，截断到 MySQL 的 64 字符上限"""
+    names = []
+    seen = set()
+    for i, value in enumerate(header):
+        name = str(value).strip()[:64] if value is not None and str(value).strip() else f"column_{i + 1}"
+        candidate, suffix = name, 2
+        while candidate.lower() in seen:
+            candidate = f"{name[:60]}_{suffix}"
+            suffix += 1
+        seen.add(candidate.lower())
+        names.append(candidate)
+    return names
+
+def _coerce_value(value, column_type):
+    """按推断的列类型转换单元格的值
+
+    类型只由样本推断，样本之后的行可能出现超出整数列范围或非有限的数值，
+    这些值同样写入 NULL，避免整批写入失败。
+
+    Returns:
+        tuple: (转换后的值, 是否因无法转换而写入 NULL)
+    """
+    if value is None or value == '':
+        return None, False
+    try:
+        if column_type in ("INT", "BIGINT"):
+            if isinstance(value, int) and not isinstance(value, bool):
+                number = value
             else:
-                column_types[col] = "TEXT"
+                number = float(value)
+                if not number.is_integer():
+                    return None, True
+                number = int(number)
+            low, high = _INT_RANGE if column_type == "INT" else _BIGINT_RANGE
+            if low <= number <= high:
+                return number, False
+            return None, True
+        if column_type == "DOUBLE":
+            number = float(value)
+            return (number, False) if math.isfinite(number) else (None, True)
+        if column_type == "DATETIME":
+            return (value, False) if isinstance(value, datetime) else (None, True)
+    except (TypeError, ValueError):
+        return None, True
+    return str(value), False
 
-        # 创建表
-        create_table(table_name, column_types)
+def create_table(table_name, column_types):
+    """按 {列名: MySQL 类型} 创建表，表已存在时不做修改
 
-        # 准备 INSERT 语句
-        columns = ', '.join(df.columns)
-        placeholders = ', '.join(['%s'] * len(df.columns))
-        insert_statement = f"INSERT INTO {table_name} ({columns}) VALUES ({placeholders})"
+    Raises:
+        mysql.connector.Error: 建表失败
+    """
+    columns = ', '.join(f"{_quote_identifier(column)} {column_type}" for column, column_type in column_types.items())
+    with DB_POOL.transaction() as mycursor:
+        mycursor.execute(f"CREATE TABLE IF NOT EXISTS {_quote_identifier(table_name)} ({columns})")
+    print(f"表 {table_name} 创建成功")
 
-        # 为每一行执行 INSERT 语句
-        for _, row in df.iterrows():
-            try:
-                mycursor.execute(insert_statement, tuple(row))
-            except mysql.connector.Error as err:
-                print(f"Error inserting row: {err}")
+def import_excel_data(file_path, table_name, sheet_name=None, chunk_size=None, method=None, on_duplicate='error',
+                      sample_rows=None):
+    """流式导入 Excel 工作表到 MySQL
 
-        mydb.commit()
-        print("Excel数据导入成功")
-    except mysql.connector.Error as err:
-        print(f"导入Excel数据出错: {err}")
+    以 openpyxl 只读模式逐行读取，内存占用与文件大小无关：用表头和前 sample_rows 行
+    推断列类型并建表，之后每 chunk_size 行批量写入一次，每批一个事务，并输出写入速度。
+    与推断类型不符的单元格写入 NULL 并计数。
+
+    Args:
+        file_path: .xlsx 文件路径
+        table_name: 目标表名，不存在时按推断的类型创建
+        sheet_name: 工作表名称，默认第一个（活动）工作表
+        chunk_size: 每个事务写入的行数，默认取 DB_BULK_CONFIG
+        method: executemany 或 load_data，默认取 DB_BULK_CONFIG
+        on_duplicate: 主键冲突时的处理方式，同 bulk_insert
+        sample_rows: 用于推断列类型的行数，默认取 DB_BULK_CONFIG
+
+    Returns:
+        dict: 写入统计（同 bulk_insert）以及推断的列类型和无法转换的单元格数；失败时返回 None
+    """
+    chunk_size = chunk_size or DB_BULK_CONFIG['chunk_size']
+    method = method or DB_BULK_CONFIG['method']
+    sample_rows = sample_rows or DB_BULK_CONFIG['schema_sample_rows']
+    _check_bulk_method(method, on_duplicate)
+
+    try:
+        workbook = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
     except FileNotFoundError:
         print(f"错误: 文件未找到，路径: {file_path}")
-    except Exception as e:
-        print(f"发生意外错误: {e}")
+        return None
 
-def store_text_data(table_name, text_data):
     try:
-        mydb = mysql.connector.connect(
-            host=db_config['host'],
-            port=db_config.get('port', 3306),
-            user=db_config['user'],
-            password=db_config['password'],
-            database=db_config['database']
-        )
-        mycursor = mydb.cursor()
+        sheet = workbook[sheet_name] if sheet_name else workbook.active
+        # 跳过全空的行（只读模式下工作表末尾常有空行）
+        rows = (row for row in sheet.iter_rows(values_only=True) if any(value is not None for value in row))
+        header = next(rows, None)
+        if header is None:
+            print(f"错误: 工作表为空，路径: {file_path}")
+            return None
 
-        # 插入到表的第一列
-        df = pd.read_excel('Model_py.xlsx')
-        first_column = df.columns[0]
-        insert_statement = f"INSERT INTO {table_name} ({first_column}) VALUES (%s)"
-        mycursor.execute(insert_statement, (text_data,))
+        columns = _excel_column_names(header)
+        sample = list(itertools.islice(rows, sample_rows))
+        column_types = [
+            _infer_column_type(row[i] if i < len(row) else None for row in sample)
+            for i in range(len(columns))
+        ]
+        create_table(table_name, dict(zip(columns, column_types)))
 
-        mydb.commit()
-        print("文本数据存储成功")
+        invalid = 0
+
+        def converted_rows():
+            nonlocal invalid
+            for row in itertools.chain(sample, rows):
+                values = []
+                for i, column_type in enumerate(column_types):
+                    value, bad = _coerce_value(row[i] if i < len(row) else None, column_type)
+                    invalid += bad
+                    values.append(value)
+                yield tuple(values)
+
+        def chunks():
+            converted = converted_rows()
+            while True:
+                chunk = list(itertools.islice(converted, chunk_size))
+                if not chunk:
+                    return
+                yield chunk
+
+        stats = _insert_chunks(table_name, columns, chunks(), method, on_duplicate, progress_interval=5)
+        if invalid:
+            print(f"警告: {invalid} 个单元格与推断的列类型不符，已写入 NULL")
+        stats['columns'] = dict(zip(columns, column_types))
+        stats['invalid_values'] = invalid
+        return stats
     except mysql.connector.Error as err:
-        print(f"存储文本数据出错: {err}")
+        print(f"导入Excel数据出错: {err}")
+    except Exception as e:
+        print(f"发生意外错误: {e}")
+    finally:
+        workbook.close()
+    return None
 
 if __name__ == '__main__':
     create_database()
     create_students_table()
-    create_recommendations_table()
\ No newline at end of file
+    create_recommendations_table()
@@ -0,0 +1,219 @@
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+
+
+# 任务的终止状态
+FINISHED_STATUSES = ('succeeded', 'failed')
+
+
+class QueueFullError(Exception):
+    """排队任务数达到上限时抛出"""
+
+
+class Job:
+    """异步分析任务"""
+
+    def __init__(self, operation, student_id, version=None):
+        self.job_id = uuid.uuid4().hex
+        self.operation = operation
+        self.student_id = student_id
+        self.version = version
+        self.status = 'queued'  # queued / running / succeeded / failed
+        self.submitted_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.result = None
+        self.error = None
+        self.done = threading.Event()
+        self._changed = threading.Condition()
+
+    @property
+    def key(self):
+        return (self.operation, self.student_id, self.version)
+
+    def _set_status(self, status):
+        with self._changed:
+            self.status = status
+            self._changed.notify_all()
+
+    def wait_for_change(self, status, timeout=None):
+        """等待任务状态不再是 status（或超时），返回当前状态"""
+        with self._changed:
+            self._changed.wait_for(lambda: self.status != status, timeout)
+            return self.status
+
+    def to_dict(self, include_result=True):
+        """转换为可 JSON 序列化的字典"""
+        data = {
+            'job_id': self.job_id,
+            'operation': self.operation,
+            'student_id': self.student_id,
+            'status': self.status,
+            'submitted_at': self.submitted_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at
+        }
+        if self.started_at is not None:
+            data['wait_seconds'] = round(self.started_at - self.submitted_at, 3)
+        if self.finished_at is not None and self.started_at is not None:
+            data['run_seconds'] = round(self.finished_at - self.started_at, 3)
+        if include_result and self.status == 'succeeded':
+            data['result'] = self.result
+        if self.status == 'failed':
+            data['error'] = self.error
+        return data
+
+
+class JobQueue:
+    """有界线程池任务队列：提交后立即返回任务ID，后台执行大模型分析
+
+    相同的 (操作, 学生ID, 数据集版本) 在排队、执行中或结果保留期内
+    会复用同一个任务，不会重复调用模型。
+    """
+
+    def __init__(self, max_workers=4, max_pending=100, result_ttl=3600, max_results=10000):
+        """
+        Args:
+            max_workers: 工作线程数
+            max_pending: 排队任务上限
+            result_ttl: 已完成任务结果的保留时间（秒）
+            max_results: 最多保留的已完成任务数
+        """
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.result_ttl = result_ttl
+        self.max_results = max_results
+
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='job-worker')
+        self._handlers = {}
+        self._jobs = OrderedDict()
+        self._finished = deque()  # 按完成顺序排列的已完成任务，用于清理
+        self._by_key = {}
+        self._lock = threading.Lock()
+
+        self._queued = 0
+        self._running = 0
+        self._counters = {'submitted': 0, 'reused': 0, 'rejected': 0, 'succeeded': 0, 'failed': 0}
+        self._wait_times = deque(maxlen=1000)
+        self._run_times = deque(maxlen=1000)
+
+    def register(self, operation, handler):
+        """注册任务处理函数，handler(student_id) 返回可 JSON 序列化的结果"""
+        self._handlers[operation] = handler
+
+    @property
+    def operations(self):
+        return list(self._handlers)
+
+    def submit(self, operation, student_id, version=None):
+        """提交任务；已有可复用的任务时直接返回该任务
+
+        Raises:
+            ValueError: 未注册的操作
+            QueueFullError: 排队任务数达到上限
+        """
+        if operation not in self._handlers:
+            raise ValueError(f"未知的任务类型: {operation}")
+
+        with self._lock:
+            self._purge_expired()
+
+            job_id = self._by_key.get((operation, student_id, version))
+            job = self._jobs.get(job_id) if job_id else None
+            if job is not None and job.status != 'failed':
+                self._counters['reused'] += 1
+                return job
+
+            if self._queued >= self.max_pending:
+                self._counters['rejected'] += 1
+                raise QueueFullError(f"任务队列已满（{self.max_pending} 个排队任务）")
+
+            job = Job(operation, student_id, version)
+            self._jobs[job.job_id] = job
+            self._by_key[job.key] = job.job_id
+            self._queued += 1
+            self._counters['submitted'] += 1
+
+        self._executor.submit(self._run, job)
+        return job
+
+    def get(self, job_id):
+        """按任务ID获取任务，不存在或已过期时返回 None"""
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def wait(self, job_id, timeout=None):
+        """等待任务完成，返回任务（超时后返回当前状态）"""
+        job = self.get(job_id)
+        if job is not None:
+            job.done.wait(timeout)
+        return job
+
+    def _run(self, job):
+        with self._lock:
+            self._queued -= 1
+            self._running += 1
+        job.started_at = time.time()
+        job._set_status('running')
+        self._wait_times.append(job.started_at - job.submitted_at)
+
+        status = 'failed'
+        try:
+            job.result = self._handlers[job.operation](job.student_id)
+            status = 'succeeded'
+        except Exception as e:
+            print(f"任务 {job.job_id} ({job.operation}, 学生 {job.student_id}) 执行失败: {e}")
+            job.error = str(e)
+        finally:
+            job.finished_at = time.time()
+            self._run_times.append(job.finished_at - job.started_at)
+            with self._lock:
+                self._running -= 1
+                self._counters[status] += 1
+                self._finished.append(job)
+            job._set_status(status)
+            job.done.set()
+
+    def _purge_expired(self):
+        """清理超过保留时间或超出数量上限的已完成任务（调用方需持有锁）
+
+        已完成任务按完成顺序排列，只需从最早完成的一端检查，不扫描全部任务。
+        """
+        now = time.time()
+        while self._finished and (len(self._finished) > self.max_results
+                                  or now - self._finished[0].finished_at > self.result_ttl):
+            job = self._finished.popleft()
+            del self._jobs[job.job_id]
+            if self._by_key.get(job.key) == job.job_id:
+                del self._by_key[job.key]
+
+    @staticmethod
+    def _summarize(samples):
+        if not samples:
+            return {'count': 0, 'avg': 0.0, 'p50': 0.0, 'p95': 0.0, 'max': 0.0}
+        ordered = sorted(samples)
+        return {
+            'count': len(ordered),
+            'avg': round(sum(ordered) / len(ordered), 3),
+            'p50': round(ordered[int(0.5 * (len(ordered) - 1))], 3),
+            'p95': round(ordered[int(0.95 * (len(ordered) - 1))], 3),
+            'max': round(ordered[-1], 3)
+        }
+
+    def metrics(self):
+        """返回队列深度、执行中任务数、计数器以及最近任务的等待/执行时间统计（秒）"""
+        with self._lock:
+            data = {
+                'max_workers': self.max_workers,
+                'max_pending': self.max_pending,
+                'queue_depth': self._queued,
+                'running': self._running,
+                'retained_jobs': len(self._jobs),
+                **self._counters
+            }
+        data['wait_seconds'] = self._summarize(list(self._wait_times))
+        data['run_seconds'] = self._summarize(list(self._run_times))
+        return data
@@ -0,0 +1,194 @@
+import contextvars
+import json
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from config import LLM_USAGE_CONFIG
+
+# 触发大模型调用的入口（例如 Flask 路由或任务类型），用于按入口汇总
+_current_endpoint = contextvars.ContextVar('llm_endpoint', default='direct')
+
+
+def set_endpoint(endpoint):
+    """设置当前上下文中大模型调用所属的入口"""
+    _current_endpoint.set(endpoint)
+
+
+def current_endpoint():
+    return _current_endpoint.get()
+
+
+@contextmanager
+def endpoint(name):
+    """在 with 块内将大模型调用归属到指定入口"""
+    token = _current_endpoint.set(name)
+    try:
+        yield
+    finally:
+        _current_endpoint.reset(token)
+
+
+class _Summary:
+    """单个分组（专家或入口）的累计统计"""
+
+    __slots__ = ('calls', 'cached', 'errors', 'prompt_chars', 'completion_tokens',
+                 'ttft_total', 'ttft_count', 'duration_total', 'duration_max', 'actions', 'models')
+
+    def __init__(self):
+        self.calls = 0
+        self.cached = 0
+        self.errors = 0
+        self.prompt_chars = 0
+        self.completion_tokens = 0
+        self.ttft_total = 0.0
+        self.ttft_count = 0
+        self.duration_total = 0.0
+        self.duration_max = 0.0
+        self.actions = {}
+        self.models = {}
+
+    def add(self, entry):
+        self.calls += 1
+        self.cached += bool(entry.get('cached'))
+        self.errors += entry.get('outcome') == 'error'
+        self.prompt_chars += entry.get('prompt_chars') or 0
+        self.completion_tokens += entry.get('completion_tokens') or 0
+        if entry.get('ttft') is not None:
+            self.ttft_total += entry['ttft']
+            self.ttft_count += 1
+        duration = entry.get('duration') or 0.0
+        self.duration_total += duration
+        self.duration_max = max(self.duration_max, duration)
+        action = entry.get('action') or '无'
+        self.actions[action] = self.actions.get(action, 0) + 1
+        model = entry.get('model')
+        self.models[model] = self.models.get(model, 0) + 1
+
+    def to_dict(self):
+        return {
+            'calls': self.calls,
+            'cached': self.cached,
+            'errors': self.errors,
+            'prompt_chars': self.prompt_chars,
+            'avg_prompt_chars': round(self.prompt_chars / self.calls, 1) if self.calls else 0.0,
+            'completion_tokens': self.completion_tokens,
+            'avg_completion_tokens': round(self.completion_tokens / self.calls, 1) if self.calls else 0.0,
+            'avg_ttft_seconds': round(self.ttft_total / self.ttft_count, 3) if self.ttft_count else None,
+            'avg_duration_seconds': round(self.duration_total / self.calls, 3) if self.calls else 0.0,
+            'max_duration_seconds': round(self.duration_max, 3),
+            'total_duration_seconds': round(self.duration_total, 3),
+            'actions': dict(self.actions),
+            'models': dict(self.models)
+        }
+
+
+def summarize(entries):
+    """按专家和入口汇总调用记录
+
+    Args:
+        entries: 调用记录（dict）序列
+
+    Returns:
+        dict: {'calls': 总数, 'by_expert': {...}, 'by_endpoint': {...}}
+    """
+    by_expert, by_endpoint = {}, {}
+    total = 0
+    for entry in entries:
+        total += 1
+        by_expert.setdefault(entry.get('expert'), _Summary()).add(entry)
+        by_endpoint.setdefault(entry.get('endpoint'), _Summary()).add(entry)
+    return {
+        'calls': total,
+        'by_expert': {name: summary.to_dict() for name, summary in by_expert.items()},
+        'by_endpoint': {name: summary.to_dict() for name, summary in by_endpoint.items()}
+    }
+
+
+def read_log(path):
+    """逐条读取 JSONL 调用日志，跳过无法解析的行"""
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                yield json.loads(line)
+            except ValueError:
+                continue
+
+
+class LLMUsageLog:
+    """大模型调用记录：每次调用追加一行 JSON 到日志文件，并在内存中按专家和入口累计"""
+
+    def __init__(self, path=None):
+        """
+        Args:
+            path: JSONL 日志文件路径，为空时只在内存中累计
+        """
+        self.path = path or None
+        self._lock = threading.Lock()
+        self._by_expert = {}
+        self._by_endpoint = {}
+        self.calls = 0
+
+    def record(self, expert, model, prompt_chars, completion_tokens, completion_chars, ttft, duration,
+               outcome, action=None, cached=False, prompt_tokens=None):
+        """记录一次专家调用
+
+        Args:
+            expert: 专家名称
+            model: 模型ID
+            prompt_chars: 提示词（系统提示 + 用户查询）字符数
+            completion_tokens: 输出 token 数（服务端未返回用量时为流式片段数）
+            completion_chars: 输出字符数
+            ttft: 首个片段耗时（秒），无输出时为 None
+            duration: 调用总耗时（秒，含流式输出）
+            outcome: success / error / cancelled
+            action: 专家选择的动作
+            cached: 是否由回复缓存直接回放
+            prompt_tokens: 服务端返回的提示词 token 数
+        """
+        entry = {
+            'ts': round(time.time(), 3),
+            'endpoint': current_endpoint(),
+            'expert': expert,
+            'model': model,
+            'prompt_chars': prompt_chars,
+            'prompt_tokens': prompt_tokens,
+            'completion_tokens': completion_tokens,
+            'completion_chars': completion_chars,
+            'ttft': round(ttft, 4) if ttft is not None else None,
+            'duration': round(duration, 4),
+            'action': action,
+            'outcome': outcome,
+            'cached': cached
+        }
+        line = json.dumps(entry, ensure_ascii=False)
+        with self._lock:
+            self.calls += 1
+            self._by_expert.setdefault(expert, _Summary()).add(entry)
+            self._by_endpoint.setdefault(entry['endpoint'], _Summary()).add(entry)
+            if self.path:
+                try:
+                    with open(self.path, 'a', encoding='utf-8') as f:
+                        f.write(line + '\n')
+                except OSError as e:
+                    print(f"写入大模型调用日志失败: {e}")
+        return entry
+
+    def summary(self):
+        """返回本进程内按专家和入口汇总的统计"""
+        with self._lock:
+            return {
+                'calls': self.calls,
+                'by_expert': {name: summary.to_dict() for name, summary in self._by_expert.items()},
+                'by_endpoint': {name: summary.to_dict() for name, summary in self._by_endpoint.items()}
+            }
+
+
+# 进程内共享的大模型调用记录
+LLM_USAGE = LLMUsageLog(LLM_USAGE_CONFIG['path'] if LLM_USAGE_CONFIG['enabled'] else None)
+
+
+if __name__ == '__main__':
+    # 汇总调用日志：python llm_accounting.py [llm_usage.jsonl]
+    log_path = sys.argv[1] if len(sys.argv) > 1 else LLM_USAGE_CONFIG['path']
+    print(json.dumps(summarize(read_log(log_path)), ensure_ascii=False, indent=2))
@@ -0,0 +1,200 @@
+import asyncio
+import hashlib
+import random
+import re
+import threading
+import time
+from types import SimpleNamespace
+from openai import AsyncOpenAI, OpenAI
+from config import MODELSCOPE_CONFIG, LLM_BACKEND_CONFIG
+
+# 本地替身模型生成文本使用的词表
+_FAKE_PHRASES = [
+    "建议每天安排固定的复习时间", "结合错题本梳理知识薄弱点", "逐步提高任务难度", "使用番茄工作法保持专注",
+    "与同伴开展合作学习", "定期进行自我评估与反思", "减少学习时的数字设备干扰", "保持规律作息与适度运动",
+    "参与感兴趣的社团活动增强归属感", "考前进行放松训练缓解焦虑", "设定可量化的阶段性目标", "及时向老师寻求反馈",
+]
+# 系统提示中列出的可选动作，例如 "1. **直接回复**"
+_ACTION_PATTERN = re.compile(r"\d+\. \*\*(.+?)\*\*")
+# 查询中要求输出的标题行，例如 "【学生画像报告】"
+_HEADER_PATTERN = re.compile(r"【[^】]+】")
+
+
+class FakeLLMError(Exception):
+    """本地替身模型按配置的错误率模拟的调用失败"""
+
+
+class FakeLLMClient:
+    """进程内的确定性替身模型，接口与 OpenAI 客户端的 chat.completions.create 一致
+
+    输出文本由 (模型, 消息) 的哈希决定，相同请求总是得到相同回复；
+    可配置首个片段延迟、每秒输出的片段数和错误率，用于离线压测接口和
+    度量与模型延迟无关的编排开销。与 OpenAI 接口一样，流式调用传入
+    stream_options={"include_usage": True} 时最后追加一个只含用量的片段
+    （提示词 token 数按字符数计，输出 token 数为片段数）。
+    """
+
+    def __init__(self, first_token_latency=0.0, tokens_per_second=0.0, response_tokens=40,
+                 error_rate=0.0, seed=0):
+        """
+        Args:
+            first_token_latency: 首个片段前的等待时间（秒）
+            tokens_per_second: 每秒输出的片段数，0 表示不限速
+            response_tokens: 每次回复的片段数
+            error_rate: 调用失败的概率（0-1）
+            seed: 错误注入的随机种子
+        """
+        self.first_token_latency = first_token_latency
+        self.tokens_per_second = tokens_per_second
+        self.response_tokens = response_tokens
+        self.error_rate = error_rate
+        self._errors = random.Random(seed)
+        self._lock = threading.Lock()
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def _render(self, model, messages):
+        """生成确定性的回复片段：必要时首行为动作名，随后为编号建议"""
+        system = messages[0]['content'] if messages and messages[0]['role'] == 'system' else ''
+        query = messages[-1]['content'] if messages else ''
+        digest = hashlib.sha256(f"{model}\n{system}\n{query}".encode('utf-8')).digest()
+        rng = random.Random(digest)
+
+        tokens = []
+        actions = _ACTION_PATTERN.findall(system)
+        if actions:
+            tokens.append(f"{rng.choice(actions)}\n")
+        headers = _HEADER_PATTERN.findall(query)
+        sections = headers or [None]
+        per_section = max(1, self.response_tokens // len(sections))
+        for header in sections:
+            if header:
+                tokens.append(f"{header}\n")
+            for i in range(per_section):
+                tokens.append(f"{i + 1}. {rng.choice(_FAKE_PHRASES)}。\n")
+        return tokens
+
+    @staticmethod
+    def _usage(messages, tokens, stream_options):
+        """按 stream_options 返回流式输出末尾的用量，未要求时返回 None"""
+        if not (stream_options or {}).get('include_usage'):
+            return None
+        prompt_tokens = sum(len(message['content']) for message in messages)
+        return SimpleNamespace(prompt_tokens=prompt_tokens, completion_tokens=len(tokens),
+                               total_tokens=prompt_tokens + len(tokens))
+
+    @staticmethod
+    def _usage_chunk(model, usage):
+        return SimpleNamespace(model=model, choices=[], usage=usage)
+
+    def _stream(self, model, tokens, usage=None):
+        if self.first_token_latency:
+            time.sleep(self.first_token_latency)
+        interval = 1.0 / self.tokens_per_second if self.tokens_per_second else 0.0
+        for i, token in enumerate(tokens):
+            if interval and i:
+                time.sleep(interval)
+            yield SimpleNamespace(model=model, choices=[SimpleNamespace(delta=SimpleNamespace(content=token))],
+                                  usage=None)
+        if usage is not None:
+            yield self._usage_chunk(model, usage)
+
+    def create(self, model, messages, stream=False, stream_options=None, **kwargs):
+        with self._lock:
+            failed = self._errors.random() < self.error_rate
+        if failed:
+            if self.first_token_latency:
+                time.sleep(self.first_token_latency)
+            raise FakeLLMError("本地替身模型模拟的调用失败")
+
+        tokens = self._render(model, messages)
+        if stream:
+            return self._stream(model, tokens, self._usage(messages, tokens, stream_options))
+        for _ in self._stream(model, tokens):
+            pass
+        return SimpleNamespace(model=model, choices=[SimpleNamespace(
+            message=SimpleNamespace(role='assistant', content=''.join(tokens)))])
+
+
+class AsyncFakeLLMClient(FakeLLMClient):
+    """FakeLLMClient 的异步版本，接口与 AsyncOpenAI 客户端的 chat.completions.create 一致
+
+    回复内容与同步版本完全相同，等待通过 asyncio.sleep 实现，不阻塞事件循环。
+    """
+
+    async def _astream(self, model, tokens, usage=None):
+        if self.first_token_latency:
+            await asyncio.sleep(self.first_token_latency)
+        interval = 1.0 / self.tokens_per_second if self.tokens_per_second else 0.0
+        for i, token in enumerate(tokens):
+            if interval and i:
+                await asyncio.sleep(interval)
+            yield SimpleNamespace(model=model, choices=[SimpleNamespace(delta=SimpleNamespace(content=token))],
+                                  usage=None)
+        if usage is not None:
+            yield self._usage_chunk(model, usage)
+
+    async def create(self, model, messages, stream=False, stream_options=None, **kwargs):
+        with self._lock:
+            failed = self._errors.random() < self.error_rate
+        if failed:
+            if self.first_token_latency:
+                await asyncio.sleep(self.first_token_latency)
+            raise FakeLLMError("本地替身模型模拟的调用失败")
+
+        tokens = self._render(model, messages)
+        if stream:
+            return self._astream(model, tokens, self._usage(messages, tokens, stream_options))
+        async for _ in self._astream(model, tokens):
+            pass
+        return SimpleNamespace(model=model, choices=[SimpleNamespace(
+            message=SimpleNamespace(role='assistant', content=''.join(tokens)))])
+
+
+def _fake_client_options():
+    return dict(
+        first_token_latency=LLM_BACKEND_CONFIG['fake_first_token_latency'],
+        tokens_per_second=LLM_BACKEND_CONFIG['fake_tokens_per_second'],
+        response_tokens=LLM_BACKEND_CONFIG['fake_response_tokens'],
+        error_rate=LLM_BACKEND_CONFIG['fake_error_rate'],
+        seed=LLM_BACKEND_CONFIG['fake_seed']
+    )
+
+
+def create_llm_client(backend=None):
+    """按配置创建大模型客户端
+
+    Args:
+        backend: 'modelscope'（默认，OpenAI 兼容接口）或 'fake'（本地确定性替身）；
+            为 None 时取 LLM_BACKEND_CONFIG['backend']
+
+    Returns:
+        具有 chat.completions.create 接口的客户端
+    """
+    backend = backend or LLM_BACKEND_CONFIG['backend']
+    if backend == 'fake':
+        return FakeLLMClient(**_fake_client_options())
+    if backend != 'modelscope':
+        raise ValueError(f"未知的大模型后端: {backend}")
+    return OpenAI(
+        api_key=MODELSCOPE_CONFIG['api_key'],
+        base_url=MODELSCOPE_CONFIG['base_url'],
+        max_retries=0  # 重试由进程内共享的限流器统一处理
+    )
+
+
+def create_async_llm_client(backend=None):
+    """按配置创建异步大模型客户端，参数同 create_llm_client
+
+    Returns:
+        具有 chat.completions.create 协程接口的客户端（AsyncOpenAI 或 AsyncFakeLLMClient）
+    """
+    backend = backend or LLM_BACKEND_CONFIG['backend']
+    if backend == 'fake':
+        return AsyncFakeLLMClient(**_fake_client_options())
+    if backend != 'modelscope':
+        raise ValueError(f"未知的大模型后端: {backend}")
+    return AsyncOpenAI(
+        api_key=MODELSCOPE_CONFIG['api_key'],
+        base_url=MODELSCOPE_CONFIG['base_url'],
+        max_retries=0  # 重试由限流器统一处理
+    )
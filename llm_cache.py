@@ -0,0 +1,159 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+
+
+class LLMResponseCache:
+    """大模型回复的磁盘缓存（SQLite），按 (专家, 系统提示, 用户查询, 模型, 后端) 的哈希寻址
+
+    提示词中已包含分析所依据的学生数据，数据不变时提示词完全相同，缓存命中后直接回放此前的流式片段，
+    无需再次调用模型；数据变化后提示词随之变化，不会命中旧回复，因此缓存键不含数据集版本，
+    数据文件被重写（内容不变）或重新加载后缓存依然有效。条目超过 TTL 后失效，总大小超出上限时按最近最少使用淘汰。
+    缓存文件可被多个进程（Web 服务、命令行脚本）共享；总大小由触发器维护在
+    llm_cache_meta 表中，各进程写入后都保持准确，写入时无需扫描全表。
+    """
+
+    def __init__(self, path, ttl=0, max_bytes=256 * 1024 * 1024):
+        """
+        Args:
+            path: SQLite 数据库文件路径
+            ttl: 条目有效期（秒），0 表示永不过期
+            max_bytes: 缓存回复的总字节数上限，超出后按最近访问时间淘汰
+        """
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS llm_responses (
+                cache_key TEXT PRIMARY KEY,
+                expert TEXT NOT NULL,
+                model TEXT NOT NULL,
+                chunks TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_responses_accessed ON llm_responses (accessed_at)")
+        self._create_size_total()
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+
+    def _create_size_total(self):
+        """创建保存缓存总大小的元数据表及维护它的触发器（已有缓存文件首次升级时统计一次）"""
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            self._conn.execute("CREATE TABLE IF NOT EXISTS llm_cache_meta (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+            self._conn.execute(
+                "INSERT OR IGNORE INTO llm_cache_meta (name, value) "
+                "SELECT 'total_size', COALESCE(SUM(size), 0) FROM llm_responses")
+            self._conn.execute("""
+                CREATE TRIGGER IF NOT EXISTS llm_responses_size_insert AFTER INSERT ON llm_responses BEGIN
+                    UPDATE llm_cache_meta SET value = value + NEW.size WHERE name = 'total_size';
+                END
+            """)
+            self._conn.execute("""
+                CREATE TRIGGER IF NOT EXISTS llm_responses_size_update AFTER UPDATE OF size ON llm_responses BEGIN
+                    UPDATE llm_cache_meta SET value = value - OLD.size + NEW.size WHERE name = 'total_size';
+                END
+            """)
+            self._conn.execute("""
+                CREATE TRIGGER IF NOT EXISTS llm_responses_size_delete AFTER DELETE ON llm_responses BEGIN
+                    UPDATE llm_cache_meta SET value = value - OLD.size WHERE name = 'total_size';
+                END
+            """)
+            self._conn.execute("COMMIT")
+        except BaseException:
+            self._conn.execute("ROLLBACK")
+            raise
+
+    def _total_size_locked(self):
+        return self._conn.execute("SELECT value FROM llm_cache_meta WHERE name = 'total_size'").fetchone()[0]
+
+    @staticmethod
+    def make_key(expert_name, system_prompt, query, model, backend=None):
+        """根据专家、系统提示、用户查询、模型ID和大模型后端生成缓存键
+
+        后端参与寻址，替身模型（fake）的回复不会回放给真实后端的调用。
+        """
+        payload = json.dumps([expert_name, system_prompt, query, model, backend], ensure_ascii=False)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        """返回缓存的流式片段列表，未命中或已过期时返回 None"""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT chunks, created_at FROM llm_responses WHERE cache_key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            chunks, created_at = row
+            if self.ttl and now - created_at > self.ttl:
+                self._conn.execute("DELETE FROM llm_responses WHERE cache_key = ?", (key,))
+                self.expired += 1
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE llm_responses SET accessed_at = ? WHERE cache_key = ?", (now, key))
+            self.hits += 1
+        return json.loads(chunks)
+
+    def put(self, key, chunks, expert_name, model):
+        """保存一次完整的模型回复（流式片段列表），并在超出大小上限时淘汰最久未访问的条目"""
+        body = json.dumps(chunks, ensure_ascii=False)
+        size = len(body.encode('utf-8'))
+        now = time.time()
+        with self._lock:
+            # 使用 UPSERT 而不是 INSERT OR REPLACE：REPLACE 删除旧行时不触发删除触发器
+            self._conn.execute(
+                "INSERT INTO llm_responses (cache_key, expert, model, chunks, size, created_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (cache_key) DO UPDATE SET expert = excluded.expert, model = excluded.model, "
+                "chunks = excluded.chunks, size = excluded.size, created_at = excluded.created_at, "
+                "accessed_at = excluded.accessed_at",
+                (key, expert_name, model, body, size, now, now))
+            self._evict_locked()
+
+    def _evict_locked(self):
+        total = self._total_size_locked()
+        if total <= self.max_bytes:
+            return
+        excess = total - self.max_bytes
+        freed = 0
+        victims = []
+        cursor = self._conn.execute("SELECT cache_key, size FROM llm_responses ORDER BY accessed_at")
+        for cache_key, size in cursor:
+            victims.append((cache_key,))
+            freed += size
+            if freed >= excess:
+                break
+        cursor.close()
+        self._conn.executemany("DELETE FROM llm_responses WHERE cache_key = ?", victims)
+        self.evictions += len(victims)
+
+    def clear(self):
+        """清空所有缓存条目"""
+        with self._lock:
+            self._conn.execute("DELETE FROM llm_responses")
+
+    def stats(self):
+        """返回缓存占用和本进程内的命中统计"""
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM llm_responses").fetchone()[0]
+            size = self._total_size_locked()
+            return {
+                'entries': entries,
+                'bytes': size,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'expired': self.expired,
+                'evictions': self.evictions
+            }
@@ -2,6 +2,8 @@ import data_processing as dp
 import visualization as vis
 import student_agent as sa
 import pandas as pd
+from snapshot import save_profiles
+from dataset_holder import build_student_index
 import argparse  # 添加命令行参数解析
 
 def analyze_student_detailed(agent, student_id):
@@ -99,6 +101,8 @@ def main():
     parser = argparse.ArgumentParser(description='学生分析系统')
     parser.add_argument('--student', type=int, help='要详细分析的学生ID')
     parser.add_argument('--detailed', action='store_true', help='是否显示详细分析')
+    parser.add_argument('--cohort', action='store_true', help='按画像分组为全体学生批量生成建议')
+    parser.add_argument('--granularity', type=int, help='批量建议时每个维度得分的量化档位数')
     args = parser.parse_args()
     
     # 加载并处理数据
@@ -108,7 +112,7 @@ def main():
     final_data = dp.identify_student_types(processed_data)
     
     # 保存处理后的数据
-    final_data.to_csv('student_profiles.csv', index=False)
+    save_profiles(final_data, 'student_profiles.csv')
     print("数据处理完成，已保存到 student_profiles.csv")
     
     # 生成可视化
@@ -121,8 +125,22 @@ def main():
     
     # 创建学生代理
     try:
-        agent = sa.StudentAgent('student_profiles.csv')
+        # 直接使用内存中处理好的数据，无需再从文件加载一次
+        agent = sa.StudentAgent(build_student_index(final_data, 'student_profiles.csv'))
         
+        # 群体批量建议：每个画像分组只调用一次专家
+        if args.cohort:
+            result = agent.generate_cohort_recommendations(granularity=args.granularity)
+            report = result['report']
+            print(f"\n共 {report['students']} 名学生，分为 {report['buckets']} 组，"
+                  f"已生成建议的分组 {report['generated_buckets']} 个，覆盖率 {report['coverage']:.1%}")
+            print(f"大模型调用次数: {report['llm_calls']}，缓存回放 {report['llm_cached_calls']} 次"
+                  f"（逐个学生生成约需 {report['llm_calls_per_student_mode']} 次）")
+            print("分组大小分布:")
+            for size_range, count in report['bucket_size']['distribution'].items():
+                print(f"  {size_range} 人: {count} 组")
+            return
+
         # 如果指定了学生ID，显示该学生的详细分析
         if args.student:
             analyze_student_detailed(agent, args.student)
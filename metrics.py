@@ -0,0 +1,250 @@
+import math
+import threading
+
+
+# 默认直方图分桶（秒），覆盖从毫秒级接口到数十秒的大模型调用
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+
+def _format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels) + '}'
+
+
+class _Metric:
+    """指标基类；每个线程写入自己的分片，采集时再汇总，热路径上不加锁"""
+
+    metric_type = None
+
+    def __init__(self, registry, name, documentation, labelnames=()):
+        self.registry = registry
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"指标 {self.name} 需要标签 {self.labelnames}，实际为 {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _shard(self):
+        return self.registry._shard(self.name)
+
+    def _samples(self):
+        """汇总所有线程分片，产出 (样本名, 标签列表, 值)"""
+        raise NotImplementedError
+
+    def _fold(self, target, shard):
+        """把一个分片累加到 target 中（不修改 target 中已有的值对象）"""
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """单调递增计数器"""
+
+    metric_type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        shard = self._shard()
+        key = self._key(labels)
+        shard[key] = shard.get(key, 0) + amount
+
+    def _merged(self):
+        totals = {}
+        for shard in self.registry._shards_of(self.name):
+            for key, value in list(shard.items()):
+                totals[key] = totals.get(key, 0) + value
+        return totals
+
+    def value(self, **labels):
+        return self._merged().get(self._key(labels), 0)
+
+    def _fold(self, target, shard):
+        for key, value in list(shard.items()):
+            target[key] = target.get(key, 0) + value
+
+    def _samples(self):
+        for key, value in sorted(self._merged().items()):
+            yield self.name, list(zip(self.labelnames, key)), value
+
+
+class Gauge(Counter):
+    """可增可减的计量值（例如正在处理的请求数）"""
+
+    metric_type = 'gauge'
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    """累计分桶直方图"""
+
+    metric_type = 'histogram'
+
+    def __init__(self, registry, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(registry, name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        shard = self._shard()
+        key = self._key(labels)
+        state = shard.get(key)
+        if state is None:
+            # [各分桶计数..., 总数, 总和]
+            state = shard[key] = [0] * (len(self.buckets) + 1) + [0.0]
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                state[i] += 1
+                break
+        state[-2] += 1
+        state[-1] += value
+
+    def _merged(self):
+        totals = {}
+        for shard in self.registry._shards_of(self.name):
+            for key, state in list(shard.items()):
+                merged = totals.get(key)
+                if merged is None:
+                    totals[key] = list(state)
+                else:
+                    for i, v in enumerate(state):
+                        merged[i] += v
+        return totals
+
+    def _fold(self, target, shard):
+        for key, state in list(shard.items()):
+            merged = target.get(key)
+            target[key] = list(state) if merged is None else [a + b for a, b in zip(merged, state)]
+
+    def _samples(self):
+        for key, state in sorted(self._merged().items()):
+            labels = list(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, count in zip(self.buckets, state):
+                cumulative += count
+                yield self.name + '_bucket', labels + [('le', _format_value(float(bound)))], cumulative
+            yield self.name + '_bucket', labels + [('le', '+Inf')], state[-2]
+            yield self.name + '_count', labels, state[-2]
+            yield self.name + '_sum', labels, state[-1]
+
+
+class MetricsRegistry:
+    """指标注册表，按 Prometheus 文本格式导出
+
+    每个线程在首次写入时登记自己的分片（仅此时加锁），之后的写入只修改
+    本线程的字典；导出时遍历所有分片汇总。已退出线程的分片在登记新线程或
+    导出时并入共享的汇总分片，线程频繁创建（例如每个请求一个线程）时分片数不会无限增长。
+    """
+
+    def __init__(self):
+        self._metrics = {}
+        self._collectors = []
+        self._local = threading.local()
+        self._all_shards = {}  # 线程 -> 该线程的分片
+        self._retired = {}  # 指标名 -> 已退出线程累计的值
+        self._lock = threading.Lock()
+
+    def _shard(self, name):
+        shards = getattr(self._local, 'shards', None)
+        if shards is None:
+            shards = {}
+            self._local.shards = shards
+            with self._lock:
+                self._sweep_locked()
+                self._all_shards[threading.current_thread()] = shards
+        shard = shards.get(name)
+        if shard is None:
+            shard = shards[name] = {}
+        return shard
+
+    def _sweep_locked(self):
+        """把已退出线程的分片并入汇总分片（调用方持有 self._lock）"""
+        dead = [thread for thread in self._all_shards if not thread.is_alive()]
+        for thread in dead:
+            for name, shard in self._all_shards.pop(thread).items():
+                self._metrics[name]._fold(self._retired.setdefault(name, {}), shard)
+
+    def _shards_of(self, name):
+        with self._lock:
+            self._sweep_locked()
+            thread_shards = list(self._all_shards.values())
+            retired = dict(self._retired.get(name, {}))
+        return [retired] + [shards[name] for shards in thread_shards if name in shards]
+
+    def _register(self, metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"指标 {metric.name} 已注册")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter(self, name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self._register(Gauge(self, name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(self, name, documentation, labelnames, buckets))
+
+    def register_collector(self, collector):
+        """注册采集时调用的回调，返回 [(名称, 类型, 说明, [(标签字典, 值), ...]), ...]
+
+        用于导出由其他组件自行维护的状态，例如缓存命中次数、队列深度。
+        """
+        self._collectors.append(collector)
+
+    def render(self):
+        """以 Prometheus 文本格式（0.0.4）导出全部指标"""
+        lines = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.metric_type}")
+            for sample_name, labels, value in metric._samples():
+                lines.append(f"{sample_name}{_format_labels(labels)} {_format_value(value)}")
+
+        for collector in self._collectors:
+            try:
+                families = collector()
+            except Exception as e:
+                print(f"指标采集回调出错: {e}")
+                continue
+            for name, metric_type, documentation, samples in families:
+                lines.append(f"# HELP {name} {documentation}")
+                lines.append(f"# TYPE {name} {metric_type}")
+                for labels, value in samples:
+                    lines.append(f"{name}{_format_labels(sorted(labels.items()))} {_format_value(value)}")
+
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = MetricsRegistry()
+
+# --- HTTP 请求指标 ---
+HTTP_REQUEST_DURATION = REGISTRY.histogram(
+    'http_request_duration_seconds', 'HTTP 请求处理耗时（秒）', ['method', 'route', 'status'])
+HTTP_REQUESTS_IN_FLIGHT = REGISTRY.gauge(
+    'http_requests_in_flight', '正在处理的 HTTP 请求数', ['route'])
+
+# --- 大模型调用指标 ---
+LLM_CALLS = REGISTRY.counter(
+    'llm_calls_total', '专家智能体的大模型调用次数', ['expert', 'model', 'outcome'])
+LLM_CALL_DURATION = REGISTRY.histogram(
+    'llm_call_duration_seconds', '专家智能体大模型调用的总耗时（秒，含流式输出）', ['expert', 'model'])
+LLM_TIME_TO_FIRST_TOKEN = REGISTRY.histogram(
+    'llm_time_to_first_token_seconds', '专家智能体大模型调用的首个输出片段耗时（秒）', ['expert', 'model'])
+LLM_ERRORS = REGISTRY.counter(
+    'llm_errors_total', '专家智能体大模型调用失败次数', ['expert', 'model', 'error'])
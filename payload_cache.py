@@ -0,0 +1,76 @@
+import hashlib
+import threading
+from collections import OrderedDict
+
+
+class PayloadCache:
+    """序列化响应体缓存，按 (键, 数据集版本) 存储 JSON 字节串及其强 ETag
+
+    数据只会在重新生成 student_profiles.csv 时变化，因此同一版本下的
+    响应体可以直接复用；版本变化后旧条目全部失效。
+    """
+
+    def __init__(self, max_entries=100000):
+        """
+        Args:
+            max_entries: 最大缓存条目数，超出后按最近最少使用淘汰
+        """
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._version = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_etag(body):
+        """根据响应体内容生成强 ETag（不含引号）"""
+        return hashlib.sha1(body).hexdigest()
+
+    def get_or_build(self, key, version, builder):
+        """获取缓存的响应体，未命中时调用 builder 生成
+
+        Args:
+            key: 缓存键，例如学生ID
+            version: 数据集版本
+            builder: 无参函数，返回序列化后的响应体 (bytes)
+
+        Returns:
+            tuple: (响应体 bytes, ETag)
+        """
+        with self._lock:
+            if version != self._version:
+                self._entries.clear()
+                self._version = version
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry
+            self.misses += 1
+
+        body = builder()
+        entry = (body, self.make_etag(body))
+
+        with self._lock:
+            if version == self._version:
+                self._entries[key] = entry
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return entry
+
+    def invalidate(self):
+        """清空所有缓存条目"""
+        with self._lock:
+            self._entries.clear()
+            self._version = None
+
+    def stats(self):
+        """返回缓存占用和命中统计"""
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'version': self._version,
+                'hits': self.hits,
+                'misses': self.misses
+            }
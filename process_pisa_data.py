@@ -4,6 +4,7 @@ from sklearn.preprocessing import StandardScaler
 from sklearn.cluster import KMeans
 import matplotlib.pyplot as plt
 import seaborn as sns
+from snapshot import save_profiles
 
 def process_pisa_data(file_path):
     print(f"Loading data from {file_path}...")
@@ -220,7 +221,8 @@ def process_pisa_data(file_path):
     # Save to CSV
     output_file = 'student_profiles.csv'
     # Keep all original columns plus the new ones
-    df_clean.to_csv(output_file, index=False)
+    # Also writes a columnar snapshot next to the CSV for fast app startup
+    save_profiles(df_clean, output_file)
     print(f"Saved processed data to {output_file}")
     
     # Plotting
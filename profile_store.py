@@ -0,0 +1,208 @@
+import json
+import os
+import shutil
+import threading
+import time
+from collections import OrderedDict
+
+
+def _json_default(value):
+    """将 NumPy 标量等非标准类型转换为可序列化的值"""
+    return value.item() if hasattr(value, 'item') else str(value)
+
+
+class ProfileStore:
+    """学生画像的有界存储，替代只增不减的 dict
+
+    画像中包含两段较长的大模型报告，长时间运行的服务最终会为每个学生各存一份。
+    本存储按条目数和估算字节数限制内存占用，超出后按最近最少使用淘汰；
+    配置了溢出目录时被淘汰的画像写入磁盘（按数据集版本分子目录），再次访问时读回。
+    条目超过 TTL 后失效，数据集版本变化时内存中的画像全部失效；基于旧版本数据
+    生成、在版本切换后才写入的画像被丢弃。溢出目录可由多个进程共享，读回的溢出文件保留在磁盘上；
+    切换数据集版本时删除其他版本的子目录，溢出目录不会随版本更替无限增长。
+    """
+
+    def __init__(self, max_entries=1000, max_bytes=64 * 1024 * 1024, ttl=0, spill_dir=None):
+        """
+        Args:
+            max_entries: 内存中最多保存的画像数
+            max_bytes: 内存中画像的估算总字节数上限
+            ttl: 画像有效期（秒），0 表示永不过期
+            spill_dir: 溢出目录，为空时淘汰的画像直接丢弃
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.spill_dir = spill_dir or None
+        self.version = None
+        self._entries = OrderedDict()  # 学生ID → (画像, 估算字节数, 写入时间)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self._spilled_ids = set()  # 本进程在当前版本下写入溢出目录的学生ID
+
+    @staticmethod
+    def _estimate_size(profile):
+        return len(json.dumps(profile, ensure_ascii=False, default=_json_default).encode('utf-8'))
+
+    def _spill_path(self, student_id):
+        return os.path.join(self.spill_dir, str(self.version), f"{student_id}.json")
+
+    def _expired(self, stored_at):
+        return bool(self.ttl) and time.time() - stored_at > self.ttl
+
+    def set_version(self, version):
+        """切换数据集版本，内存中旧版本的画像全部失效，并删除溢出目录中其他版本的子目录"""
+        with self._lock:
+            if version == self.version:
+                return
+            self._clear_locked()
+            self._spilled_ids.clear()
+            self.version = version
+        if self.spill_dir:
+            self._prune_versions(version)
+
+    def _prune_versions(self, version):
+        """删除溢出目录中不属于 version 的子目录（仍使用旧版本的其他进程读取时按未命中处理）"""
+        try:
+            names = os.listdir(self.spill_dir)
+        except OSError:
+            return
+        for name in names:
+            path = os.path.join(self.spill_dir, name)
+            if name != str(version) and os.path.isdir(path):
+                try:
+                    shutil.rmtree(path)
+                except OSError as e:
+                    print(f"删除旧版本画像溢出目录失败: {e}")
+
+    def _clear_locked(self):
+        self._entries.clear()
+        self._bytes = 0
+
+    def clear(self):
+        """清空本进程内存中的画像；溢出目录可能由其他进程共享，不删除"""
+        with self._lock:
+            self._clear_locked()
+
+    def put(self, student_id, profile, version=None):
+        """保存学生画像
+
+        Args:
+            student_id: 学生ID
+            profile: 学生画像
+            version: 生成画像时使用的数据集版本，为 None 时视为当前版本；
+                与当前版本不一致（分析期间数据集已被替换）时丢弃
+
+        Returns:
+            bool: 是否已保存
+        """
+        size = self._estimate_size(profile)
+        with self._lock:
+            if version is not None and version != self.version:
+                return False
+            old = self._entries.pop(student_id, None)
+            if old is not None:
+                self._bytes -= old[1]
+            self._entries[student_id] = (profile, size, time.time())
+            self._bytes += size
+            self._evict_locked()
+        return True
+
+    def __setitem__(self, student_id, profile):
+        self.put(student_id, profile)
+
+    def _evict_locked(self):
+        while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+            student_id, (profile, size, stored_at) = self._entries.popitem(last=False)
+            self._bytes -= size
+            self.evictions += 1
+            if self.spill_dir:
+                self._spill_locked(student_id, profile, stored_at)
+
+    def _spill_locked(self, student_id, profile, stored_at):
+        path = self._spill_path(student_id)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'stored_at': stored_at, 'profile': profile}, f, ensure_ascii=False, default=_json_default)
+            os.replace(tmp_path, path)
+            self._spilled_ids.add(student_id)
+        except OSError as e:
+            print(f"画像写入溢出目录失败: {e}")
+
+    def _load_spilled_locked(self, student_id):
+        path = self._spill_path(student_id)
+        # 读回后保留文件：溢出目录可能由其他进程共享，再次淘汰时覆盖写入
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if self._expired(entry['stored_at']):
+            self.expirations += 1
+            return None
+        return entry
+
+    def get(self, student_id, default=None):
+        """返回学生画像，不存在或已过期时返回 default"""
+        with self._lock:
+            entry = self._entries.get(student_id)
+            if entry is not None:
+                if self._expired(entry[2]):
+                    del self._entries[student_id]
+                    self._bytes -= entry[1]
+                    self.expirations += 1
+                else:
+                    self._entries.move_to_end(student_id)
+                    self.hits += 1
+                    return entry[0]
+            elif self.spill_dir:
+                spilled = self._load_spilled_locked(student_id)
+                if spilled is not None:
+                    profile = spilled['profile']
+                    size = self._estimate_size(profile)
+                    self._entries[student_id] = (profile, size, spilled['stored_at'])
+                    self._bytes += size
+                    self._evict_locked()
+                    self.hits += 1
+                    return profile
+            self.misses += 1
+            return default
+
+    def __getitem__(self, student_id):
+        profile = self.get(student_id)
+        if profile is None:
+            raise KeyError(student_id)
+        return profile
+
+    def __contains__(self, student_id):
+        # 只检查是否存在，不计入命中统计，也不调整淘汰顺序
+        with self._lock:
+            entry = self._entries.get(student_id)
+            if entry is not None:
+                return not self._expired(entry[2])
+            return bool(self.spill_dir) and os.path.exists(self._spill_path(student_id))
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        """返回存储占用和命中统计"""
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_entries': self.max_entries,
+                'max_bytes': self.max_bytes,
+                'spilled': len(self._spilled_ids),
+                'version': self.version,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations
+            }
@@ -0,0 +1,309 @@
+import asyncio
+import contextvars
+import random
+import threading
+import time
+import weakref
+from contextlib import asynccontextmanager, contextmanager
+from email.utils import parsedate_to_datetime
+import openai
+from config import LLM_RATE_LIMIT_CONFIG
+from metrics import REGISTRY
+
+LLM_RETRIES = REGISTRY.counter(
+    'llm_retries_total', '大模型调用因可重试错误而重试的次数', ['reason'])
+LLM_LIMITER_REJECTED = REGISTRY.counter(
+    'llm_limiter_rejected_total', '因排队已满或等待超时而未能调用大模型的次数', ['reason'])
+
+# 可重试的状态码：限流与服务端临时错误
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+
+
+class LLMBusyError(Exception):
+    """大模型调用排队已满或等待超时"""
+
+
+class _Lease:
+    """slot() 占用的一个调用名额；退避等待期间暂时归还
+
+    上下文变量会随 copy_context() 传给其他线程或任务，只有占用名额的线程（任务）自身才能归还。
+    """
+
+    __slots__ = ('held', 'owner')
+
+    def __init__(self, owner):
+        self.held = True
+        self.owner = owner
+
+
+class LLMRateLimiter:
+    """进程内共享的大模型调用限流器
+
+    以信号量限制同时进行的调用数，以令牌桶限制每秒发起的请求数；
+    等待中的调用在有界队列中排队，超出队列长度或等待超时时抛出 LLMBusyError，
+    由调用方按失败处理。遇到限流或服务端临时错误时按带抖动的指数退避重试，
+    服务端返回 Retry-After 时以其为准（不超过 max_delay）；退避等待期间归还调用名额，
+    等待结束后重新排队取得名额。
+    """
+
+    def __init__(self, max_concurrency=4, requests_per_second=2.0, burst=4, max_retries=4,
+                 base_delay=1.0, max_delay=30.0, queue_timeout=60.0, max_queue=100):
+        """
+        Args:
+            max_concurrency: 同时进行的调用数上限（含流式输出期间）
+            requests_per_second: 平均每秒发起的请求数
+            burst: 令牌桶容量，允许的瞬时突发请求数
+            max_retries: 可重试错误的最大重试次数
+            base_delay: 指数退避的初始等待时间（秒）
+            max_delay: 单次退避等待的上限（秒）
+            queue_timeout: 排队等待调用名额的最长时间（秒）
+            max_queue: 排队等待的调用数上限
+        """
+        self.max_concurrency = max_concurrency
+        self.rate = requests_per_second
+        self.burst = burst
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.queue_timeout = queue_timeout
+        self.max_queue = max_queue
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._lock = threading.Lock()
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self.in_flight = 0
+        self.waiting = 0
+        # 当前上下文（线程或 asyncio 任务）在 slot() 内占用的名额，call() 退避时据此归还
+        self._lease = contextvars.ContextVar(f'llm_limiter_lease_{id(self)}', default=None)
+
+    def _enqueue(self):
+        """登记一个排队中的调用，队列已满时抛出 LLMBusyError"""
+        with self._lock:
+            if self.waiting >= self.max_queue:
+                LLM_LIMITER_REJECTED.inc(reason='queue_full')
+                raise LLMBusyError(f"大模型调用排队已满（{self.max_queue}）")
+            self.waiting += 1
+
+    def _acquire(self):
+        """排队取得一个调用名额，排队已满或等待超时时抛出 LLMBusyError"""
+        self._enqueue()
+        try:
+            acquired = self._slots.acquire(timeout=self.queue_timeout)
+        finally:
+            with self._lock:
+                self.waiting -= 1
+        if not acquired:
+            LLM_LIMITER_REJECTED.inc(reason='timeout')
+            raise LLMBusyError(f"等待大模型调用名额超时（{self.queue_timeout}秒）")
+        with self._lock:
+            self.in_flight += 1
+
+    def _release(self):
+        with self._lock:
+            self.in_flight -= 1
+        self._slots.release()
+
+    @contextmanager
+    def slot(self):
+        """占用一个调用名额，名额不足时排队等待"""
+        self._acquire()
+        lease = _Lease(threading.get_ident())
+        token = self._lease.set(lease)
+        try:
+            yield
+        finally:
+            self._lease.reset(token)
+            if lease.held:
+                self._release()
+
+    def _sleep_released(self, delay):
+        """退避等待 delay 秒；在 slot() 内时先归还名额，等待结束后重新排队取得"""
+        lease = self._lease.get()
+        if lease is None or not lease.held or lease.owner != threading.get_ident():
+            time.sleep(delay)
+            return
+        lease.held = False
+        self._release()
+        time.sleep(delay)
+        self._acquire()
+        lease.held = True
+
+    def _try_take_token(self):
+        """尝试从令牌桶取一个令牌，成功返回 0，否则返回需要等待的秒数"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+            return (1 - self._tokens) / self.rate
+
+    def _take_token(self):
+        """从令牌桶取一个令牌，不足时等待补充"""
+        while True:
+            wait = self._try_take_token()
+            if not wait:
+                return
+            time.sleep(wait)
+
+    @staticmethod
+    def _retry_reason(error):
+        """返回可重试错误的原因标签，不可重试时返回 None"""
+        if isinstance(error, openai.APITimeoutError):
+            return 'timeout'
+        if isinstance(error, openai.APIConnectionError):
+            return 'connection'
+        if isinstance(error, openai.APIStatusError) and error.status_code in RETRYABLE_STATUS:
+            return 'rate_limited' if error.status_code == 429 else f"status_{error.status_code}"
+        return None
+
+    @staticmethod
+    def _retry_after(error):
+        """解析错误响应中的 Retry-After（秒数或 HTTP 日期），没有时返回 None"""
+        response = getattr(error, 'response', None)
+        value = response.headers.get('retry-after') if response is not None else None
+        if not value:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+
+    def backoff_delay(self, attempt, error=None):
+        """第 attempt 次重试前的等待时间：优先使用 Retry-After，否则为带完全抖动的指数退避；均不超过 max_delay"""
+        retry_after = self._retry_after(error) if error is not None else None
+        if retry_after is not None:
+            return min(self.max_delay, retry_after + random.uniform(0, self.base_delay))
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    def call(self, func, *args, **kwargs):
+        """在令牌桶限速下调用 func，遇到可重试错误时退避重试
+
+        须在 slot() 内调用；流式响应在返回后输出期间的错误不会重试。
+        """
+        attempt = 0
+        while True:
+            self._take_token()
+            try:
+                return func(*args, **kwargs)
+            except Exception as e:
+                reason = self._retry_reason(e)
+                if reason is None or attempt >= self.max_retries:
+                    raise
+                delay = self.backoff_delay(attempt, e)
+                LLM_RETRIES.inc(reason=reason)
+                print(f"大模型调用失败（{reason}），{delay:.1f} 秒后第 {attempt + 1} 次重试: {e}")
+                self._sleep_released(delay)
+                attempt += 1
+
+    def stats(self):
+        """返回当前执行中和排队中的调用数"""
+        with self._lock:
+            return {
+                'in_flight': self.in_flight,
+                'waiting': self.waiting,
+                'max_concurrency': self.max_concurrency,
+                'max_queue': self.max_queue
+            }
+
+
+class AsyncLLMRateLimiter(LLMRateLimiter):
+    """LLMRateLimiter 的 asyncio 版本，供 AsyncStudentAgent 在事件循环中使用
+
+    以 asyncio.Semaphore 代替线程信号量，排队和退避等待均不阻塞事件循环，
+    一个事件循环可同时持有大量进行中的调用。slot() 与 call() 须以 async with / await 使用。
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        # asyncio.Semaphore 只能在一个事件循环中使用，按事件循环分别创建
+        self._loop_slots = weakref.WeakKeyDictionary()
+
+    def _async_slots(self):
+        loop = asyncio.get_running_loop()
+        slots = self._loop_slots.get(loop)
+        if slots is None:
+            slots = self._loop_slots[loop] = asyncio.Semaphore(self.max_concurrency)
+        return slots
+
+    async def _acquire(self):
+        """排队取得当前事件循环中的一个调用名额，排队已满或等待超时时抛出 LLMBusyError"""
+        self._enqueue()
+        slots = self._async_slots()
+        try:
+            await asyncio.wait_for(slots.acquire(), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            LLM_LIMITER_REJECTED.inc(reason='timeout')
+            raise LLMBusyError(f"等待大模型调用名额超时（{self.queue_timeout}秒）") from None
+        finally:
+            with self._lock:
+                self.waiting -= 1
+        with self._lock:
+            self.in_flight += 1
+
+    def _release(self):
+        with self._lock:
+            self.in_flight -= 1
+        self._async_slots().release()
+
+    @asynccontextmanager
+    async def slot(self):
+        """占用一个调用名额，名额不足时排队等待"""
+        await self._acquire()
+        lease = _Lease(asyncio.current_task())
+        token = self._lease.set(lease)
+        try:
+            yield
+        finally:
+            self._lease.reset(token)
+            if lease.held:
+                self._release()
+
+    async def _sleep_released(self, delay):
+        """退避等待 delay 秒；在 slot() 内时先归还名额，等待结束后重新排队取得"""
+        lease = self._lease.get()
+        if lease is None or not lease.held or lease.owner is not asyncio.current_task():
+            await asyncio.sleep(delay)
+            return
+        lease.held = False
+        self._release()
+        await asyncio.sleep(delay)
+        await self._acquire()
+        lease.held = True
+
+    async def _take_token(self):
+        """从令牌桶取一个令牌，不足时等待补充"""
+        while True:
+            wait = self._try_take_token()
+            if not wait:
+                return
+            await asyncio.sleep(wait)
+
+    async def call(self, func, *args, **kwargs):
+        """在令牌桶限速下等待协程函数 func，遇到可重试错误时退避重试
+
+        须在 slot() 内调用；流式响应在返回后输出期间的错误不会重试。
+        """
+        attempt = 0
+        while True:
+            await self._take_token()
+            try:
+                return await func(*args, **kwargs)
+            except Exception as e:
+                reason = self._retry_reason(e)
+                if reason is None or attempt >= self.max_retries:
+                    raise
+                delay = self.backoff_delay(attempt, e)
+                LLM_RETRIES.inc(reason=reason)
+                print(f"大模型调用失败（{reason}），{delay:.1f} 秒后第 {attempt + 1} 次重试: {e}")
+                await self._sleep_released(delay)
+                attempt += 1
+
+
+# 进程内共享的大模型调用限流器
+LLM_LIMITER = LLMRateLimiter(**LLM_RATE_LIMIT_CONFIG)
@@ -0,0 +1,109 @@
+import asyncio
+import threading
+from metrics import REGISTRY
+
+SINGLE_FLIGHT_CALLS = REGISTRY.counter(
+    'single_flight_calls_total', '经单飞合并层的调用次数：leader 实际执行，collapsed 等待并共享进行中的结果',
+    ['operation', 'role'])
+
+
+class _Flight:
+    """一次进行中的计算"""
+
+    __slots__ = ('done', 'result', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """合并同一键上并发的重复计算（single-flight）
+
+    同一 (操作, 键) 的计算进行中时，后到的调用不再重复执行，而是等待并共享首个调用的结果
+    （或异常）；计算结束后键即释放，之后的调用重新执行。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights = {}
+        self.leaders = 0
+        self.collapsed = 0
+
+    def do(self, operation, key, func, *args, **kwargs):
+        """执行 func(*args, **kwargs)，同一 (operation, key) 上并发的调用共享一次执行的结果
+
+        Args:
+            operation: 操作名称，同时作为指标标签
+            key: 区分计算的键，例如 (学生ID, 数据集版本)
+            func: 实际执行的函数
+
+        Returns:
+            func 的返回值；func 抛出异常时所有等待者都收到同一异常
+        """
+        flight_key = (operation, key)
+        with self._lock:
+            flight = self._flights.get(flight_key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[flight_key] = _Flight()
+                self.leaders += 1
+            else:
+                self.collapsed += 1
+
+        if not leader:
+            SINGLE_FLIGHT_CALLS.inc(operation=operation, role='collapsed')
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        SINGLE_FLIGHT_CALLS.inc(operation=operation, role='leader')
+        try:
+            flight.result = func(*args, **kwargs)
+            return flight.result
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[flight_key]
+            flight.done.set()
+
+    def stats(self):
+        """返回进行中的计算数与累计的执行、合并次数"""
+        with self._lock:
+            return {
+                'in_flight': len(self._flights),
+                'leaders': self.leaders,
+                'collapsed': self.collapsed
+            }
+
+
+class AsyncSingleFlight(SingleFlight):
+    """SingleFlight 的 asyncio 版本，do() 为协程，func 为协程函数
+
+    计算在独立任务中执行，首个调用方被取消（例如客户端断开）时不影响其他等待者。
+    """
+
+    async def do(self, operation, key, func, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        # 任务只能在创建它的事件循环中等待，键中包含事件循环
+        flight_key = (operation, key, loop)
+        with self._lock:
+            task = self._flights.get(flight_key)
+            leader = task is None
+            if leader:
+                task = self._flights[flight_key] = loop.create_task(func(*args, **kwargs))
+                task.add_done_callback(lambda _: self._release(flight_key))
+                self.leaders += 1
+            else:
+                self.collapsed += 1
+
+        SINGLE_FLIGHT_CALLS.inc(operation=operation, role='leader' if leader else 'collapsed')
+        return await asyncio.shield(task)
+
+    def _release(self, flight_key):
+        with self._lock:
+            self._flights.pop(flight_key, None)
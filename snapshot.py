@@ -0,0 +1,181 @@
+import json
+import os
+import shutil
+import time
+import uuid
+import numpy as np
+import pandas as pd
+from config import SNAPSHOT_CONFIG
+from student_index import dataset_version
+
+# 快照格式版本，格式变化时递增，旧快照将被视为过期
+SNAPSHOT_FORMAT = 1
+MANIFEST_FILE = 'manifest.json'
+
+
+def snapshot_path_for(data_path):
+    """返回数据文件对应的快照目录，例如 student_profiles.csv → student_profiles.snapshot"""
+    return os.path.splitext(data_path)[0] + '.snapshot'
+
+
+def write_snapshot(df, snapshot_dir, source_path=None):
+    """将处理后的学生数据写为按列存储的 NumPy 快照（每列一个 .npy 文件 + manifest.json）
+
+    数值列按原始类型保存，可在加载时内存映射；字符串列保存为定长 Unicode 数组，
+    缺失值另存掩码。先写入临时目录再整体替换，读取方不会看到写了一半的快照。
+
+    Args:
+        df: 学生数据 DataFrame
+        snapshot_dir: 快照目录
+        source_path: 快照对应的源数据文件（CSV），用于判断快照是否过期
+
+    Returns:
+        dict: 快照清单
+    """
+    parent = os.path.dirname(os.path.abspath(snapshot_dir))
+    tmp_dir = os.path.join(parent, f".{os.path.basename(snapshot_dir)}.{os.getpid()}.{uuid.uuid4().hex[:8]}.tmp")
+    os.makedirs(tmp_dir)
+
+    try:
+        columns = []
+        for i, name in enumerate(df.columns):
+            series = df[name]
+            entry = {'name': str(name), 'file': f"{i:04d}.npy", 'mask': None}
+
+            if pd.api.types.is_bool_dtype(series) or pd.api.types.is_numeric_dtype(series):
+                values = series.to_numpy()
+                entry['kind'] = 'numeric'
+            else:
+                missing = series.isna().to_numpy()
+                present = series[~missing]
+                if not all(isinstance(v, str) for v in present):
+                    raise ValueError(f"列 {name} 含有非字符串对象，无法写入快照")
+                values = np.where(missing, '', series.to_numpy(dtype=object)).astype(str)
+                entry['kind'] = 'string'
+                if missing.any():
+                    entry['mask'] = f"{i:04d}.mask.npy"
+                    np.save(os.path.join(tmp_dir, entry['mask']), missing)
+
+            np.save(os.path.join(tmp_dir, entry['file']), values)
+            entry['dtype'] = values.dtype.str
+            columns.append(entry)
+
+        manifest = {
+            'format': SNAPSHOT_FORMAT,
+            'rows': len(df),
+            'columns': columns,
+            'source_path': os.path.abspath(source_path) if source_path else None,
+            'source_version': dataset_version(source_path) if source_path else None,
+            'created_at': time.time()
+        }
+        with open(os.path.join(tmp_dir, MANIFEST_FILE), 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+
+        # 替换旧快照：先移开再改名，失败时保留旧快照
+        old_dir = None
+        if os.path.exists(snapshot_dir):
+            old_dir = tmp_dir + '.old'
+            os.replace(snapshot_dir, old_dir)
+        os.replace(tmp_dir, snapshot_dir)
+        if old_dir:
+            shutil.rmtree(old_dir, ignore_errors=True)
+    except Exception:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+
+    print(f"已写入数据快照 {snapshot_dir}（{manifest['rows']} 行, {len(columns)} 列）")
+    return manifest
+
+
+def read_manifest(snapshot_dir):
+    """读取快照清单，不存在或无法解析时返回 None"""
+    try:
+        with open(os.path.join(snapshot_dir, MANIFEST_FILE), encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def snapshot_is_fresh(snapshot_dir, source_path):
+    """快照是否存在且与源数据文件的当前版本一致"""
+    manifest = read_manifest(snapshot_dir)
+    if manifest is None or manifest.get('format') != SNAPSHOT_FORMAT:
+        return False
+    try:
+        return manifest.get('source_version') == dataset_version(source_path)
+    except OSError:
+        # 源文件不存在时，快照本身即为唯一数据来源
+        return True
+
+
+def load_snapshot(snapshot_dir, columns=None, mmap=True):
+    """加载数据快照为 DataFrame
+
+    Args:
+        snapshot_dir: 快照目录
+        columns: 只加载指定的列，为 None 时加载全部列
+        mmap: 数值列是否以只读内存映射方式加载（按需分页读入，不占用常驻内存）
+
+    Returns:
+        pandas DataFrame
+    """
+    manifest = read_manifest(snapshot_dir)
+    if manifest is None:
+        raise FileNotFoundError(f"未找到数据快照: {snapshot_dir}")
+    if manifest.get('format') != SNAPSHOT_FORMAT:
+        raise ValueError(f"不支持的快照格式: {manifest.get('format')}")
+
+    wanted = set(columns) if columns is not None else None
+    data = {}
+    for entry in manifest['columns']:
+        if wanted is not None and entry['name'] not in wanted:
+            continue
+        values = np.load(os.path.join(snapshot_dir, entry['file']), mmap_mode='r' if mmap else None)
+        if isinstance(values, np.memmap):
+            # 转为普通 ndarray 视图，仍由内存映射文件提供数据
+            values = values.view(np.ndarray)
+        if entry['kind'] == 'string':
+            values = values.astype(object)
+            if entry['mask']:
+                values[np.load(os.path.join(snapshot_dir, entry['mask']))] = np.nan
+        data[entry['name']] = values
+
+    # copy=False 保留内存映射数组，不合并为新的数据块
+    return pd.DataFrame(data, copy=False)
+
+
+def load_profiles(data_path):
+    """加载处理后的学生数据：优先使用新鲜的快照，否则解析 CSV
+
+    读取路径（服务启动、数据集重新加载）只读不写：快照缺失或过期时直接读取 CSV 并提示，
+    快照仅由数据处理流程在 save_profiles 中与 CSV 一同写入，避免与并发的流程写入冲突。
+
+    Args:
+        data_path: 处理后的学生数据文件路径（CSV）
+
+    Returns:
+        pandas DataFrame
+    """
+    snapshot_dir = snapshot_path_for(data_path)
+    if SNAPSHOT_CONFIG['enabled']:
+        if snapshot_is_fresh(snapshot_dir, data_path):
+            try:
+                df = load_snapshot(snapshot_dir, mmap=SNAPSHOT_CONFIG['mmap'])
+                print(f"已从快照 {snapshot_dir} 加载 {len(df)} 条记录")
+                return df
+            except Exception as e:
+                print(f"加载数据快照失败，改为读取 {data_path}: {e}")
+        else:
+            print(f"数据快照 {snapshot_dir} 缺失或已过期，改为读取 {data_path}（重新运行数据处理流程以更新快照）")
+
+    return pd.read_csv(data_path)
+
+
+def save_profiles(df, data_path):
+    """保存处理后的学生数据为 CSV，并同时写入对应的数据快照"""
+    df.to_csv(data_path, index=False)
+    if SNAPSHOT_CONFIG['enabled']:
+        try:
+            write_snapshot(df, snapshot_path_for(data_path), source_path=data_path)
+        except Exception as e:
+            print(f"写入数据快照失败: {e}")
@@ -8,6 +8,13 @@ const StudentApp = {
     state: {
         currentStudentId: null,
         students: [],
+        detailsStream: null,
+        cohortAverages: null,
+        pagination: {
+            offset: 0,
+            limit: 20,
+            total: 0
+        },
         charts: {
             radar: null,
             comparison: null
@@ -17,28 +24,29 @@ const StudentApp = {
     api: {
         baseUrl: '/api',
         
-        async getAllStudents() {
-            const response = await fetch(`${this.baseUrl}/students/`);
+        async getStudents(params = {}) {
+            const query = new URLSearchParams(params).toString();
+            const response = await fetch(`${this.baseUrl}/students/${query ? `?${query}` : ''}`);
             if (!response.ok) throw new Error(`HTTP error! status: ${response.status}`);
             return await response.json();
         },
 
-        async getStudentBasic(id) {
-            const response = await fetch(`${this.baseUrl}/student/${id}`);
+        // 学生报告：sections 为 basic / diagnosis / recommendations 的子集，省略时返回全部
+        async getStudentReport(id, sections = null) {
+            const query = sections ? `?sections=${sections.join(',')}` : '';
+            const response = await fetch(`${this.baseUrl}/student/${id}/report${query}`);
             if (!response.ok) throw new Error(`HTTP error! status: ${response.status}`);
             return await response.json();
         },
 
-        async getStudentDetails(id) {
-            const response = await fetch(`${this.baseUrl}/student/${id}/details`);
+        async getCohortStats() {
+            const response = await fetch(`${this.baseUrl}/cohort/stats`);
             if (!response.ok) throw new Error(`HTTP error! status: ${response.status}`);
             return await response.json();
         },
 
-        async getStudentPlan(id) {
-            const response = await fetch(`${this.baseUrl}/student/${id}/plan`);
-            if (!response.ok) throw new Error(`HTTP error! status: ${response.status}`);
-            return await response.json();
+        openStudentReportStream(id) {
+            return new EventSource(`${this.baseUrl}/student/${id}/report?stream=1`);
         }
     },
 
@@ -54,6 +62,9 @@ const StudentApp = {
             viewStudentBtn: document.getElementById('view-student'),
             studentDetails: document.getElementById('student-details'),
             allStudentsTable: document.getElementById('all-students-table'),
+            pagerInfo: document.getElementById('students-pager-info'),
+            pagerPrev: document.getElementById('students-pager-prev'),
+            pagerNext: document.getElementById('students-pager-next'),
             
             // Basic Info
             studentId: document.getElementById('student-id'),
@@ -90,15 +101,54 @@ const StudentApp = {
                 alert('请先选择一个学生');
             }
         });
+
+        this.dom.pagerPrev.addEventListener('click', () => {
+            const { offset, limit } = this.state.pagination;
+            this.loadStudentsPage(Math.max(0, offset - limit));
+        });
+
+        this.dom.pagerNext.addEventListener('click', () => {
+            const { offset, limit, total } = this.state.pagination;
+            if (offset + limit < total) {
+                this.loadStudentsPage(offset + limit);
+            }
+        });
+    },
+
+    async loadStudentsPage(offset) {
+        const page = await this.api.getStudents({ offset, limit: this.state.pagination.limit });
+        this.state.students = page.students;
+        this.state.pagination.offset = page.offset;
+        this.state.pagination.total = page.total;
+
+        this.renderStudentSelect(page.students);
+        this.renderAllStudentsTable(page.students);
+        this.renderPager();
+        return page.students;
+    },
+
+    renderPager() {
+        const { offset, limit, total } = this.state.pagination;
+        const end = Math.min(offset + limit, total);
+        this.dom.pagerInfo.textContent = total > 0 ? `第 ${offset + 1}-${end} 条，共 ${total} 条` : '暂无学生数据';
+        this.dom.pagerPrev.disabled = offset === 0;
+        this.dom.pagerNext.disabled = end >= total;
+    },
+
+    async loadCohortAverages() {
+        try {
+            const stats = await this.api.getCohortStats();
+            const dims = stats.dimensions || {};
+            this.state.cohortAverages = ['knowledge_score', 'cognitive_score', 'affective_score', 'behavioral_score']
+                .map(field => dims[field] && dims[field].mean !== null ? Math.round(dims[field].mean * 1000) / 10 : 0);
+        } catch (error) {
+            console.error('Error loading cohort stats:', error);
+        }
     },
 
     async loadInitialData() {
         try {
-            const students = await this.api.getAllStudents();
-            this.state.students = students;
-            
-            this.renderStudentSelect(students);
-            this.renderAllStudentsTable(students);
+            const [students] = await Promise.all([this.loadStudentsPage(0), this.loadCohortAverages()]);
 
             // Select first student by default or specific ID if exists
             if (students.length > 0) {
@@ -169,38 +219,115 @@ const StudentApp = {
         // Reset UI & Show Loading
         this.setLoadingState(true);
 
-        try {
-            // 1. Fetch Basic Data
-            const basicData = await this.api.getStudentBasic(studentId);
-            this.renderBasicInfo(basicData);
-            this.updateCharts(basicData);
-
-            // 2. Fetch Detailed Data (Parallel request for Plan and Details)
-            const [detailsData, planData] = await Promise.allSettled([
-                this.api.getStudentDetails(studentId),
-                this.api.getStudentPlan(studentId)
-            ]);
-
-            // Handle Details
-            if (detailsData.status === 'fulfilled') {
-                this.renderExpertDiagnosis(detailsData.value);
-            } else {
-                this.renderExpertDiagnosisError(detailsData.reason);
-            }
+        // 一次请求获取基本数据、专家诊断和建议：基本数据先到先渲染，专家输出边生成边显示
+        this.streamStudentReport(studentId);
+    },
 
-            // Handle Plan
-            if (planData.status === 'fulfilled') {
-                this.renderRecommendations(planData.value);
-            } else {
-                this.renderRecommendationsError(planData.reason);
+    renderBasicSection(data) {
+        this.renderBasicInfo(data);
+        this.updateCharts(data);
+        this.setLoadingState(false);
+    },
+
+    renderBasicError(message) {
+        this.dom.studentDetails.innerHTML = `<div class="text-red-500 p-4">加载数据失败: ${message}</div>`;
+        this.setLoadingState(false);
+    },
+
+    streamStudentReport(studentId) {
+        if (this.state.detailsStream) {
+            this.state.detailsStream.close();
+        }
+
+        const source = this.api.openStudentReportStream(studentId);
+        this.state.detailsStream = source;
+        const buffers = {};
+        let completed = false;
+        let basicRendered = false;
+
+        source.addEventListener('basic', (e) => {
+            basicRendered = true;
+            this.renderBasicSection(JSON.parse(e.data));
+        });
+
+        source.addEventListener('token', (e) => {
+            const data = JSON.parse(e.data);
+            buffers[data.section] = (buffers[data.section] || '') + data.text;
+            this.renderStreamSection(data.section, buffers[data.section]);
+        });
+
+        source.addEventListener('section_done', (e) => {
+            const data = JSON.parse(e.data);
+            buffers[data.section] = data.response;
+            this.renderStreamSection(data.section, data.response);
+        });
+
+        source.addEventListener('done', (e) => {
+            const data = JSON.parse(e.data);
+            completed = true;
+            source.close();
+            this.state.detailsStream = null;
+            this.renderExpertDiagnosis(data.diagnosis);
+            this.renderRecommendations(data.recommendations);
+        });
+
+        source.addEventListener('stream_error', (e) => {
+            const data = JSON.parse(e.data);
+            completed = true;
+            source.close();
+            this.state.detailsStream = null;
+            if (!basicRendered) {
+                this.renderBasicError(data.message);
+                return;
             }
+            this.renderExpertDiagnosisError(data.message);
+            this.renderRecommendationsError(data.message);
+        });
+
+        // 连接失败（例如代理不支持 SSE）时回退到普通请求，只获取尚未收到的部分
+        source.onerror = () => {
+            source.close();
+            if (completed || this.state.detailsStream !== source) return;
+            this.state.detailsStream = null;
+            this.loadStudentReport(studentId, basicRendered ? ['diagnosis', 'recommendations'] : null);
+        };
+    },
 
+    renderStreamSection(section, text) {
+        const recElements = {
+            '知识维度': this.dom.recKnowledge,
+            '认知维度': this.dom.recCognitive,
+            '情感维度': this.dom.recAffective,
+            '行为维度': this.dom.recBehavioral
+        };
+
+        if (section === 'expert_diagnosis') {
+            const el = document.getElementById('expert-diagnosis');
+            if (el) el.innerHTML = marked.parse(text);
+        } else if (recElements[section]) {
+            const items = text.replace(/\n\n/g, '\n').split('\n').filter(item => item.trim().length > 0);
+            this.updateRecCard(recElements[section], items);
+        }
+    },
+
+    async loadStudentReport(studentId, sections = null) {
+        let report;
+        try {
+            report = await this.api.getStudentReport(studentId, sections);
         } catch (error) {
-            console.error('Error updating display:', error);
-            this.dom.studentDetails.innerHTML = `<div class="text-red-500 p-4">加载数据失败: ${error.message}</div>`;
-        } finally {
-            this.setLoadingState(false);
+            console.error('Error loading report:', error);
+            if (!sections || sections.includes('basic')) {
+                this.renderBasicError(error.message);
+                return;
+            }
+            this.renderExpertDiagnosisError(error.message);
+            this.renderRecommendationsError(error.message);
+            return;
         }
+
+        if (report.basic) this.renderBasicSection(report.basic);
+        this.renderExpertDiagnosis(report.diagnosis);
+        this.renderRecommendations(report.recommendations);
     },
 
     setLoadingState(isLoading) {
@@ -415,7 +542,7 @@ const StudentApp = {
                         },
                         {
                             label: '班级平均',
-                            data: [77, 77.2, 78.8, 73.2], // Fixed averages for now
+                            data: this.state.cohortAverages || [0, 0, 0, 0],
                             backgroundColor: 'rgba(156, 163, 175, 0.2)',
                             borderColor: 'rgba(156, 163, 175, 1)',
                             pointBackgroundColor: 'rgba(156, 163, 175, 1)'
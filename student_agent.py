@@ -1,34 +1,99 @@
 import pandas as pd
 import numpy as np
-from openai import OpenAI
 import json
 import time
 import re
-from config import MODELSCOPE_CONFIG  # 导入配置
+import sqlite3
+import threading
+import contextvars
+import functools
+import queue
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from config import AGENT_CONFIG, LLM_BACKEND_CONFIG, LLM_CACHE_CONFIG, PROFILE_STORE_CONFIG  # 导入配置
+from dataset_holder import load_student_index
+from llm_cache import LLMResponseCache
+from profile_store import ProfileStore
+from single_flight import SingleFlight
+from rate_limiter import LLM_LIMITER
+from llm_backends import create_llm_client
+from llm_accounting import LLM_USAGE
+from metrics import LLM_CALLS, LLM_CALL_DURATION, LLM_TIME_TO_FIRST_TOKEN, LLM_ERRORS
+
+ANALYSIS_MODES = ('sequential', 'parallel', 'combined')
+# 当前上下文中的大模型调用计数器（_CallCounter），用于统计一次批量操作实际发起的调用数
+_call_counter = contextvars.ContextVar('llm_call_counter', default=None)
+# 群体批量建议的分组依据：维度得分字段 → 数据列
+COHORT_SCORE_COLUMNS = {
+    'knowledge_score': '知识维度_综合得分',
+    'cognitive_score': '认知维度_综合得分',
+    'affective_score': '情感维度_综合得分',
+    'behavioral_score': '行为维度_综合得分'
+}
+# 学生画像中的详细指标（数据列名，画像中的键为去掉"维度_"后的名称）
+DETAIL_METRICS = [
+    '知识维度_学科成绩', '知识维度_问题解决', '知识维度_学习资源',
+    '认知维度_任务坚持', '认知维度_批判思考', '认知维度_注意力',
+    '情感维度_数学焦虑', '情感维度_学校归属感', '情感维度_学习动机',
+    '行为维度_数字资源使用', '行为维度_出勤情况'
+]
+# 每位学生完整生成建议所需的大模型调用次数（画像、诊断与四位维度专家），用于估算逐个学生生成的调用量
+CALLS_PER_PROFILE = 6
+# combined 模式下模型输出中两部分的标题行
+PROFILE_REPORT_HEADER = "【学生画像报告】"
+EXPERT_DIAGNOSIS_HEADER = "【综合诊断意见】"
+# analyze_student 生成的两部分（流式报告中的段落名）
+ANALYSIS_SECTIONS = ('student_profile_report', 'expert_diagnosis')
+
+
+class _CallCounter:
+    """统计实际调用模型与由缓存回放的专家咨询次数（可跨线程累加）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.cached = 0
+
+    def add(self, cached):
+        with self._lock:
+            if cached:
+                self.cached += 1
+            else:
+                self.calls += 1
+
+
+def _count_call(cached):
+    counter = _call_counter.get()
+    if counter is not None:
+        counter.add(cached)
+
+
+class ExpertCancelledError(Exception):
+    """专家咨询已被等待方取消（例如等待超时）"""
 
 
 class StudentAgent:
     """学生智能代理系统，集成大模型能力的教育智能体网络"""
 
-    def __init__(self, data_path):
+    def __init__(self, dataset):
         """初始化学生代理系统
 
         Args:
-            data_path: 学生数据文件路径
+            dataset: 共享的学生数据索引（StudentIndex，只读）；也可传入处理后的数据文件路径，
+                此时按与 Web 服务相同的方式加载
         """
-        # 初始化数据
-        self.data = pd.read_csv(data_path)
-        self.student_profiles = {}
+        # 初始化数据，学生画像保存在有界存储中，数据集版本变化时失效
+        self.student_profiles = ProfileStore(**PROFILE_STORE_CONFIG)
+        self.set_index(load_student_index(dataset) if isinstance(dataset, str) else dataset)
 
-        # 检查是否有CNTSTUID列，如果没有，抛出异常
-        if 'CNTSTUID' not in self.data.columns:
-            raise ValueError("数据中未找到CNTSTUID列")
+        # 初始化大模型客户端（后端由 LLM_BACKEND_CONFIG 决定）
+        self.llm_backend = LLM_BACKEND_CONFIG['backend']
+        self.client = create_llm_client(self.llm_backend)
 
-        # 初始化大模型客户端 using config
-        self.client = OpenAI(
-            api_key=MODELSCOPE_CONFIG['api_key'],
-            base_url=MODELSCOPE_CONFIG['base_url']
-        )
+        # 大模型回复磁盘缓存，相同提示词直接回放此前的回复（跨进程、跨数据集重新加载有效）
+        self.llm_cache = None
+        if LLM_CACHE_CONFIG['enabled']:
+            self.llm_cache = LLMResponseCache(LLM_CACHE_CONFIG['path'], ttl=LLM_CACHE_CONFIG['ttl'],
+                                              max_bytes=LLM_CACHE_CONFIG['max_bytes'])
 
         # 定义专家智能体系统
         self.expert_agents = {
@@ -51,32 +116,56 @@ class StudentAgent:
             "学习行为指导专家": {
                 "role": "你是一位学习行为指导专家，运用行为主义强化理论与助推理论。",
                 "responsibility": "[投入度监测] 关联ST062Q（缺勤）与ST326Q（数字资源使用），发现低效时间管理模式。[优化行为习惯] 制定数字化设备使用公约，设计打卡-反馈激励机制，利用助推策略优化时间分配。"
+            },
+            # 学科教学专家选择"咨询其他LLM"并指明知识诊断LLM时，由其进行进一步诊断
+            "知识诊断LLM": {
+                "role": "你是一位知识诊断专家，擅长依据学业测评数据定位学生的知识薄弱点及其成因。",
+                "responsibility": "[深度诊断] 结合知识维度各项指标（学科成绩、问题解决、学习资源），区分概念理解、解题策略与资源获取方面的不足。[诊断结论] 逐条给出薄弱点、可能成因与对应的补救方向。"
             }
         }
 
         # 可用的 Action 类型
         self.AVAILABLE_ACTIONS = ["直接回复", "咨询其他LLM", "发送告警", "记录事件", "推荐资源", "执行特定函数"]
 
+        # 并发咨询专家的有界线程池
+        self.expert_timeout = AGENT_CONFIG['expert_timeout']
+        self._expert_pool = ThreadPoolExecutor(max_workers=AGENT_CONFIG['expert_max_workers'],
+                                               thread_name_prefix='expert')
+
+        self.analysis_mode = AGENT_CONFIG['analysis_mode']
+        if self.analysis_mode not in ANALYSIS_MODES:
+            print(f"警告: 未知的分析模式 {self.analysis_mode}，改用 sequential")
+            self.analysis_mode = 'sequential'
+
+        # 合并同一学生、同一操作、同一数据集版本上并发的重复分析
+        self.flights = SingleFlight()
+
         print("学生智能代理系统初始化完成")
 
-    def _consult_expert(self, expert_name, query, available_actions=None, model="Qwen/Qwen2.5-7B-Instruct-1M"):
-        """咨询特定领域的专家智能体，并允许选择执行不同的 action
+    @property
+    def data(self):
+        """当前使用的学生数据 DataFrame"""
+        return self.index.data
 
-        Args:
-            expert_name: 专家名称
-            query: 查询内容
-            available_actions: 可供选择的动作列表，例如 ["直接回复", "咨询其他LLM"]
-            model: 使用的模型ID
+    def set_index(self, index):
+        """替换代理使用的学生数据索引
 
-        Returns:
-            dict: 包含选择的 action 和专家的意见
+        索引由调用方构建并共享（只读），通过一次赋值替换，正在进行的分析不受影响；
+        内存中基于旧数据生成的学生画像随之失效，仍在进行的旧版本分析完成后不再写入画像存储。
+
+        Args:
+            index: 以学生ID（CNTSTUID）为键的 StudentIndex
         """
-        if expert_name not in self.expert_agents:
-            raise ValueError(f"未知的专家: {expert_name}")
+        # 检查是否有CNTSTUID列，如果没有，抛出异常
+        if 'CNTSTUID' not in index.data.columns:
+            raise ValueError("数据中未找到CNTSTUID列")
 
-        expert = self.expert_agents[expert_name]
+        self.index = index
+        self.student_profiles.set_version(index.version)
 
-        print(f"正在咨询{expert_name}...")
+    def _build_expert_messages(self, expert_name, query, available_actions=None):
+        """构建专家智能体的对话消息（系统提示 + 用户查询）"""
+        expert = self.expert_agents[expert_name]
 
         messages = [
             {
@@ -104,52 +193,247 @@ class StudentAgent:
             messages[0]['content'] += actions_description + "\n请在你的回复的**第一行**清晰地指出你选择的**操作名称**。如果选择 '直接回复'，则直接开始你的回答。"
 
         messages.append({'role': 'user', 'content': query})
+        return messages
 
-        try:
-            response = self.client.chat.completions.create(
-                model=model,
-                messages=messages,
-                stream=True
-            )
+    def _stream_expert(self, expert_name, query, available_actions=None, model="Qwen/Qwen2.5-7B-Instruct-1M",
+                       cancel=None):
+        """以流式方式咨询专家智能体，逐段产出模型返回的原始文本
+
+        Args:
+            cancel: 可选的 threading.Event；被设置后关闭流式响应，立即归还线程与调用名额
+
+        Yields:
+            str: 模型输出的文本片段（未去除 action 标记）
 
-            selected_action = None
-            llm_response = ""
-            first_line = True
+        Raises:
+            ValueError: 未知的专家
+            ExpertCancelledError: cancel 被设置
+            Exception: 模型调用失败时向调用方抛出
+        """
+        if expert_name not in self.expert_agents:
+            raise ValueError(f"未知的专家: {expert_name}")
+
+        messages = self._build_expert_messages(expert_name, query, available_actions)
+        prompt_chars = sum(len(message['content']) for message in messages)
+
+        # 命中缓存时按原片段回放，不调用模型
+        cache_key, cached = self._cache_lookup(expert_name, messages, model, prompt_chars, available_actions)
+        _count_call(cached is not None)
+        if cached is not None:
+            yield from cached
+            return
+
+        # 记录调用耗时、首个片段耗时、用量和失败次数
+        start = time.perf_counter()
+        ttft = None
+        usage = None
+        outcome = 'error'
+        chunks = []
+        try:
+            # 在共享限流器下调用：排队等待名额，限流或临时错误时退避重试
+            with LLM_LIMITER.slot():
+                self._check_cancelled(expert_name, cancel)
+                response = LLM_LIMITER.call(
+                    self.client.chat.completions.create,
+                    model=model,
+                    messages=messages,
+                    stream=True,
+                    # 要求服务端在最后一个片段中返回用量，用于记录准确的 token 数
+                    stream_options={"include_usage": True}
+                )
 
-            for chunk in response:
                 try:
-                    content = chunk.choices[0].delta.content or ""
-                    if content:
-                        if first_line and available_actions:
-                            # 检查第一行是否包含可用的动作
-                            for act in available_actions:
-                                if content.strip().startswith(act):
-                                    selected_action = act
-                                    # 移除第一行的动作描述
-                                    content = content.replace(act, "", 1).strip()
-                                    break
-                            first_line = False
-
-                        llm_response += content
-                        # 打印实时响应
-                except Exception as e:
-                    continue
+                    for chunk in response:
+                        # 等待方已放弃（例如超时）时停止读取，不再占用线程和调用名额
+                        self._check_cancelled(expert_name, cancel)
+                        # 服务端返回用量时（通常在最后一个片段）记录准确的 token 数
+                        usage = getattr(chunk, 'usage', None) or usage
+                        try:
+                            content = chunk.choices[0].delta.content or ""
+                        except Exception:
+                            continue
+                        if content:
+                            if ttft is None:
+                                ttft = time.perf_counter() - start
+                                LLM_TIME_TO_FIRST_TOKEN.observe(ttft, expert=expert_name, model=model)
+                            chunks.append(content)
+                            yield content
+                finally:
+                    # 提前结束时关闭连接，服务端随之停止生成
+                    response.close()
+            outcome = 'success'
+            if cache_key is not None and chunks:
+                self._cache_put(cache_key, chunks, expert_name, model)
+        except (GeneratorExit, ExpertCancelledError):
+            # 调用方提前关闭（例如浏览器断开 SSE 连接）或等待超时后取消
+            outcome = 'cancelled'
+            raise
+        except Exception as e:
+            LLM_ERRORS.inc(expert=expert_name, model=model, error=type(e).__name__)
+            raise
+        finally:
+            self._record_call(expert_name, model, prompt_chars, chunks, usage, ttft,
+                              time.perf_counter() - start, outcome, available_actions)
 
-            print(f"\n{expert_name}已完成分析")
+    def _cache_lookup(self, expert_name, messages, model, prompt_chars, available_actions=None):
+        """查询回复缓存
 
-            # 处理最终响应
-            final_response = llm_response.strip()
-            if selected_action and final_response.startswith(selected_action):
-                 # 如果第一行包含选定的动作，移除它
-                 pattern = r"^" + re.escape(selected_action) + r"[\s\W]*"
-                 final_response = re.sub(pattern, "", final_response).strip()
+        Returns:
+            tuple: (缓存键, 命中的片段列表)；未启用缓存时缓存键为 None，未命中时片段列表为 None
+        """
+        if self.llm_cache is None:
+            return None, None
+        cache_key = self.llm_cache.make_key(expert_name, messages[0]['content'], messages[-1]['content'], model,
+                                            backend=self.llm_backend)
+        try:
+            cached = self.llm_cache.get(cache_key)
+        except (sqlite3.Error, ValueError) as e:
+            # 缓存不可用（例如多个进程写入时数据库被锁）不影响模型调用，按未命中处理
+            print(f"读取大模型回复缓存出错: {e}")
+            cached = None
+        if cached is not None:
+            LLM_USAGE.record(expert_name, model, prompt_chars, len(cached), sum(len(c) for c in cached),
+                             ttft=None, duration=0.0, outcome='success',
+                             action=self._match_action(cached[0], available_actions), cached=True)
+        return cache_key, cached
+
+    def _cache_put(self, cache_key, chunks, expert_name, model):
+        """保存模型回复到缓存；写入失败只记录错误，不影响已完成的回复"""
+        try:
+            self.llm_cache.put(cache_key, chunks, expert_name, model)
+        except sqlite3.Error as e:
+            print(f"写入大模型回复缓存出错: {e}")
+
+    def _record_call(self, expert_name, model, prompt_chars, chunks, usage, ttft, duration, outcome,
+                     available_actions=None):
+        """记录一次模型调用的指标与用量"""
+        LLM_CALLS.inc(expert=expert_name, model=model, outcome=outcome)
+        LLM_CALL_DURATION.observe(duration, expert=expert_name, model=model)
+        LLM_USAGE.record(
+            expert_name, model, prompt_chars,
+            completion_tokens=getattr(usage, 'completion_tokens', None) or len(chunks),
+            completion_chars=sum(len(c) for c in chunks),
+            ttft=ttft, duration=duration, outcome=outcome,
+            action=self._match_action(chunks[0], available_actions) if chunks else None,
+            prompt_tokens=getattr(usage, 'prompt_tokens', None)
+        )
+
+    @staticmethod
+    def _match_action(content, available_actions):
+        """返回首个输出片段开头选择的动作，没有时返回 None"""
+        for act in available_actions or []:
+            if content.strip().startswith(act):
+                return act
+        return None
 
+    def _collect_expert_response(self, chunks, available_actions=None):
+        """汇总专家的流式输出，识别第一行选择的 action 并将其从回复中移除
 
-            return {"action": selected_action, "response": final_response}
+        Args:
+            chunks: 模型输出的文本片段序列
+            available_actions: 可供选择的动作列表
+
+        Returns:
+            dict: 包含选择的 action 和专家的意见
+        """
+        selected_action = None
+        llm_response = ""
+        first_line = True
+
+        for content in chunks:
+            if first_line and available_actions:
+                # 检查第一行是否包含可用的动作
+                act = self._match_action(content, available_actions)
+                if act:
+                    selected_action = act
+                    # 移除第一行的动作描述
+                    content = content.replace(act, "", 1).strip()
+                first_line = False
+
+            llm_response += content
+
+        # 处理最终响应
+        final_response = llm_response.strip()
+        if selected_action and final_response.startswith(selected_action):
+             # 如果第一行包含选定的动作，移除它
+             pattern = r"^" + re.escape(selected_action) + r"[\s\W]*"
+             final_response = re.sub(pattern, "", final_response).strip()
+
+        return {"action": selected_action, "response": final_response}
+
+    @staticmethod
+    def _check_cancelled(expert_name, cancel):
+        if cancel is not None and cancel.is_set():
+            raise ExpertCancelledError(f"咨询{expert_name}已取消")
+
+    def _consult_expert(self, expert_name, query, available_actions=None, model="Qwen/Qwen2.5-7B-Instruct-1M",
+                        cancel=None, on_chunk=None):
+        """咨询特定领域的专家智能体，并允许选择执行不同的 action
+
+        Args:
+            expert_name: 专家名称
+            query: 查询内容
+            available_actions: 可供选择的动作列表，例如 ["直接回复", "咨询其他LLM"]
+            model: 使用的模型ID
+            cancel: 可选的 threading.Event，被设置后尽快结束调用（见 _stream_expert）
+            on_chunk: 可选，每收到一个输出片段时以该片段调用，用于流式转发
+
+        Returns:
+            dict: 包含选择的 action 和专家的意见；咨询失败时另含 error
+        """
+        if expert_name not in self.expert_agents:
+            raise ValueError(f"未知的专家: {expert_name}")
+
+        print(f"正在咨询{expert_name}...")
+
+        try:
+            chunks = self._stream_expert(expert_name, query, available_actions, model, cancel)
+            if on_chunk is not None:
+                chunks = self._forward_chunks(chunks, on_chunk)
+            result = self._collect_expert_response(chunks, available_actions)
+            print(f"\n{expert_name}已完成分析")
+            return result
 
         except Exception as e:
             print(f"咨询专家时出错: {e}")
-            return {"action": None, "response": f"咨询{expert_name}失败: {str(e)}"}
+            return {"action": None, "response": f"咨询{expert_name}失败: {str(e)}", "error": str(e)}
+
+    @staticmethod
+    def _forward_chunks(chunks, on_chunk):
+        for content in chunks:
+            on_chunk(content)
+            yield content
+
+    @staticmethod
+    def _section_sink(emit, section, expert_name):
+        """返回把专家输出片段交给 emit(段落, 专家, 片段) 的回调；emit 为 None 时返回 None"""
+        return None if emit is None else functools.partial(emit, section, expert_name)
+
+    def _submit_expert(self, expert_name, query, available_actions=None, on_chunk=None):
+        """将专家咨询提交到线程池，返回 (future, 截止时间, 取消标志)"""
+        if expert_name not in self.expert_agents:
+            raise ValueError(f"未知的专家: {expert_name}")
+        cancel = threading.Event()
+        # 复制当前上下文，使池线程中的调用仍归属到发起请求的入口
+        future = self._expert_pool.submit(contextvars.copy_context().run, self._consult_expert,
+                                          expert_name, query, available_actions, cancel=cancel, on_chunk=on_chunk)
+        return future, time.monotonic() + self.expert_timeout, cancel
+
+    def _await_expert(self, expert_name, future, deadline, cancel=None):
+        """等待专家咨询结果；超时后取消咨询，返回与咨询失败相同格式的结果
+
+        尚未开始的咨询直接从线程池中撤销；已在进行的咨询由 cancel 通知其关闭流式响应，
+        及时归还池线程与限流名额。
+        """
+        try:
+            return future.result(timeout=max(0.0, deadline - time.monotonic()))
+        except FutureTimeoutError:
+            future.cancel()
+            if cancel is not None:
+                cancel.set()
+            print(f"咨询{expert_name}超时（{self.expert_timeout}秒）")
+            return {"action": None, "response": f"咨询{expert_name}失败: 超时（{self.expert_timeout}秒）",
+                    "error": f"超时（{self.expert_timeout}秒）"}
 
     def _parse_recommendations(self, recommendations_text):
         """解析专家建议文本为结构化数据
@@ -180,59 +464,51 @@ class StudentAgent:
 
         return items
 
-    def analyze_student(self, student_id):
-        """分析特定学生的数据并生成个性化评估"""
-        # 验证学生ID是否在有效范围内
-        if student_id not in self.data['CNTSTUID'].values:
-            print(f"错误: 找不到ID为 {student_id} 的学生")
-            print(f"有效的学生ID范围: {min(self.data['CNTSTUID'])}-{max(self.data['CNTSTUID'])}")
-            return None
+    def _build_basic_analysis(self, student_id):
+        """根据学生数据构建基础分析（维度得分、详细指标与风险判断），不调用大模型
 
-        student_data = self.data[self.data['CNTSTUID'] == int(student_id)]
-
-        # 检查学生数据是否为空
-        if student_data.empty:
+        Returns:
+            dict: 基础分析结果；找不到学生时返回 None
+        """
+        # 验证学生ID是否在有效范围内（取一次索引引用，避免分析过程中数据集被替换）
+        index = self.index
+        student_data = index.get_record(student_id)
+        if student_data is None:
+            min_id, max_id = index.id_range()
             print(f"错误: 找不到ID为 {student_id} 的学生")
-            print(f"有效的学生ID范围: {min(self.data['CNTSTUID'])}-{max(self.data['CNTSTUID'])}")
+            print(f"有效的学生ID范围: {min_id}-{max_id}")
             return None
 
         # 检查必要的列是否存在
         required_columns = ['知识维度_综合得分', '认知维度_综合得分', '情感维度_综合得分', '行为维度_综合得分', '学生类型']
-        missing_columns = [col for col in required_columns if col not in student_data.columns]
+        missing_columns = [col for col in required_columns if col not in student_data]
 
         if missing_columns:
             print(f"警告: 以下必要列缺失: {missing_columns}")
-            print("可用的列: ", student_data.columns.tolist())
-            # 为缺失的列创建默认值
-            for col in missing_columns:
-                if col == '学生类型':
-                    student_data[col] = "未分类"
-                else:
-                    student_data[col] = 0.5  # 默认中等水平
+            print("可用的列: ", index.data.columns.tolist())
 
-        # 基础分析
+        # 基础分析（缺失的列使用默认值：学生类型为"未分类"，得分为中等水平 0.5）
         analysis = {
             'student_id': int(student_id),
-            'knowledge_score': student_data['知识维度_综合得分'].values[0] if '知识维度_综合得分' in student_data.columns else 0.5,
-            'cognitive_score': student_data['认知维度_综合得分'].values[0] if '认知维度_综合得分' in student_data.columns else 0.5,
-            'affective_score': student_data['情感维度_综合得分'].values[0] if '情感维度_综合得分' in student_data.columns else 0.5,
-            'behavioral_score': student_data['行为维度_综合得分'].values[0] if '行为维度_综合得分' in student_data.columns else 0.5,
-            'student_type': student_data['学生类型'].values[0] if '学生类型' in student_data.columns else "未分类"
+            'knowledge_score': student_data.get('知识维度_综合得分', 0.5),
+            'cognitive_score': student_data.get('认知维度_综合得分', 0.5),
+            'affective_score': student_data.get('情感维度_综合得分', 0.5),
+            'behavioral_score': student_data.get('行为维度_综合得分', 0.5),
+            'student_type': student_data.get('学生类型', "未分类")
         }
 
         # 获取更详细的指标
-        detail_metrics = [
-            '知识维度_学科成绩', '知识维度_问题解决', '知识维度_学习资源',
-            '认知维度_任务坚持', '认知维度_批判思考', '认知维度_注意力',
-            '情感维度_数学焦虑', '情感维度_学校归属感', '情感维度_学习动机',
-            '行为维度_数字资源使用', '行为维度_出勤情况'
-        ]
-
-        for metric in detail_metrics:
-            if metric in student_data.columns:
+        for metric in DETAIL_METRICS:
+            if metric in student_data:
                 metric_key = metric.replace('维度_', '_')
-                analysis[metric_key] = student_data[metric].values[0]
+                analysis[metric_key] = student_data[metric]
 
+        self._assess_risk(analysis)
+        return analysis
+
+    @staticmethod
+    def _assess_risk(analysis):
+        """根据维度得分与学生类型判断风险等级，写入 risk_level 和 risk_factors"""
         risk_level = "低风险"
         risk_factors = []
 
@@ -247,14 +523,78 @@ class StudentAgent:
         analysis['risk_level'] = risk_level
         analysis['risk_factors'] = risk_factors
 
+    def _profile_report_query(self, analysis):
+        """构建让中心调度智能体生成学生画像报告的查询"""
+        return (
+            f"请根据以下学生的学习数据和维度得分，生成一份详细的学生画像报告，**并在报告中明确指出学生的风险等级和风险因素**：\n"
+            f"{json.dumps(analysis, ensure_ascii=False, indent=2)}\n\n"
+            f"请在画像中整合知识、认知、情感、行为四个维度的分析，突出学生的特点、优势和潜在问题，**并重点分析可能存在的风险。**报告应结构清晰，语言专业但易于理解。"
+        )
+
+    def _expert_diagnosis_query(self, analysis):
+        """构建让中心调度智能体进行深度分析与冲突协调的查询"""
+        return (
+            f"我需要你作为中心调度核心，分析一位学生的学习情况，并统筹各维度可能存在的矛盾（如学业压力与心理健康冲突）。以下是该学生的数据：\n{json.dumps(analysis, ensure_ascii=False, indent=2)}\n\n"
+            f"请你详细分析这位学生的特点、优势、不足。请基于'风险优先协议'，识别潜在的教育目标冲突，并给出权衡后的综合诊断意见。"
+        )
+
+    def _combined_analysis_query(self, analysis):
+        """构建让中心调度智能体一次同时生成画像报告与综合诊断的查询"""
+        return (
+            f"请根据以下学生的学习数据和维度得分完成两项任务：\n{json.dumps(analysis, ensure_ascii=False, indent=2)}\n\n"
+            f"任务一：生成一份详细的学生画像报告，整合知识、认知、情感、行为四个维度的分析，突出学生的特点、优势和潜在问题，**并在报告中明确指出学生的风险等级和风险因素，重点分析可能存在的风险。**\n"
+            f"任务二：作为中心调度核心，统筹各维度可能存在的矛盾（如学业压力与心理健康冲突），基于'风险优先协议'识别潜在的教育目标冲突，并给出权衡后的综合诊断意见。\n\n"
+            f"请严格按以下格式输出，两部分分别以标题行开头：\n{PROFILE_REPORT_HEADER}\n（学生画像报告）\n{EXPERT_DIAGNOSIS_HEADER}\n（综合诊断意见）"
+        )
+
+    def _split_combined_analysis(self, text):
+        """将 combined 模式的回复按标题行拆分为 (画像报告, 综合诊断)；缺少标题行时两部分均使用完整回复"""
+        starts = {header: text.find(header) for header in (PROFILE_REPORT_HEADER, EXPERT_DIAGNOSIS_HEADER)}
+        if -1 in starts.values():
+            return text.strip(), text.strip()
+        ordered = sorted(starts, key=starts.get)
+        sections = {}
+        for i, header in enumerate(ordered):
+            end = starts[ordered[i + 1]] if i + 1 < len(ordered) else len(text)
+            sections[header] = text[starts[header] + len(header):end].strip()
+        return sections[PROFILE_REPORT_HEADER], sections[EXPERT_DIAGNOSIS_HEADER]
+
+    def _analyze_combined(self, analysis, emit=None):
+        """一次调用中心调度智能体同时生成画像报告与综合诊断（流式输出整段归入 expert_diagnosis）"""
+        try:
+            response = self._consult_expert(
+                "中心调度智能体", self._combined_analysis_query(analysis),
+                on_chunk=self._section_sink(emit, 'expert_diagnosis', "中心调度智能体"))['response']
+            analysis['student_profile_report'], analysis['expert_diagnosis'] = self._split_combined_analysis(response)
+        except Exception as e:
+            print(f"中心调度智能体分析出错: {e}")
+            analysis['student_profile_report'] = "无法生成学生画像报告"
+            analysis['expert_diagnosis'] = "无法获取专家分析"
+
+    def _analyze_parallel(self, analysis, emit=None):
+        """并发调用中心调度智能体生成画像报告与综合诊断（诊断查询不包含画像报告）"""
+        report_query = self._profile_report_query(analysis)
+        diagnosis_query = self._expert_diagnosis_query(analysis)
+        try:
+            report = self._submit_expert("中心调度智能体", report_query, on_chunk=self._section_sink(
+                emit, 'student_profile_report', "中心调度智能体"))
+            diagnosis = self._submit_expert("中心调度智能体", diagnosis_query, on_chunk=self._section_sink(
+                emit, 'expert_diagnosis', "中心调度智能体"))
+        except Exception as e:
+            print(f"中心调度智能体分析出错: {e}")
+            analysis['student_profile_report'] = "无法生成学生画像报告"
+            analysis['expert_diagnosis'] = "无法获取专家分析"
+            return
+        analysis['student_profile_report'] = self._await_expert("中心调度智能体", *report)['response']
+        analysis['expert_diagnosis'] = self._await_expert("中心调度智能体", *diagnosis)['response']
+
+    def _analyze_sequential(self, analysis, emit=None):
+        """依次调用中心调度智能体生成画像报告与综合诊断（诊断参考画像报告）"""
         # 让中心调度智能体生成学生画像，包含风险信息
         try:
-            profile_analysis_query = (
-                f"请根据以下学生的学习数据和维度得分，生成一份详细的学生画像报告，**并在报告中明确指出学生的风险等级和风险因素**：\n"
-                f"{json.dumps(analysis, ensure_ascii=False, indent=2)}\n\n"
-                f"请在画像中整合知识、认知、情感、行为四个维度的分析，突出学生的特点、优势和潜在问题，**并重点分析可能存在的风险。**报告应结构清晰，语言专业但易于理解。"
-            )
-            student_profile_report = self._consult_expert("中心调度智能体", profile_analysis_query)['response']
+            student_profile_report = self._consult_expert(
+                "中心调度智能体", self._profile_report_query(analysis),
+                on_chunk=self._section_sink(emit, 'student_profile_report', "中心调度智能体"))['response']
             analysis['student_profile_report'] = student_profile_report
         except Exception as e:
             print(f"中心调度智能体分析出错: {e}")
@@ -263,17 +603,43 @@ class StudentAgent:
         # 让中心调度智能体进行深度分析与冲突协调
         try:
             expert_analysis = self._consult_expert(
-                "中心调度智能体",
-                f"我需要你作为中心调度核心，分析一位学生的学习情况，并统筹各维度可能存在的矛盾（如学业压力与心理健康冲突）。以下是该学生的数据：\n{json.dumps(analysis, ensure_ascii=False, indent=2)}\n\n"
-                f"请你详细分析这位学生的特点、优势、不足。请基于'风险优先协议'，识别潜在的教育目标冲突，并给出权衡后的综合诊断意见。"
-            )['response']
+                "中心调度智能体", self._expert_diagnosis_query(analysis),
+                on_chunk=self._section_sink(emit, 'expert_diagnosis', "中心调度智能体"))['response']
             analysis['expert_diagnosis'] = expert_analysis
         except Exception as e:
             print(f"中心调度智能体分析出错: {e}")
             analysis['expert_diagnosis'] = "无法获取专家分析"
 
+    def analyze_student(self, student_id, emit=None):
+        """分析特定学生的数据并生成个性化评估
+
+        画像报告与综合诊断的生成方式由 AGENT_CONFIG['analysis_mode'] 决定。
+        同一学生的分析正在进行时，并发的调用等待并共享其结果。
+
+        Args:
+            student_id: 学生ID
+            emit: 可选，模型输出到达时以 (段落, 专家名称, 片段) 调用，段落为 ANALYSIS_SECTIONS 之一；
+                共享其他调用进行中的分析时不会被调用
+        """
+        return self.flights.do('analyze_student', (student_id, self.index.version),
+                               self._analyze_student, student_id, emit)
+
+    def _analyze_student(self, student_id, emit=None):
+        # 先记下数据集版本：分析期间数据集被替换时，结果不写入新版本的画像存储
+        version = self.index.version
+        analysis = self._build_basic_analysis(student_id)
+        if analysis is None:
+            return None
+
+        if self.analysis_mode == 'combined':
+            self._analyze_combined(analysis, emit)
+        elif self.analysis_mode == 'parallel':
+            self._analyze_parallel(analysis, emit)
+        else:
+            self._analyze_sequential(analysis, emit)
+
         # 保存分析结果
-        self.student_profiles[student_id] = analysis
+        self.student_profiles.put(student_id, analysis, version)
         print(json.dumps(analysis, indent=2, ensure_ascii=False))
 
         # 在分析过程中，如果识别到高风险，可以触发 "发送告警" action
@@ -283,35 +649,27 @@ class StudentAgent:
 
         return analysis
 
-    def generate_recommendations(self, student_id):
-        """使用多专家系统为学生生成个性化学习建议
+    @staticmethod
+    def _query_subject(student_id, profile):
+        """专家查询中对建议对象的称呼；student_id 为 None 时为群体的平均画像"""
+        if student_id is None:
+            return f"这组画像相近的学生（共 {profile['cohort_size']} 人，以下为组内平均值）"
+        return f"学生ID {student_id}"
+
+    def _recommendation_queries(self, student_id, profile):
+        """构建四个维度的专家查询
 
         Args:
-            student_id: 学生ID
+            student_id: 学生ID；为 None 时 profile 为群体的平均画像，查询中不包含学生ID
+            profile: 学生画像
 
         Returns:
-            dict: 包含多个维度的专家建议
+            list: 每项为 (维度, 专家名称, 查询内容, 可选动作列表)
         """
-        if student_id not in self.student_profiles:
-            self.analyze_student(student_id)
-
-        if student_id not in self.student_profiles:
-            return {"error": "无法获取学生数据"}
-
-        profile = self.student_profiles[student_id]
-
-        # 创建分维度的建议结构
-        recommendations = {
-            "知识维度": [],
-            "认知维度": [],
-            "情感维度": [],
-            "行为维度": [],
-            "知识诊断": []
-        }
-
+        subject = self._query_subject(student_id, profile)
         # 1. 学科教学专家提供知识维度建议，并判断是否需要进一步诊断
         knowledge_query = (
-            f"学生ID {student_id} 的知识维度得分为 {profile['knowledge_score']:.2f}/1.0\n"
+            f"{subject} 的知识维度得分为 {profile['knowledge_score']:.2f}/1.0\n"
             f"学生类型: {profile['student_type']}。\n"
         )
         detail_keys = [k for k in profile.keys() if k.startswith('知识_')]
@@ -319,29 +677,9 @@ class StudentAgent:
             knowledge_query += f"{k}: {profile[k]:.2f}\n"
         knowledge_query += "\\n请针对这位学生的知识维度情况，用2-3句话提供建议。"
 
-        knowledge_response = self._consult_expert("学科教学专家", knowledge_query, available_actions=["直接回复", "咨询其他LLM", "推荐资源"])
-        action = knowledge_response['action']
-        response = knowledge_response['response']
-
-        if action == "直接回复":
-            recommendations["知识维度"] = self._parse_recommendations(response)
-        elif action == "咨询其他LLM":
-            if "知识诊断LLM" in response: # LLM 在回复中
-                diagnosis_query = f"请对学生ID {student_id} 的知识维度进行更深入的诊断分析，当前的知识维度得分为 {profile['knowledge_score']:.2f}，详细指标如下：\n"
-                for k in detail_keys:
-                    diagnosis_query += f"{k}: {profile[k]:.2f}\n"
-                diagnosis_response = self._consult_expert("知识诊断LLM", diagnosis_query)['response']
-                recommendations["知识诊断"] = self._parse_recommendations(diagnosis_response)
-            else:
-                recommendations["知识维度"].append(f"学科教学专家建议咨询其他LLM：{response}")
-        elif action == "推荐资源":
-            recommendations["知识维度"].append(f"学科教学专家推荐资源：{response}")
-        else:
-            recommendations["知识维度"].append(response) # 默认将回复作为建议
-
         # 2. 认知心理学家提供认知维度建议
         cognitive_query = (
-            f"学生ID {student_id} 的认知维度得分为 {profile['cognitive_score']:.2f}/1.0\n"
+            f"{subject} 的认知维度得分为 {profile['cognitive_score']:.2f}/1.0\n"
             f"学生类型: {profile['student_type']}。\n"
         )
         detail_keys = [k for k in profile.keys() if k.startswith('认知_')]
@@ -349,13 +687,9 @@ class StudentAgent:
             cognitive_query += f"{k}: {profile[k]:.2f}\n"
         cognitive_query += "\\n请针对这位学生的认知维度情况，用2-3句话提供建议，仅仅提供建议即可。"
 
-        cognitive_response = self._consult_expert("认知心理学家", cognitive_query)
-        print(cognitive_response)
-        recommendations["认知维度"] = cognitive_response['response']
-
         # 3. 教育心理咨询师提供情感维度建议
         affective_query = (
-            f"学生ID {student_id} 的情感维度得分为 {profile['affective_score']:.2f}/1.0\n"
+            f"{subject} 的情感维度得分为 {profile['affective_score']:.2f}/1.0\n"
             f"学生类型: {profile['student_type']}。\n"
         )
         detail_keys = [k for k in profile.keys() if k.startswith('情感_')]
@@ -365,14 +699,9 @@ class StudentAgent:
         if profile.get('risk_level') in ["中风险", "高风险"]:
             affective_query += " **请特别关注学生的情感状态和心理健康，提供具体的支持建议。**"
 
-        affective_response = self._consult_expert("教育心理咨询师", affective_query)
-        print(affective_response)
-        # recommendations["情感维度"] = self._parse_recommendations(affective_response['response'])
-        recommendations["情感维度"] = affective_response['response']
-
         # 4. 学习行为指导专家提供行为维度建议
         behavioral_query = (
-            f"学生ID {student_id} 的行为维度得分为 {profile['behavioral_score']:.2f}/1.0\n"
+            f"{subject} 的行为维度得分为 {profile['behavioral_score']:.2f}/1.0\n"
             f"学生类型: {profile['student_type']}。\n"
         )
         detail_keys = [k for k in profile.keys() if k.startswith('行为_')]
@@ -380,13 +709,56 @@ class StudentAgent:
             behavioral_query += f"{k}: {profile[k]:.2f}\n"
         behavioral_query += "\\n请针对这位学生的学习行为模式，提供1-2条培养良好学习习惯、提高时间管理能力和改善学习环境的具体建议."
 
-        behavioral_response = self._consult_expert("学习行为指导专家", behavioral_query)
-        print(behavioral_response)
-        # recommendations["行为维度"] = self._parse_recommendations(behavioral_response['response'])
-        recommendations["行为维度"] = behavioral_response['response']
+        return [
+            ("知识维度", "学科教学专家", knowledge_query, ["直接回复", "咨询其他LLM", "推荐资源"]),
+            ("认知维度", "认知心理学家", cognitive_query, None),
+            ("情感维度", "教育心理咨询师", affective_query, None),
+            ("行为维度", "学习行为指导专家", behavioral_query, None)
+        ]
+
+    def _apply_expert_response(self, student_id, profile, dimension, expert_response, recommendations):
+        """将某个维度专家的回复写入建议结构
 
-        
-        # 将特定维度的建议列表合并为字符串
+        Returns:
+            tuple: 知识维度的 action 要求进一步诊断时返回 (专家名称, 查询)，由调用方咨询后
+                   交给 _apply_followup；否则返回 None
+        """
+        if dimension != "知识维度":
+            print(expert_response)
+            recommendations[dimension] = expert_response['response']
+            return None
+
+        action = expert_response['action']
+        response = expert_response['response']
+
+        if action == "直接回复":
+            recommendations["知识维度"] = self._parse_recommendations(response)
+        elif action == "咨询其他LLM":
+            if "知识诊断LLM" in response: # LLM 在回复中
+                diagnosis_query = f"请对{self._query_subject(student_id, profile)} 的知识维度进行更深入的诊断分析，当前的知识维度得分为 {profile['knowledge_score']:.2f}，详细指标如下：\n"
+                for k in [k for k in profile.keys() if k.startswith('知识_')]:
+                    diagnosis_query += f"{k}: {profile[k]:.2f}\n"
+                return "知识诊断LLM", diagnosis_query
+            else:
+                recommendations["知识维度"].append(f"学科教学专家建议咨询其他LLM：{response}")
+        elif action == "推荐资源":
+            recommendations["知识维度"].append(f"学科教学专家推荐资源：{response}")
+        else:
+            recommendations["知识维度"].append(response) # 默认将回复作为建议
+        return None
+
+    def _apply_followup(self, expert_response, recommendations):
+        """将进一步诊断的回复写入建议结构"""
+        recommendations["知识诊断"] = self._parse_recommendations(expert_response['response'])
+
+    def _consult_followup(self, followup, recommendations):
+        """咨询 _apply_expert_response 返回的进一步诊断并写入建议结构"""
+        expert_name, query = followup
+        self._apply_followup(self._await_expert(expert_name, *self._submit_expert(expert_name, query)),
+                             recommendations)
+
+    def _finalize_recommendations(self, recommendations):
+        """将特定维度的建议列表合并为字符串"""
         # 确保在返回之前处理所有相关维度
         for dim_key in ["知识维度", "认知维度", "情感维度", "行为维度", "知识诊断"]: # Updated list of dimensions
             if dim_key in recommendations and recommendations[dim_key] and isinstance(recommendations[dim_key], list):
@@ -408,9 +780,411 @@ class StudentAgent:
             elif dim_key not in recommendations and dim_key in ["知识维度", "认知维度", "情感维度", "行为维度"]:
                  recommendations[dim_key] = "未能生成建议。"
 
-
         return recommendations
 
+    @staticmethod
+    def _empty_recommendations():
+        """创建分维度的建议结构"""
+        return {
+            "知识维度": [],
+            "认知维度": [],
+            "情感维度": [],
+            "行为维度": [],
+            "知识诊断": []
+        }
+
+    def generate_recommendations(self, student_id, analyze=True):
+        """使用多专家系统为学生生成个性化学习建议
+
+        Args:
+            student_id: 学生ID
+            analyze: 没有保存的画像时是否先调用 analyze_student（含两次中心调度智能体调用）；
+                为 False 时基于学生数据的基础分析生成，维度专家的查询只用到基础分析中的字段
+
+        Returns:
+            dict: 包含多个维度的专家建议；同一学生的建议正在生成时，并发的调用共享其结果
+        """
+        return self.flights.do('generate_recommendations', (student_id, self.index.version, analyze),
+                               self._generate_recommendations, student_id, analyze)
+
+    def _generate_recommendations(self, student_id, analyze=True):
+        # 画像可能随时被淘汰，取到后直接使用，不再二次查找
+        profile = self.student_profiles.get(student_id)
+        if profile is None:
+            profile = self.analyze_student(student_id) if analyze else self._build_basic_analysis(student_id)
+
+        if profile is None:
+            return {"error": "无法获取学生数据"}
+
+        return self._recommend_for_profile(student_id, profile)
+
+    def _recommend_for_profile(self, student_id, profile):
+        """根据画像咨询四位维度专家生成建议
+
+        Args:
+            student_id: 学生ID；为 None 时 profile 为群体的平均画像
+            profile: 学生画像
+
+        Returns:
+            dict: 包含多个维度的专家建议
+        """
+        recommendations = self._empty_recommendations()
+
+        # 各维度专家相互独立，并发咨询；按原有顺序合并结果，知识维度的后续诊断在其回复到达后立即发起
+        pending = [(dimension, expert_name) + self._submit_expert(expert_name, query, actions)
+                   for dimension, expert_name, query, actions in self._recommendation_queries(student_id, profile)]
+        for dimension, expert_name, future, deadline, cancel in pending:
+            expert_response = self._await_expert(expert_name, future, deadline, cancel)
+            followup = self._apply_expert_response(student_id, profile, dimension, expert_response, recommendations)
+            if followup:
+                self._consult_followup(followup, recommendations)
+
+        return self._finalize_recommendations(recommendations)
+
+    def _bucket_students(self, positions, granularity):
+        """按学生类型、聚类和量化后的四个维度得分将学生分组
+
+        Args:
+            positions: 学生在数据中的行位置数组
+            granularity: 每个维度得分量化的档位数
+
+        Returns:
+            list: 每项为 (分组键 dict, 成员行位置数组)，按成员数降序
+        """
+        index = self.index
+        data = index.data
+        keys = {}
+        for field, column in COHORT_SCORE_COLUMNS.items():
+            values = pd.to_numeric(data[column], errors='coerce').to_numpy(dtype='float64')[positions] \
+                if column in data.columns else np.full(len(positions), np.nan)
+            # 缺失的得分单独归为 -1 档
+            levels = np.clip(np.floor(values * granularity), 0, granularity - 1)
+            keys[field] = np.where(np.isnan(values), -1, levels).astype('int64')
+        for field, column in (('student_type', '学生类型'), ('cluster', 'Cluster')):
+            keys[field] = data[column].to_numpy()[positions] if column in data.columns else np.full(len(positions), None)
+
+        frame = pd.DataFrame(keys)
+        buckets = []
+        for key, members in frame.groupby(list(keys), sort=False, dropna=False).indices.items():
+            bucket_key = {}
+            for field, value in zip(keys, key):
+                value = value.item() if hasattr(value, 'item') else value
+                if pd.isna(value) or (field in COHORT_SCORE_COLUMNS and value == -1):
+                    value = None
+                bucket_key[field] = value
+            buckets.append((bucket_key, positions[members]))
+        buckets.sort(key=lambda bucket: len(bucket[1]), reverse=True)
+        return buckets
+
+    @staticmethod
+    def _bucket_size_distribution(sizes):
+        """按 2 的幂区间统计分组大小分布，例如 1、2-3、4-7"""
+        distribution = {}
+        for size in sorted(sizes):
+            lower = 1 << (size.bit_length() - 1)
+            label = str(lower) if lower == 1 else f"{lower}-{2 * lower - 1}"
+            distribution[label] = distribution.get(label, 0) + 1
+        return distribution
+
+    def generate_cohort_recommendations(self, student_ids=None, granularity=None, min_bucket_size=None):
+        """为一批学生按画像分组批量生成建议
+
+        将学生类型、聚类和量化后的四个维度得分相同的学生归为一组，以组内各项得分与指标的
+        平均值构建不含学生ID的群体画像，只为群体画像咨询四位维度专家，再将建议分发给组内全部学生。
+        大模型调用次数由每名学生约 6 次降为每组约 4 次；报告中的 llm_calls 为实际调用次数。
+
+        Args:
+            student_ids: 学生ID列表，为 None 时处理全部学生
+            granularity: 每个维度得分量化的档位数，越大分组越细；默认取 AGENT_CONFIG
+            min_bucket_size: 成员数少于该值的分组不生成建议；默认取 AGENT_CONFIG
+
+        Returns:
+            dict: buckets（分组键、群体画像、成员与建议）、students（学生ID → 分组编号）、
+                  missing（找不到的学生ID）和 report（覆盖率、实际调用次数与分组大小分布）
+        """
+        granularity, buckets, eligible, missing = self._plan_cohort(student_ids, granularity, min_bucket_size)
+
+        def recommend(bucket):
+            try:
+                return self._recommend_for_profile(None, bucket['profile'])
+            except Exception as e:
+                print(f"为分组 {bucket['bucket_id']} 生成建议出错: {e}")
+                return None
+
+        # 统计本次批量生成实际发起的调用；计数器随上下文传入分组线程和专家线程池
+        counter = _CallCounter()
+        token = _call_counter.set(counter)
+        try:
+            # 各分组的专家调用在共享线程池中执行，这里仅限制同时处理的分组数
+            with ThreadPoolExecutor(max_workers=AGENT_CONFIG['cohort_max_workers'],
+                                    thread_name_prefix='cohort') as executor:
+                futures = [executor.submit(contextvars.copy_context().run, recommend, bucket) for bucket in eligible]
+                for bucket, future in zip(eligible, futures):
+                    bucket['recommendations'] = future.result()
+        finally:
+            _call_counter.reset(token)
+
+        return self._cohort_result(granularity, buckets, missing, counter)
+
+    def _bucket_profile(self, bucket_key, values, columns):
+        """以组内平均值构建群体画像（不含学生ID），风险等级按平均画像判断
+
+        Args:
+            bucket_key: 分组键
+            values: 组内成员的数值矩阵（行为成员，列对应 columns）
+            columns: 数据列名列表
+
+        Returns:
+            dict: 群体画像，键与单个学生的画像一致，另含 cohort_size
+        """
+        counts = (~np.isnan(values)).sum(axis=0)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            means = np.where(counts > 0, np.nansum(values, axis=0) / counts, np.nan)
+        means = dict(zip(columns, means))
+
+        profile = {'cohort_size': len(values)}
+        for field, column in COHORT_SCORE_COLUMNS.items():
+            # 缺失的得分与单个学生的画像一样按中等水平 0.5 处理
+            value = means.get(column, np.nan)
+            profile[field] = 0.5 if np.isnan(value) else round(float(value), 4)
+        profile['student_type'] = bucket_key.get('student_type') or "未分类"
+        for metric in DETAIL_METRICS:
+            value = means.get(metric, np.nan)
+            if not np.isnan(value):
+                profile[metric.replace('维度_', '_')] = round(float(value), 4)
+        self._assess_risk(profile)
+        return profile
+
+    def _plan_cohort(self, student_ids, granularity, min_bucket_size):
+        """将学生分组并为各组构建群体画像，参数同 generate_cohort_recommendations
+
+        Returns:
+            tuple: (档位数, 全部分组, 需要生成建议的分组, 找不到的学生ID)
+        """
+        granularity = granularity or AGENT_CONFIG['cohort_granularity']
+        if min_bucket_size is None:
+            min_bucket_size = AGENT_CONFIG['cohort_min_bucket_size']
+        index = self.index
+
+        missing = []
+        if student_ids is None:
+            positions = np.arange(len(index))
+        else:
+            positions, _, missing = index.positions_of(student_ids)
+
+        # 画像所需的数值列一次性转换，各分组按成员行位置取平均
+        data = index.data
+        columns = [column for column in list(COHORT_SCORE_COLUMNS.values()) + DETAIL_METRICS if column in data.columns]
+        values = data[columns].apply(pd.to_numeric, errors='coerce').to_numpy(dtype='float64')
+
+        buckets = []
+        for bucket_key, members in self._bucket_students(positions, granularity):
+            buckets.append({
+                'bucket_id': len(buckets),
+                'key': bucket_key,
+                'size': len(members),
+                'profile': self._bucket_profile(bucket_key, values[members], columns),
+                'members': index.ids[members].astype('int64').tolist(),
+                'recommendations': None
+            })
+
+        eligible = [bucket for bucket in buckets if bucket['size'] >= min_bucket_size]
+        return granularity, buckets, eligible, missing
+
+    def _cohort_result(self, granularity, buckets, missing, counter):
+        """汇总已生成建议的分组，构建 generate_cohort_recommendations 的返回结果"""
+        students = {}
+        covered = 0
+        for bucket in buckets:
+            for student_id in bucket['members']:
+                students[student_id] = bucket['bucket_id']
+            if bucket['recommendations'] is not None:
+                covered += bucket['size']
+
+        sizes = [bucket['size'] for bucket in buckets]
+        total = len(students)
+        return {
+            'buckets': buckets,
+            'students': students,
+            'missing': missing,
+            'report': {
+                'granularity': granularity,
+                'students': total,
+                'buckets': len(buckets),
+                'generated_buckets': sum(bucket['recommendations'] is not None for bucket in buckets),
+                'covered_students': covered,
+                'coverage': round(covered / total, 4) if total else 0.0,
+                'llm_calls': counter.calls,
+                'llm_cached_calls': counter.cached,
+                'llm_calls_per_student_mode': CALLS_PER_PROFILE * total,
+                'bucket_size': {
+                    'min': min(sizes) if sizes else 0,
+                    'max': max(sizes) if sizes else 0,
+                    'mean': round(float(np.mean(sizes)), 2) if sizes else 0.0,
+                    'median': float(np.median(sizes)) if sizes else 0.0,
+                    'distribution': self._bucket_size_distribution(sizes)
+                }
+            }
+        }
+
+    def _stream_analysis(self, student_id):
+        """流式获取学生画像（画像报告与综合诊断）
+
+        画像存储中已有时直接使用；否则经 analyze_student 生成（遵循 analysis_mode，并发的同一学生分析
+        只执行一次），分析在独立线程中进行，模型输出经队列转为 token 事件。客户端断开后分析仍会完成
+        并写入画像存储，供之后的请求使用。
+
+        Yields:
+            tuple: (事件名, 事件数据)
+
+        Returns:
+            dict: 学生画像，学生不存在时返回 None
+        """
+        for section in ANALYSIS_SECTIONS:
+            yield "section_start", {"section": section, "expert": "中心调度智能体"}
+
+        profile = self.student_profiles.get(student_id)
+        if profile is None:
+            events = queue.Queue()
+
+            def emit(section, expert_name, text):
+                events.put(("token", {"section": section, "expert": expert_name, "text": text}))
+
+            def analyze():
+                try:
+                    events.put(("result", self.analyze_student(student_id, emit)))
+                except Exception as e:
+                    events.put(("error", e))
+
+            threading.Thread(target=contextvars.copy_context().run, args=(analyze,),
+                             name=f'analyze-{student_id}', daemon=True).start()
+            while True:
+                event, data = events.get()
+                if event == "token":
+                    yield event, data
+                elif event == "error":
+                    raise data
+                else:
+                    profile = data
+                    break
+            if profile is None:
+                return None
+
+        for section in ANALYSIS_SECTIONS:
+            yield "section_done", {"section": section, "expert": "中心调度智能体",
+                                   "action": None, "response": profile[section]}
+        return profile
+
+    def _stream_recommendations(self, student_id, profile):
+        """并发咨询四位维度专家，各专家的输出经队列合并为 token 事件，先完成的维度先产出 section_done
+
+        知识维度需要进一步诊断时，在其回复到达后立即发起（段落为"知识诊断"）。
+        生成器被关闭（客户端断开）时取消仍在进行的咨询。
+
+        Yields:
+            tuple: (事件名, 事件数据)
+
+        Returns:
+            dict: 与 generate_recommendations 结构相同的建议
+        """
+        events = queue.Queue()
+        recommendations = self._empty_recommendations()
+        pending = {}  # 段落 → (专家名称, future, 截止时间, 取消标志)
+
+        def emit(section, expert_name, text):
+            events.put(("token", {"section": section, "expert": expert_name, "text": text}))
+
+        def submit(section, expert_name, query, available_actions=None):
+            future, deadline, cancel = self._submit_expert(expert_name, query, available_actions,
+                                                           on_chunk=self._section_sink(emit, section, expert_name))
+            # 片段在咨询线程中同步入队，完成通知一定排在该段落的所有片段之后
+            future.add_done_callback(lambda _: events.put(("finished", section)))
+            pending[section] = (expert_name, future, deadline, cancel)
+            return "section_start", {"section": section, "expert": expert_name}
+
+        try:
+            for dimension, expert_name, query, actions in self._recommendation_queries(student_id, profile):
+                yield submit(dimension, expert_name, query, actions)
+
+            while pending:
+                first_deadline = min(entry[2] for entry in pending.values())
+                try:
+                    event, section = events.get(timeout=max(0.0, first_deadline - time.monotonic()))
+                except queue.Empty:
+                    # 最早截止的咨询已超时，由 _await_expert 取消并给出超时结果
+                    event, section = "finished", min(pending, key=lambda s: pending[s][2])
+                if event == "token":
+                    # 忽略已超时段落的残余片段
+                    if section['section'] in pending:
+                        yield event, section
+                    continue
+                if section not in pending:
+                    continue
+
+                expert_name, future, deadline, cancel = pending.pop(section)
+                result = self._await_expert(expert_name, future, deadline, cancel)
+                if 'error' in result:
+                    yield "expert_error", {"section": section, "expert": expert_name, "message": result['error']}
+                yield "section_done", {"section": section, "expert": expert_name,
+                                       "action": result['action'], "response": result['response']}
+
+                if section == "知识诊断":
+                    self._apply_followup(result, recommendations)
+                    continue
+                followup = self._apply_expert_response(student_id, profile, section, result, recommendations)
+                if followup:
+                    yield submit("知识诊断", *followup)
+        finally:
+            for _, future, _, cancel in pending.values():
+                future.cancel()
+                cancel.set()
+
+        return self._finalize_recommendations(recommendations)
+
+    def stream_student_report(self, student_id, include_diagnosis=True, include_recommendations=True):
+        """流式生成学生的专家诊断与分维度建议
+
+        诊断经 analyze_student 生成（遵循 analysis_mode，已保存的画像直接使用），四位维度专家并发咨询；
+        模型输出到达时立即产出事件，而不是等待全部调用完成。
+
+        Args:
+            student_id: 学生ID
+            include_diagnosis: 是否生成画像报告与综合诊断
+            include_recommendations: 是否生成分维度建议；不生成诊断时基于已保存的画像，
+                没有保存的画像时仅基于学生数据的基础分析
+
+        Yields:
+            tuple: (事件名, 事件数据)，事件名为 start / section_start / token /
+                   section_done / expert_error / stream_error / done；
+                   并发进行的各段落的 token 事件相互交错，以 section 区分
+        """
+        analysis = self._build_basic_analysis(student_id)
+        if analysis is None:
+            yield "stream_error", {"message": f"找不到ID为 {student_id} 的学生"}
+            return
+
+        yield "start", {"student_id": analysis['student_id']}
+        done = {"student_id": analysis['student_id']}
+
+        if include_diagnosis:
+            analysis = yield from self._stream_analysis(student_id)
+            if analysis is None:
+                yield "stream_error", {"message": f"找不到ID为 {student_id} 的学生"}
+                return
+            done.update({
+                "expert_diagnosis": analysis['expert_diagnosis'],
+                "student_profile_report": analysis['student_profile_report'],
+                "risk_level": analysis['risk_level'],
+                "risk_factors": analysis['risk_factors']
+            })
+        else:
+            analysis = self.student_profiles.get(student_id) or analysis
+
+        if include_recommendations:
+            done["recommendations"] = yield from self._stream_recommendations(student_id, analysis)
+
+        yield "done", done
+
     def _log_student_event(self, student_id, event_type, details):
         print(f"记录事件 - 学生ID: {student_id}, 类型: {event_type}, 详情: {details}")
         # 这里可以添加将事件记录到数据库或日志文件的逻辑
@@ -0,0 +1,187 @@
+import hashlib
+import os
+import numpy as np
+import pandas as pd
+from config import INDEX_CONFIG
+
+
+class StudentIndex:
+    """学生数据哈希索引，将学生ID映射到行位置，并预构建每行记录
+
+    用于替代 `df[df['student_id'] == sid]` 这类全表布尔扫描，
+    使单个学生的查找为 O(1)，与数据集规模无关。
+    """
+
+    def __init__(self, data, id_column='student_id', prebuild_records=None, version=None):
+        """构建索引
+
+        Args:
+            data: 学生数据 DataFrame
+            id_column: 作为学生ID的列名，例如 'student_id' 或 'CNTSTUID'
+            prebuild_records: 是否在构建时预先生成每行的字典记录；为 None 时按
+                INDEX_CONFIG['prebuild_records_limit'] 决定，超出行数上限的大数据集
+                改为首次访问时再生成，避免预先物化全部内存映射的列
+            version: 数据集版本标识，供按版本缓存的调用方使用
+        """
+        if id_column not in data.columns:
+            raise ValueError(f"数据中未找到{id_column}列")
+
+        self.data = data
+        self.id_column = id_column
+        self.version = version
+        self.ids = data[id_column].to_numpy()
+
+        # 倒序构建，保证重复ID时保留第一次出现的行（与 .iloc[0] 的行为一致）
+        id_list = self.ids.astype('int64').tolist()
+        self.positions = dict(zip(reversed(id_list), range(len(id_list) - 1, -1, -1)))
+
+        if prebuild_records is None:
+            prebuild_records = len(data) <= INDEX_CONFIG['prebuild_records_limit']
+        self._records = data.to_dict(orient='records') if prebuild_records else [None] * len(data)
+
+        # 列数组、排序顺序和分类编码按需构建并缓存，供分页查询复用
+        self._columns = {}
+        self._sort_orders = {}
+        self._categories = {}
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, student_id):
+        return self.position(student_id) is not None
+
+    def position(self, student_id):
+        """返回学生所在的行位置，不存在时返回 None"""
+        try:
+            return self.positions.get(int(student_id))
+        except (TypeError, ValueError):
+            return None
+
+    def positions_of(self, student_ids):
+        """批量查找学生所在的行位置
+
+        Returns:
+            tuple: (位置数组, 找到的学生ID列表, 未找到的学生ID列表)，前两者顺序与输入一致
+        """
+        positions, found, missing = [], [], []
+        for student_id in student_ids:
+            pos = self.position(student_id)
+            if pos is None:
+                missing.append(student_id)
+            else:
+                positions.append(pos)
+                found.append(student_id)
+        return np.asarray(positions, dtype=np.int64), found, missing
+
+    def get_record(self, student_id):
+        """返回学生的整行记录（列名 → 值），不存在时返回 None"""
+        pos = self.position(student_id)
+        if pos is None:
+            return None
+        record = self._records[pos]
+        if record is None:
+            record = self.data.iloc[pos].to_dict()
+            self._records[pos] = record
+        return record
+
+    def get_row(self, student_id):
+        """返回学生对应的 pandas Series，不存在时返回 None"""
+        pos = self.position(student_id)
+        if pos is None:
+            return None
+        return self.data.iloc[pos]
+
+    def id_range(self):
+        """返回有效的学生ID范围 (最小值, 最大值)"""
+        if len(self.ids) == 0:
+            return None, None
+        return self.ids.min(), self.ids.max()
+
+    def column(self, column):
+        """返回某列的 NumPy 数组（缓存）"""
+        values = self._columns.get(column)
+        if values is None:
+            values = self.data[column].to_numpy()
+            self._columns[column] = values
+        return values
+
+    def sort_order(self, column, descending=False):
+        """返回按某列排序后的行位置数组（稳定排序，缺失值始终排在最后，缓存）"""
+        key = (column, descending)
+        order = self._sort_orders.get(key)
+        if order is None:
+            series = self.data[column].reset_index(drop=True)
+            order = series.sort_values(ascending=not descending, kind='stable',
+                                       na_position='last').index.to_numpy(dtype=np.int64)
+            self._sort_orders[key] = order
+        return order
+
+    def category_mask(self, column, values):
+        """返回某个分类列取值属于 values 的布尔掩码（基于预先计算的分类编码）"""
+        encoded = self._categories.get(column)
+        if encoded is None:
+            codes, uniques = pd.factorize(self.data[column])
+            encoded = (codes, {value: code for code, value in enumerate(uniques)})
+            self._categories[column] = encoded
+        codes, lookup = encoded
+        wanted = [lookup[v] for v in values if v in lookup]
+        if not wanted:
+            return np.zeros(len(codes), dtype=bool)
+        if len(wanted) == 1:
+            return codes == wanted[0]
+        return np.isin(codes, wanted)
+
+    def range_mask(self, column, minimum=None, maximum=None):
+        """返回某个数值列落在 [minimum, maximum] 区间内的布尔掩码"""
+        values = self.column(column)
+        mask = np.ones(len(values), dtype=bool)
+        if minimum is not None:
+            mask &= values >= minimum
+        if maximum is not None:
+            mask &= values <= maximum
+        return mask
+
+    def select(self, mask=None, sort_by=None, descending=False):
+        """按过滤掩码和排序列返回匹配的行位置数组"""
+        if sort_by is not None:
+            order = self.sort_order(sort_by, descending)
+            return order if mask is None else order[mask[order]]
+        if mask is None:
+            return np.arange(len(self.ids))
+        return np.flatnonzero(mask)
+
+    def take_records(self, positions, fields):
+        """按列批量取值并组装为记录列表，避免逐行 iterrows
+
+        Args:
+            positions: 行位置数组
+            fields: 输出字段名 → 数据列名 的映射，缺失的列输出为 None
+
+        Returns:
+            list: 每行一个字典，NaN 转换为 None
+        """
+        positions = np.asarray(positions, dtype=np.int64)
+        columns = []
+        for column in fields.values():
+            if column not in self.data.columns:
+                columns.append([None] * len(positions))
+                continue
+            values = self.column(column)[positions]
+            if values.dtype.kind == 'f':
+                missing = np.isnan(values)
+                values = values.tolist()
+                if missing.any():
+                    for i in np.flatnonzero(missing).tolist():
+                        values[i] = None
+            else:
+                values = values.tolist()
+            columns.append(values)
+        keys = list(fields.keys())
+        return [dict(zip(keys, row)) for row in zip(*columns)]
+
+
+def dataset_version(file_path):
+    """根据数据文件的修改时间和大小生成数据集版本标识"""
+    stat = os.stat(file_path)
+    digest = hashlib.sha1(f"{os.path.abspath(file_path)}:{stat.st_mtime_ns}:{stat.st_size}".encode('utf-8'))
+    return digest.hexdigest()[:12]
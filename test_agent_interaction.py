@@ -22,7 +22,8 @@ def run_experiment():
     print(f"Starting Collaborative Reasoning Experiment for Student {student_id}")
 
     # Verify student exists
-    if student_id not in agent.data['CNTSTUID'].values:
+    student_data = agent.index.get_record(student_id)
+    if student_data is None:
         print(f"Student {student_id} not found!")
         return
     
@@ -30,16 +31,14 @@ def run_experiment():
     # We can reuse the logic from analyze_student to get the 'analysis' dict
     # But analyze_student prints a lot. We'll just extract the data preparation part.
     
-    student_data = agent.data[agent.data['CNTSTUID'] == student_id]
-    
     # Construct analysis dict manually to avoid running the full default analysis
     analysis = {
         'student_id': int(student_id),
-        'knowledge_score': student_data['知识维度_综合得分'].values[0] if '知识维度_综合得分' in student_data.columns else 0.5,
-        'cognitive_score': student_data['认知维度_综合得分'].values[0] if '认知维度_综合得分' in student_data.columns else 0.5,
-        'affective_score': student_data['情感维度_综合得分'].values[0] if '情感维度_综合得分' in student_data.columns else 0.5,
-        'behavioral_score': student_data['行为维度_综合得分'].values[0] if '行为维度_综合得分' in student_data.columns else 0.5,
-        'student_type': student_data['学生类型'].values[0] if '学生类型' in student_data.columns else "未分类"
+        'knowledge_score': student_data.get('知识维度_综合得分', 0.5),
+        'cognitive_score': student_data.get('认知维度_综合得分', 0.5),
+        'affective_score': student_data.get('情感维度_综合得分', 0.5),
+        'behavioral_score': student_data.get('行为维度_综合得分', 0.5),
+        'student_type': student_data.get('学生类型', "未分类")
     }
     
     detail_metrics = [
@@ -49,9 +48,9 @@ def run_experiment():
             '行为维度_数字资源使用', '行为维度_出勤情况'
     ]
     for metric in detail_metrics:
-        if metric in student_data.columns:
+        if metric in student_data:
             metric_key = metric.replace('维度_', '_')
-            analysis[metric_key] = student_data[metric].values[0]
+            analysis[metric_key] = student_data[metric]
             
     student_json = json.dumps(analysis, ensure_ascii=False, indent=2)
 
@@ -0,0 +1,141 @@
+import os
+import pytest
+from config import LLM_BACKEND_CONFIG, LLM_CACHE_CONFIG
+from llm_accounting import LLM_USAGE, read_log
+from llm_backends import FakeLLMClient
+from llm_cache import LLMResponseCache
+from rate_limiter import LLM_LIMITER
+from student_agent import StudentAgent
+
+DATA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'student_profiles.csv')
+
+
+@pytest.fixture
+def make_agent(tmp_path, monkeypatch):
+    """使用本地替身模型（无延迟）与临时缓存、调用日志创建 StudentAgent"""
+    monkeypatch.setitem(LLM_BACKEND_CONFIG, 'backend', 'fake')
+    monkeypatch.setitem(LLM_BACKEND_CONFIG, 'fake_first_token_latency', 0.0)
+    monkeypatch.setitem(LLM_BACKEND_CONFIG, 'fake_tokens_per_second', 0.0)
+    monkeypatch.setitem(LLM_BACKEND_CONFIG, 'fake_error_rate', 0.0)
+    monkeypatch.setitem(LLM_CACHE_CONFIG, 'enabled', True)
+    monkeypatch.setitem(LLM_CACHE_CONFIG, 'path', str(tmp_path / 'llm_cache.sqlite3'))
+    monkeypatch.setattr(LLM_USAGE, 'path', str(tmp_path / 'llm_usage.jsonl'))
+    return lambda: StudentAgent(DATA_PATH)
+
+
+def test_analyze_student_with_fake_backend(make_agent):
+    agent = make_agent()
+    assert isinstance(agent.client, FakeLLMClient)
+    student_id = int(agent.index.ids[0])
+
+    analysis = agent.analyze_student(student_id)
+
+    assert analysis['student_id'] == student_id
+    for field in ('student_profile_report', 'expert_diagnosis'):
+        assert analysis[field]
+        assert '失败' not in analysis[field]
+    assert agent.student_profiles.get(student_id) is analysis
+
+
+def test_generate_recommendations_is_deterministic(make_agent):
+    first = make_agent()
+    student_id = int(first.index.ids[0])
+    recommendations = first.generate_recommendations(student_id)
+
+    for dimension in ('知识维度', '认知维度', '情感维度', '行为维度'):
+        assert recommendations[dimension]
+        assert '失败' not in recommendations[dimension]
+
+    # 关闭缓存后重新调用替身模型，相同提示词得到相同回复
+    second = make_agent()
+    second.llm_cache = None
+    assert second.generate_recommendations(student_id) == recommendations
+
+
+def test_fake_backend_replies_are_not_served_to_other_backends(make_agent):
+    agent = make_agent()
+    student_id = int(agent.index.ids[0])
+    agent.analyze_student(student_id)
+    assert agent.llm_cache.stats()['entries'] > 0
+
+    agent.llm_backend = 'modelscope'
+    messages = agent._build_expert_messages("中心调度智能体", agent._profile_report_query(
+        agent._build_basic_analysis(student_id)))
+    cache_key, cached = agent._cache_lookup("中心调度智能体", messages, "Qwen/Qwen2.5-7B-Instruct-1M", 0)
+    assert cached is None
+    assert cache_key != LLMResponseCache.make_key(
+        "中心调度智能体", messages[0]['content'], messages[-1]['content'], "Qwen/Qwen2.5-7B-Instruct-1M",
+        backend='fake')
+
+
+def test_usage_is_recorded_from_the_final_stream_chunk(make_agent, tmp_path):
+    agent = make_agent()
+    agent.analyze_student(int(agent.index.ids[0]))
+
+    entries = list(read_log(str(tmp_path / 'llm_usage.jsonl')))
+    assert entries
+    for entry in entries:
+        # 替身模型的用量按字符数计提示词 token；未返回用量时 prompt_tokens 为 null
+        assert entry['prompt_tokens'] == entry['prompt_chars']
+        assert entry['completion_tokens'] == LLM_BACKEND_CONFIG['fake_response_tokens']
+
+
+def test_cache_survives_rewriting_the_data_file(make_agent, tmp_path):
+    data_path = tmp_path / 'student_profiles.csv'
+    data_path.write_bytes(open(DATA_PATH, 'rb').read())
+    first = StudentAgent(str(data_path))
+    student_id = int(first.index.ids[0])
+    first.analyze_student(student_id)
+
+    # 内容不变地重写数据文件（例如 main.py 每次运行都会重新保存），数据集版本随之变化
+    os.utime(data_path, ns=(0, 0))
+    second = StudentAgent(str(data_path))
+    assert second.index.version != first.index.version
+    second.client = None  # 全部命中缓存时不会调用模型
+    second.analyze_student(student_id)
+    assert second.llm_cache.stats()['hits'] > 0
+    assert second.llm_cache.stats()['misses'] == 0
+
+
+@pytest.mark.parametrize('mode', ['sequential', 'parallel', 'combined'])
+def test_stream_student_report_fans_out_and_reuses_the_stored_profile(make_agent, tmp_path, mode):
+    agent = make_agent()
+    agent.llm_cache = None
+    agent.analysis_mode = mode
+    student_id = int(agent.index.ids[0])
+    log_path = str(tmp_path / 'llm_usage.jsonl')
+
+    events = list(agent.stream_student_report(student_id))
+    names = [event for event, _ in events]
+    assert names[0] == 'start' and names[-1] == 'done'
+    assert 'token' in names and 'expert_error' not in names
+    done = events[-1][1]
+    assert done['expert_diagnosis'] and done['student_profile_report']
+    for dimension in ('知识维度', '认知维度', '情感维度', '行为维度'):
+        assert done['recommendations'][dimension]
+    # 诊断经 analyze_student 生成并保存，调用次数遵循 analysis_mode
+    assert agent.student_profiles.get(student_id)['expert_diagnosis'] == done['expert_diagnosis']
+    central_calls = [e for e in read_log(log_path) if e['expert'] == "中心调度智能体"]
+    assert len(central_calls) == (1 if mode == 'combined' else 2)
+
+    # 再次请求时直接使用已保存的画像，只调用维度专家
+    events = list(agent.stream_student_report(student_id))
+    assert events[-1][1]['expert_diagnosis'] == done['expert_diagnosis']
+    assert len([e for e in read_log(log_path) if e['expert'] == "中心调度智能体"]) == len(central_calls)
+
+
+def test_stream_recommendations_run_concurrently(make_agent, monkeypatch):
+    monkeypatch.setitem(LLM_BACKEND_CONFIG, 'fake_tokens_per_second', 200.0)
+    # 不让令牌桶限速（前面的测试已用掉突发额度）错开各专家的开始时间
+    monkeypatch.setattr(LLM_LIMITER, 'rate', 1000.0)
+    agent = make_agent()
+    agent.llm_cache = None
+    student_id = int(agent.index.ids[0])
+
+    events = list(agent.stream_student_report(student_id, include_diagnosis=False))
+    sections = [data['section'] for event, data in events if event == 'token']
+    # 四个维度的片段相互交错：每个维度的首个片段都早于任一维度的最后一个片段
+    dimensions = ('知识维度', '认知维度', '情感维度', '行为维度')
+    first = max(sections.index(dimension) for dimension in dimensions)
+    last = min(len(sections) - 1 - sections[::-1].index(dimension) for dimension in dimensions)
+    assert first < last